@@ -1,13 +1,10 @@
-import io
-import os
 import sys
-import tempfile
 import textwrap
+import time
 from pathlib import Path
 
 import streamlit as st
 import pandas as pd
-import matplotlib.pyplot as plt
 
 # Ensure project root is on sys.path even if run from another working dir.
 _ROOT = Path(__file__).resolve().parent
@@ -15,14 +12,22 @@ if str(_ROOT) not in sys.path:
     sys.path.insert(0, str(_ROOT))
 
 from config import (
-    HF_TOKEN,
+    DIARIZATION_PRELOAD,
+    JOB_POLL_SECONDS,
     MAX_FILE_SIZE_MB,
+    MEMO_PARTIAL_INTERVAL_SECONDS,
     OPENAI_API_KEY,
     SILENCE_DB_OPTIONS,
     SILENCE_DB_THRESHOLD,
     SUPPORTED_FORMATS,
 )
-from services import AudioProcessor, MemoGenerationService, SpeakerDiarizationService, TranscriptionService
+from services import STAGE_LABELS, get_job_queue, render_waveform_png
+from services.exports import EXPORT_FORMATS, available_formats, build_export, get_cached_export
+from services.speaker_diarization import preload_pipeline
+
+if DIARIZATION_PRELOAD:
+    # 話者分離モデルはプロセス内で共有するため、起動時に一度だけ読み込んでおく
+    preload_pipeline()
 
 
 def _validate_upload(uploaded_file):
@@ -37,6 +42,105 @@ def _validate_upload(uploaded_file):
     return None
 
 
+def _export_download(label, file_stem, export_key, build_tables, multi_table=False):
+    """出力ファイルは押下時に1回だけ作成し、作成済みならダウンロードボタンだけを表示"""
+    formats = available_formats(multi_table)
+    name = export_key[-1]
+    if len(formats) == 1:
+        fmt = formats[0]
+    else:
+        fmt = st.radio(
+            f"{label}の形式",
+            formats,
+            format_func=lambda f: EXPORT_FORMATS[f][0],
+            horizontal=True,
+            key=f"{name}-format",
+        )
+    format_label, suffix, mime = EXPORT_FORMATS[fmt]
+    data = get_cached_export((export_key, fmt))
+    if data is None and st.button(f"{label}を{format_label}で作成", key=f"{name}-build-{fmt}"):
+        with st.spinner("作成中..."):
+            data = build_export(build_tables(), fmt, cache_key=export_key)
+    if data is not None:
+        st.download_button(
+            label=f"{label}を{format_label}でダウンロード",
+            data=data,
+            file_name=f"{file_stem}{suffix}",
+            mime=mime,
+            key=f"{name}-download-{fmt}",
+        )
+
+
+def _render_job_progress(job):
+    """ジョブの待ち順とステージごとの進捗を表示"""
+    if job["status"] == "queued":
+        ahead = job["position"] or 0
+        st.info(f"⏳ 順番待ち中です（前に {ahead} 件）" if ahead else "⏳ まもなく開始します")
+        return
+    for stage, state in job["stages"].items():
+        label = STAGE_LABELS.get(stage, stage)
+        status, elapsed = state["status"], state["elapsed"]
+        if status == "running":
+            st.info(f"⏳ {label}: 処理中...")
+        elif status == "waiting":
+            # 他の解析が重い処理の枠を使っている間は、その枠の待ち順を表示
+            ahead = state.get("position") or 0
+            st.info(f"⏳ {label}: 混雑のため待機中です（前に {ahead} 件）" if ahead else f"⏳ {label}: まもなく開始します")
+        elif status == "done":
+            st.success(f"✅ {label}: 完了 ({elapsed:.1f}秒)")
+        elif status == "failed":
+            st.warning(f"⚠️ {label}: 失敗 ({elapsed:.1f}秒)")
+        else:
+            st.caption(f"{label}: スキップ")
+    if job["memo_partial"]:
+        # メモは生成された分から表示する（完了後は結果タブに全文を表示）
+        st.text_area("分析メモ（生成中）", job["memo_partial"], height=300)
+
+
+def _poll_job():
+    """実行中のジョブがあれば進捗を表示して再実行し、完了していれば結果を読み込む"""
+    job_id = st.session_state.get("job_id") or st.experimental_get_query_params().get("job", [None])[0]
+    if not job_id or st.session_state.get("loaded_job") == job_id:
+        return
+    queue = get_job_queue()
+    job = queue.get(job_id)
+    if job is None:
+        st.warning("指定された分析ジョブが見つかりません。")
+        st.session_state.pop("job_id", None)
+        return
+    if job["status"] in ("queued", "running"):
+        _render_job_progress(job)
+        # スクリプトは短時間で終わり、一定間隔で再実行して進捗を取り直す
+        # （メモの生成中は途中の本文を早めに反映するため間隔を短くする）
+        memo_running = job["stages"].get("memo", {}).get("status") == "running"
+        time.sleep(MEMO_PARTIAL_INTERVAL_SECONDS if memo_running else JOB_POLL_SECONDS)
+        st.rerun()
+    if job["status"] == "failed":
+        st.error(f"分析に失敗しました: {job['error']}")
+        st.session_state["loaded_job"] = job_id
+        return
+
+    result = queue.result(job_id)
+    if result is None:
+        st.warning("分析結果が見つかりません（保持期間を過ぎた可能性があります）。")
+        st.session_state["loaded_job"] = job_id
+        return
+    st.session_state["job_id"] = job_id
+    st.session_state["loaded_job"] = job_id
+    st.session_state["warnings"] = result["warnings"]
+    st.session_state["silence_stats"] = result["silence_stats"]
+    st.session_state["silence_sweep"] = result["silence_sweep"]
+    st.session_state["transcript"] = result["transcript"]
+    st.session_state["memo"] = result["memo"]
+    st.session_state["duration"] = result["duration"]
+    st.session_state["rms_times"] = result["analysis"].times
+    st.session_state["rms_db"] = result["analysis"].rms_db
+    st.session_state["db_threshold"] = result["db_threshold"]
+    st.session_state["speaker_lines"] = result["speaker_lines"]
+    st.session_state["metrics"] = result.get("metrics", [])
+    st.session_state["result_key"] = result["content_hash"]
+
+
 def main():
     st.set_page_config(page_title="音声転換ツール", page_icon="🎙️")
     st.markdown(
@@ -142,7 +246,7 @@ def main():
             "沈黙判定しきい値 (dB)",
             options=SILENCE_DB_OPTIONS,
             index=SILENCE_DB_OPTIONS.index(SILENCE_DB_THRESHOLD),
-            help="数値が小さいほど沈黙判定が厳しくなります。",
+            help="数値が小さいほど沈黙判定が厳しくなります。分析後も再計算なしで切り替えられます。",
         )
         uploaded_file = st.file_uploader(
             "upload",
@@ -155,99 +259,65 @@ def main():
     error = _validate_upload(uploaded_file)
     if error:
         st.info(error)
-        return
-
-    if st.button("分析開始"):
-        with st.spinner("処理中..."):
-            with tempfile.NamedTemporaryFile(delete=False, suffix=f".{uploaded_file.name.split('.')[-1]}") as tmp:
-                tmp.write(uploaded_file.getbuffer())
-                tmp_path = tmp.name
-
-            try:
-                y, sr = AudioProcessor.load_audio(tmp_path)
-                silence_events = AudioProcessor.detect_silence(y, sr, db_threshold=db_threshold)
-                silence_stats = AudioProcessor.calculate_silence_stats(silence_events)
-                total_duration = AudioProcessor.get_duration(y, sr)
-                rms_times, rms_db = AudioProcessor.rms_db(y, sr)
-
-                if enable_diarization:
-                    transcript, segments = TranscriptionService().transcribe(tmp_path, return_segments=True)
-                else:
-                    transcript = TranscriptionService().transcribe(tmp_path, return_segments=False)
-                    segments = []
-                memo = MemoGenerationService().generate_memo(
-                    transcript=transcript,
-                    silence_stats=silence_stats,
-                    total_duration=total_duration,
-                )
-
-                st.session_state["silence_stats"] = silence_stats
-                st.session_state["transcript"] = transcript
-                st.session_state["memo"] = memo
-                st.session_state["duration"] = total_duration
-                st.session_state["rms_times"] = rms_times
-                st.session_state["rms_db"] = rms_db
-                st.session_state["db_threshold"] = db_threshold
-                st.session_state["speaker_lines"] = []
+    elif st.button("分析開始"):
+        # 解析はバックグラウンドのジョブとして実行し、この画面は進捗を確認するだけにする
+        # アップロードはチャンク単位でディスクに書き出し、内容のハッシュも同時に求める
+        job_id = get_job_queue().submit(
+            uploaded_file,
+            suffix=f".{uploaded_file.name.split('.')[-1]}",
+            db_threshold=db_threshold,
+            enable_diarization=enable_diarization,
+        )
+        st.session_state["job_id"] = job_id
+        # URL にジョブIDを残し、再読み込み後も同じ結果を表示できるようにする
+        st.experimental_set_query_params(job=job_id)
 
-                if enable_diarization:
-                    if not HF_TOKEN:
-                        st.warning("HF_TOKEN が未設定のため話者分離をスキップしました。")
-                    else:
-                        try:
-                            diarizer = SpeakerDiarizationService()
-                            diar_segments = diarizer.diarize(tmp_path)
-                            speaker_lines = []
-                            for dseg in diar_segments:
-                                start = dseg["start"]
-                                end = dseg["end"]
-                                speaker = dseg["speaker"]
-                                texts = []
-                                for tseg in segments:
-                                    mid = (tseg["start"] + tseg["end"]) / 2
-                                    if start <= mid <= end:
-                                        texts.append(tseg["text"])
-                                line = f"{speaker}: {''.join(texts).strip()}"
-                                if line.strip() and line.strip() != f"{speaker}:":
-                                    speaker_lines.append(line)
-                            st.session_state["speaker_lines"] = speaker_lines
-                        except Exception as exc:
-                            st.warning(f"話者分離に失敗しました: {exc}")
-            finally:
-                try:
-                    os.remove(tmp_path)
-                except OSError:
-                    pass
+    _poll_job()
 
     if "silence_stats" in st.session_state:
-        tabs = st.tabs(["沈黙統計", "分析メモ", "文字プレビュー", "沈黙プレビュー", "声量波形"])
+        for message in st.session_state.get("warnings", []):
+            st.warning(message)
+        silence_sweep = st.session_state["silence_sweep"]
+        view_threshold = db_threshold if db_threshold in silence_sweep else st.session_state["db_threshold"]
+        stats = silence_sweep[view_threshold]
+        result_key = st.session_state.get("result_key")
+        tabs = st.tabs(["沈黙統計", "分析メモ", "文字プレビュー", "沈黙プレビュー", "声量波形", "診断"])
 
         with tabs[0]:
-            stats = st.session_state["silence_stats"]
             st.metric("全体の沈黙時間 (秒)", stats["total_silence_time"])
             st.metric("2秒以上 沈黙回数", stats["2s+"]["count"])
             st.subheader("Top10 長い沈黙")
             st.dataframe(stats["longest_silences"], use_container_width=True)
-            summary_df = pd.DataFrame(
-                [{
-                    "total_silence_time_s": stats["total_silence_time"],
-                    "long_count": stats["2s+"]["count"],
-                    "long_total_time_s": stats["2s+"]["total_time"],
-                }]
-            )
-            top10_df = pd.DataFrame(stats["longest_silences"])
-            output = io.BytesIO()
-            with pd.ExcelWriter(output, engine="openpyxl") as writer:
-                summary_df.to_excel(writer, index=False, sheet_name="summary")
-                top10_df.to_excel(writer, index=False, sheet_name="top10")
-            st.download_button(
-                label="沈黙統計をExcelでダウンロード",
-                data=output.getvalue(),
-                file_name="silence_stats.xlsx",
-                mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+            st.subheader("沈黙の長さの分布")
+            histogram = stats["duration_histogram"]
+            st.bar_chart(pd.DataFrame({"count": histogram["counts"]}, index=histogram["labels"]))
+            percentile_cols = st.columns(len(stats["duration_percentiles"]))
+            for col, (name, value) in zip(percentile_cols, stats["duration_percentiles"].items()):
+                col.metric(f"{name} (秒)", value)
+            _export_download(
+                "沈黙統計",
+                "silence_stats",
+                (result_key, view_threshold, "silence_stats"),
+                lambda: {
+                    "summary": pd.DataFrame(
+                        [{
+                            "total_silence_time_s": stats["total_silence_time"],
+                            "long_count": stats["2s+"]["count"],
+                            "long_total_time_s": stats["2s+"]["total_time"],
+                            **{f"{name}_s": value for name, value in stats["duration_percentiles"].items()},
+                        }]
+                    ),
+                    "top10": pd.DataFrame(stats["longest_silences"]),
+                    "histogram": pd.DataFrame(
+                        {"range": stats["duration_histogram"]["labels"], "count": stats["duration_histogram"]["counts"]}
+                    ),
+                },
+                multi_table=True,
             )
 
         with tabs[1]:
+            if view_threshold != st.session_state["db_threshold"]:
+                st.caption(f"分析メモは {st.session_state['db_threshold']} dB の沈黙統計で生成されています。")
             st.text_area("分析メモ", st.session_state["memo"], height=300)
             st.download_button(
                 label="分析メモをTXTでダウンロード",
@@ -272,55 +342,61 @@ def main():
             )
 
         with tabs[3]:
-            all_silences_df = pd.DataFrame(st.session_state["silence_stats"]["all_silences"])
-            st.dataframe(all_silences_df.head(10), use_container_width=True)
-            output = io.BytesIO()
-            with pd.ExcelWriter(output, engine="openpyxl") as writer:
-                all_silences_df.to_excel(writer, index=False, sheet_name="all_silences")
-            st.download_button(
-                label="全沈黙一覧をExcelでダウンロード",
-                data=output.getvalue(),
-                file_name="all_silences.xlsx",
-                mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+            st.dataframe(stats["all_silences"].to_frame(limit=10), use_container_width=True)
+            _export_download(
+                "全沈黙一覧",
+                "all_silences",
+                (result_key, view_threshold, "all_silences"),
+                lambda: {"all_silences": stats["all_silences"].to_frame()},
             )
 
         with tabs[4]:
             chart_data = {"time_s": st.session_state["rms_times"], "dB": st.session_state["rms_db"]}
-            fig, ax = plt.subplots(figsize=(10, 3))
-            ax.plot(st.session_state["rms_times"], st.session_state["rms_db"], linewidth=0.8)
-            for e in st.session_state["silence_stats"]["all_silences"]:
-                ax.axvspan(e["start"], e["end"], color="#93a7ff", alpha=0.12, linewidth=0)
-                mid = (e["start"] + e["end"]) / 2
-                ax.axvline(mid, color="#1f2a7a", linewidth=1.0, alpha=0.8)
-            ax.set_xlabel("time (s)")
-            ax.set_ylabel("RMS dB")
-            ax.axhline(st.session_state.get("db_threshold", SILENCE_DB_THRESHOLD), color="red", linestyle="--", linewidth=0.8)
-            ax.set_title("Volume Waveform (RMS dB)")
-            fig.tight_layout()
-            st.pyplot(fig, use_container_width=True)
+            # 描画済みPNGは解析結果・しきい値ごとにキャッシュされ、再実行時は再描画しない
+            png = render_waveform_png(
+                st.session_state["rms_times"],
+                st.session_state["rms_db"],
+                stats["all_silences"],
+                view_threshold,
+                cache_key=result_key,
+            )
+            st.image(png, use_column_width=True)
             st.caption(
-                f"沈黙判定しきい値: {st.session_state.get('db_threshold', SILENCE_DB_THRESHOLD)} dB（最大音量=0 dB）"
+                f"沈黙判定しきい値: {view_threshold} dB（最大音量=0 dB）"
             )
-            png = io.BytesIO()
-            fig.savefig(png, format="png", dpi=150)
-            plt.close(fig)
             st.download_button(
                 label="声量波形をPNGでダウンロード",
-                data=png.getvalue(),
+                data=png,
                 file_name="volume_waveform.png",
                 mime="image/png",
             )
-            waveform_df = pd.DataFrame(chart_data)
-            output = io.BytesIO()
-            with pd.ExcelWriter(output, engine="openpyxl") as writer:
-                waveform_df.to_excel(writer, index=False, sheet_name="waveform")
-            st.download_button(
-                label="声量波形をExcelでダウンロード",
-                data=output.getvalue(),
-                file_name="volume_waveform.xlsx",
-                mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+            _export_download(
+                "声量波形",
+                "volume_waveform",
+                (result_key, "waveform"),
+                lambda: {"waveform": pd.DataFrame(chart_data)},
             )
 
+        with tabs[5]:
+            metrics = st.session_state.get("metrics") or []
+            if not metrics:
+                st.info("この分析結果には計測記録がありません。")
+            else:
+                diagnostics = pd.DataFrame(metrics)
+                diagnostics["label"] = diagnostics["stage"].map(lambda s: STAGE_LABELS.get(s, s))
+                st.bar_chart(diagnostics.set_index("label")[["wall_seconds", "cpu_seconds"]])
+                columns = [
+                    "label", "status", "wall_seconds", "admission_wait_seconds", "cpu_seconds", "process_cpu_seconds",
+                    "rss_mb", "rss_delta_mb", "peak_rss_mb", "alloc_peak_mb",
+                    "api_calls", "api_request_bytes", "api_response_bytes", "api_seconds",
+                ]
+                st.dataframe(diagnostics[[c for c in columns if c in diagnostics]], use_container_width=True)
+                st.caption(
+                    "cpu_seconds はステージを実行したスレッドのCPU時間、process_cpu_seconds は同時に走った"
+                    "他のステージを含むプロセス全体のCPU時間です。RSS はプロセス全体の値です。"
+                    "admission_wait_seconds は他の解析が重い処理の枠を使っていて待った時間です。"
+                )
+
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,219 @@
+"""録音ファイルの一括分析（ヘッドレス実行用CLI）
+
+    python batch.py recordings/ -o results/
+    python batch.py manifest.txt -o results/ --diarization --format parquet
+
+ディレクトリ内の音声ファイル（またはマニフェストに列挙したファイル）を
+app.py と同じパイプラインで分析し、ファイルごとのJSONと集計CSV/Parquetを出力する。
+音声解析はプロセスプールで、API呼び出しは別に上限を設けたスレッドで並列実行する。
+デコードはファイルごとに1回で、プロセスプールで作った16kHz音声をAPI側でそのまま使う（文字起こし用の圧縮はAPI側で16kHz音声から行う）。
+出力済みのJSONがあるファイルはスキップするため、中断後に同じコマンドで再開できる。
+"""
+import argparse
+import csv
+import json
+import os
+import sys
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed
+from pathlib import Path
+
+# Ensure project root is on sys.path even if run from another working dir.
+_ROOT = Path(__file__).resolve().parent
+if str(_ROOT) not in sys.path:
+    sys.path.insert(0, str(_ROOT))
+
+from config import (  # noqa: E402
+    BATCH_API_CONCURRENCY,
+    CACHE_DIR,
+    FRAME_LENGTH,
+    HOP_LENGTH,
+    SILENCE_DB_OPTIONS,
+    SILENCE_DB_THRESHOLD,
+    SUPPORTED_FORMATS,
+)
+from services import AudioProcessor, StageCache, run_analysis  # noqa: E402
+from services.exports import available_formats  # noqa: E402
+from services.fsutil import atomic_write  # noqa: E402
+
+SUMMARY_NAME = "summary"
+
+
+def collect_inputs(source):
+    """ディレクトリ、またはマニフェスト（1行1パス / path列を持つCSV）から対象ファイルを集める
+
+    Returns:
+        list: (音声ファイルパス, 出力名) のリスト
+    """
+    source = Path(source)
+    if source.is_dir():
+        paths = sorted(
+            p for p in source.rglob("*") if p.is_file() and p.suffix.lower().lstrip(".") in SUPPORTED_FORMATS
+        )
+        base = source
+    else:
+        base = source.parent
+        with open(source, encoding="utf-8") as f:
+            if source.suffix.lower() == ".csv":
+                entries = [row["path"] for row in csv.DictReader(f)]
+            else:
+                entries = [line.strip() for line in f if line.strip() and not line.startswith("#")]
+        paths = [p if p.is_absolute() else base / p for p in map(Path, entries)]
+    inputs = []
+    for path in paths:
+        try:
+            relative = path.resolve().relative_to(base.resolve())
+        except ValueError:
+            relative = Path(path.name)
+        inputs.append((str(path), "__".join(relative.with_suffix("").parts)))
+    return inputs
+
+
+def _local_job(audio_path, db_threshold, cache_dir, resolution):
+    """プロセスプール側: 音声解析と沈黙検出を行い、結果をディスクキャッシュに残す
+
+    デコードした16kHz共有音声（PreparedAudio）は削除せずに返し、
+    API側で同じファイルをデコードし直さないようにする（キャッシュから読めてデコードしなかった場合は None）。
+    """
+    result = run_analysis(
+        audio_path,
+        db_threshold=db_threshold,
+        cache=StageCache(cache_dir),
+        local_only=True,
+        keep_prepared=True,
+        **resolution,
+    )
+    return result["prepared"]
+
+
+def _api_job(audio_path, output_path, db_threshold, enable_diarization, cache_dir, resolution, prepared=None):
+    """スレッド側: 残りのステージ（文字起こし・話者分離・メモ生成）を実行しJSONを書き出す"""
+    try:
+        result = run_analysis(
+            audio_path,
+            db_threshold=db_threshold,
+            enable_diarization=enable_diarization,
+            cache=StageCache(cache_dir),
+            prepared_audio=prepared,
+            **resolution,
+        )
+    finally:
+        if prepared is not None:
+            prepared.cleanup()
+    payload = {
+        "file": audio_path,
+        "duration": result["duration"],
+        "db_threshold": result["db_threshold"],
+        **resolution,
+        "silence_stats": AudioProcessor.export_silence_stats(result["silence_stats"]),
+        "transcript": result["transcript"],
+        "segments": result["segments"],
+        "memo": result["memo"],
+        "speaker_turns": result["speaker_turns"],
+        "timings": result["timings"],
+        "warnings": result["warnings"],
+    }
+    # 途中で落ちても壊れたJSONが「完了済み」と見なされないよう一時ファイルから置き換える
+    data = json.dumps(payload, ensure_ascii=False, indent=2).encode("utf-8")
+    atomic_write(output_path, lambda f: f.write(data))
+    return payload
+
+
+def summarize(output_dir, fmt="csv"):
+    """出力ディレクトリ内の全JSONから集計表を作成"""
+    import pandas as pd
+
+    rows = []
+    for path in sorted(Path(output_dir).glob("*.json")):
+        with open(path, encoding="utf-8") as f:
+            result = json.load(f)
+        stats = result["silence_stats"]
+        duration = result["duration"] or 0
+        rows.append(
+            {
+                "name": path.stem,
+                "file": result["file"],
+                "duration_s": duration,
+                "db_threshold": result["db_threshold"],
+                "total_silence_time_s": stats["total_silence_time"],
+                "silence_ratio": round(stats["total_silence_time"] / duration, 4) if duration > 0 else 0,
+                "long_count": stats["2s+"]["count"],
+                "long_total_time_s": stats["2s+"]["total_time"],
+                "longest_silence_s": max((e["duration"] for e in stats["all_silences"]), default=0),
+                "transcript_chars": len(result["transcript"] or ""),
+                "speakers": len({t["speaker"] for t in result["speaker_turns"]}),
+            }
+        )
+    df = pd.DataFrame(rows)
+    if fmt == "parquet":
+        summary_path = Path(output_dir) / f"{SUMMARY_NAME}.parquet"
+        df.to_parquet(summary_path, index=False)
+    else:
+        summary_path = Path(output_dir) / f"{SUMMARY_NAME}.csv"
+        df.to_csv(summary_path, index=False, encoding="utf-8-sig")
+    return summary_path
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="録音ファイルの一括分析")
+    parser.add_argument("source", help="音声ファイルのディレクトリ、またはマニフェスト（.txt / path列の.csv）")
+    parser.add_argument("-o", "--output-dir", required=True, help="結果の出力ディレクトリ")
+    parser.add_argument("--db-threshold", type=float, default=SILENCE_DB_THRESHOLD,
+                        help=f"沈黙判定しきい値 (dB)。選択肢: {SILENCE_DB_OPTIONS}")
+    parser.add_argument("--frame-length", type=int, default=FRAME_LENGTH,
+                        help="RMSのフレーム長（サンプル数）。索引の刻み幅が同じなら音量の索引のキャッシュから求め、デコードし直さない")
+    parser.add_argument("--hop-length", type=int, default=HOP_LENGTH, help="RMSのホップ長（サンプル数）")
+    parser.add_argument("--diarization", action="store_true", help="話者分離を有効化")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1, help="音声解析のプロセス数")
+    parser.add_argument("--api-concurrency", type=int, default=BATCH_API_CONCURRENCY,
+                        help="同時にAPI処理を行うファイル数")
+    parser.add_argument("--format", choices=["csv", "parquet"], default="csv", help="集計表の形式")
+    parser.add_argument("--cache-dir", default=CACHE_DIR, help="ステージキャッシュのディレクトリ")
+    args = parser.parse_args(argv)
+    # 全ファイルを処理し終えてから集計で失敗しないよう、書き出せない形式は最初に断る
+    if args.format not in available_formats():
+        parser.error(f"--format {args.format} には pyarrow が必要です（pip install pyarrow）")
+
+    output_dir = Path(args.output_dir)
+    output_dir.mkdir(parents=True, exist_ok=True)
+    inputs = collect_inputs(args.source)
+    pending = [(path, output_dir / f"{name}.json") for path, name in inputs if not (output_dir / f"{name}.json").exists()]
+    print(f"{len(inputs)} files, {len(inputs) - len(pending)} already done, {len(pending)} to process", file=sys.stderr)
+
+    resolution = {"frame_length": args.frame_length, "hop_length": args.hop_length}
+    failures = []
+    with ProcessPoolExecutor(max_workers=max(1, args.workers)) as dsp_pool, \
+            ThreadPoolExecutor(max_workers=max(1, args.api_concurrency)) as api_pool:
+        local_futures = {
+            dsp_pool.submit(_local_job, path, args.db_threshold, args.cache_dir, resolution): (path, output_path)
+            for path, output_path in pending
+        }
+        api_futures = {}
+        # 音声解析が終わったファイルから順にAPI処理へ回す
+        for future in as_completed(local_futures):
+            path, output_path = local_futures[future]
+            try:
+                prepared = future.result()
+            except Exception as exc:
+                failures.append((path, exc))
+                print(f"[failed] {path}: {exc}", file=sys.stderr)
+                continue
+            api_futures[api_pool.submit(
+                _api_job, path, output_path, args.db_threshold, args.diarization, args.cache_dir, resolution, prepared
+            )] = path
+        for future in as_completed(api_futures):
+            path = api_futures[future]
+            try:
+                future.result()
+            except Exception as exc:
+                failures.append((path, exc))
+                print(f"[failed] {path}: {exc}", file=sys.stderr)
+            else:
+                print(f"[done] {path}", file=sys.stderr)
+
+    summary_path = summarize(output_dir, args.format)
+    print(f"summary: {summary_path}", file=sys.stderr)
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,196 @@
+"""同時に多数の解析を受け付けたときの受付制御（services.admission）の確認
+
+    python benchmarks/bench_admission.py
+    python benchmarks/bench_admission.py --users 8 --duration 300 --cpu-slots 2 --latency-ms 500
+    python benchmarks/bench_admission.py --cpu-count 8
+
+複数のユーザーが同時に解析を始めた状況を、別々の合成音声に対する run_analysis を
+同時に --users 個のスレッドで走らせて再現する（API はローカルの代替サーバー）。
+話者分離も有効にし、pyannote の代わりに音の高さで話者を判定する代替処理（bench_diarization_skip と同じ）を、
+共有パイプラインと同じ推論ロック（speaker_diarization._infer_lock）の中で実行する。
+枠を事実上なくした場合（全員が同時に走る）と、--cpu-slots / --api-slots の枠で制限した場合を比べ、
+次のいずれかを満たさなければ終了コード1を返す。
+
+- 実行中の件数が、種類ごとの枠を一度も超えない
+- 待たされた解析に待ち順が通知され、待ち順は減る一方で、最後に枠に入ったことが通知される
+- 話者分離がCPUの枠を取ったまま推論ロックを待たない（合計 --max-lock-wait 秒以内）
+- 話者分離の torch の演算スレッド数が「論理CPU数 ÷ CPUの枠数」（CPUの枠1つ分）になっている
+- 全員が終わるまでの時間が、枠なしの場合の (1 + --tolerance) 倍以内に収まる
+"""
+import argparse
+import os
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+import numpy as np
+
+ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(ROOT))
+sys.path.insert(0, str(ROOT / "benchmarks"))
+
+from bench_diarization_skip import pitch_turns  # noqa: E402
+from fake_openai import FakeOpenAIServer  # noqa: E402
+import synthetic  # noqa: E402
+
+
+class PitchDiarization:
+    """SpeakerDiarizationService の代替（推論は共有パイプラインと同じロックの中で行う）
+
+    ロックを待った時間は、CPUの枠を取ったまま何もしていなかった時間として記録する。
+    """
+
+    lock_waits = []
+    torch_threads_seen = set()
+
+    def __init__(self, pipeline=None, model=None, torch_threads=0, batch_size=0):
+        self.torch_threads = torch_threads
+
+    def diarize(self, audio, sample_rate=None, silences=None):
+        from services import speaker_diarization
+
+        start = time.perf_counter()
+        with speaker_diarization._infer_lock:
+            PitchDiarization.lock_waits.append(time.perf_counter() - start)
+            PitchDiarization.torch_threads_seen.add(self.torch_threads)
+            return pitch_turns(np.asarray(audio), sample_rate)
+
+
+def use_pitch_diarization():
+    """run_analysis の話者分離を代替処理に差し替える（HF_TOKEN・pyannote なしで動かすため）"""
+    from services import pipeline, speaker_diarization
+
+    pipeline.diarization_available = lambda: True
+    speaker_diarization.SpeakerDiarizationService = PitchDiarization
+
+
+def run_users(paths, controller, work_dir, label):
+    """全員分の解析を同時に始め、(全体の秒数, 各自の秒数, 待ち順の通知, 種類ごとの最大実行数) を返す"""
+    from services import StageCache, run_analysis
+
+    peaks = {kind: 0 for kind in controller.slots}
+    stop = threading.Event()
+
+    def sample():
+        while not stop.is_set():
+            for kind, stat in controller.stats().items():
+                peaks[kind] = max(peaks[kind], stat["active"])
+            time.sleep(0.002)
+
+    def user(index):
+        waits = []
+        cache = StageCache(os.path.join(work_dir, f"cache_{label}_{index}"))
+        start = time.perf_counter()
+        run_analysis(
+            paths[index],
+            enable_diarization=True,
+            cache=cache,
+            admission=controller,
+            on_wait=lambda stage, position: waits.append((stage, position)),
+        )
+        return time.perf_counter() - start, waits
+
+    sampler = threading.Thread(target=sample, daemon=True)
+    sampler.start()
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=len(paths)) as pool:
+        results = list(pool.map(user, range(len(paths))))
+    makespan = time.perf_counter() - start
+    stop.set()
+    sampler.join()
+    return makespan, [r[0] for r in results], [r[1] for r in results], peaks
+
+
+def waits_consistent(waits):
+    """ステージごとに、枠を待つたびに待ち順が減る一方で、最後に None（枠に入った）で終わるか
+
+    話者分離は話者分離の枠・CPUの枠を順に待つため、1つのステージで複数回の待ちが続くことがある。
+    """
+    by_stage = {}
+    for stage, position in waits:
+        by_stage.setdefault(stage, []).append(position)
+    for positions in by_stage.values():
+        if positions[-1] is not None:
+            return False
+        numbers = []
+        for position in positions:
+            if position is None:
+                if numbers != sorted(numbers, reverse=True):
+                    return False
+                numbers = []
+            else:
+                numbers.append(position)
+    return True
+
+
+def main():
+    parser = argparse.ArgumentParser(description="受付制御の確認")
+    parser.add_argument("--users", type=int, default=6, help="同時に解析を始めるユーザー数")
+    parser.add_argument("--duration", type=float, default=300, help="各ユーザーの合成音声の長さ（秒）")
+    parser.add_argument("--cpu-slots", type=int, default=2)
+    parser.add_argument("--api-slots", type=int, default=8)
+    parser.add_argument("--latency-ms", type=float, default=300.0, help="代替APIサーバーの応答遅延")
+    parser.add_argument("--tolerance", type=float, default=0.15, help="枠なしより遅くてよい割合")
+    parser.add_argument("--cpu-count", type=int, default=os.cpu_count() or 1,
+                        help="受付制御に渡す論理CPU数（話者分離の torch スレッド数の確認に使う）")
+    parser.add_argument("--max-lock-wait", type=float, default=0.05,
+                        help="話者分離がCPUの枠を取ったまま推論ロックを待ってよい合計秒数")
+    args = parser.parse_args()
+
+    with FakeOpenAIServer(latency_ms=args.latency_ms) as server:
+        os.environ["OPENAI_BASE_URL"] = server.base_url
+        os.environ.setdefault("OPENAI_API_KEY", "sk-benchmark")
+        from services import AdmissionController
+
+        use_pitch_diarization()
+
+        with tempfile.TemporaryDirectory(prefix="dannwa-admission-") as work_dir:
+            paths = []
+            for i in range(args.users):
+                path = os.path.join(work_dir, f"user_{i}.wav")
+                synthetic.write_audio(path, synthetic.make_layout(args.duration, seed=i), seed=i)
+                paths.append(path)
+
+            # import や numba の JIT コンパイルが最初の計測に混ざらないよう、短い音声で一度通す
+            warmup = os.path.join(work_dir, "warmup.wav")
+            synthetic.write_audio(warmup, synthetic.make_layout(5.0))
+            run_users([warmup], AdmissionController(), work_dir, "warmup")
+
+            unlimited = AdmissionController(cpu_slots=args.users, api_slots=args.users, cpu_count=args.cpu_count)
+            free_span, free_latency, _, _ = run_users(paths, unlimited, work_dir, "free")
+            limited = AdmissionController(cpu_slots=args.cpu_slots, api_slots=args.api_slots, cpu_count=args.cpu_count)
+            PitchDiarization.lock_waits.clear()
+            PitchDiarization.torch_threads_seen.clear()
+            span, latency, waits, peaks = run_users(paths, limited, work_dir, "limited")
+
+    failed = False
+    print(f"{args.users} 人が同時に {args.duration:.0f} 秒の音声を解析（論理CPU {os.cpu_count()}）")
+    print(f"枠なし: 全体 {free_span:.2f} 秒, 1人あたり平均 {sum(free_latency) / len(free_latency):.2f} 秒")
+    print(f"枠あり: 全体 {span:.2f} 秒, 1人あたり平均 {sum(latency) / len(latency):.2f} 秒")
+    failed |= span > free_span * (1 + args.tolerance)
+
+    within = all(peaks[kind] <= limited.slots[kind] for kind in peaks)
+    print(f"最大実行数: {peaks}（枠 {limited.slots}）, 枠内: {within}")
+    failed |= not within
+
+    lock_wait = sum(PitchDiarization.lock_waits)
+    threads = PitchDiarization.torch_threads_seen
+    print(
+        f"話者分離 {len(PitchDiarization.lock_waits)} 件: CPUの枠を取ったまま推論ロックを待った時間 {lock_wait:.3f} 秒, "
+        f"torch スレッド数 {sorted(threads)}（論理CPU {limited.cpu_count}, CPUの枠 {limited.slots['cpu']}）"
+    )
+    failed |= lock_wait > args.max_lock_wait or threads != {max(1, args.cpu_count // args.cpu_slots)}
+
+    waited = sum(1 for w in waits if w)
+    consistent = all(waits_consistent(w) for w in waits)
+    print(f"待たされた解析: {waited} 件, 待ち順の通知が正しい: {consistent}")
+    failed |= not consistent or (args.users > args.cpu_slots and not waited)
+
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
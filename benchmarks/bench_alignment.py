@@ -0,0 +1,71 @@
+"""話者割り当て（services.alignment）のスケーリング計測
+
+    python benchmarks/bench_alignment.py
+
+セグメント数を倍々に増やし、1要素あたりの時間が n log n 程度の伸びに
+収まっているか（二重ループの O(D×T) になっていないか）を確認する。
+"""
+import argparse
+import math
+import random
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from services.alignment import align_speakers  # noqa: E402
+
+
+def make_meeting(n_segments, n_speakers=4, seed=0):
+    """話者区間と文字起こしセグメントを合成（隙間や重なりを含む）"""
+    rng = random.Random(seed)
+    transcript, diarization = [], []
+    t = 0.0
+    for _ in range(n_segments):
+        length = rng.uniform(1.0, 8.0)
+        transcript.append({"start": t, "end": t + length, "text": "あ"})
+        t += length + rng.uniform(0.0, 1.5)
+    t = 0.0
+    end = transcript[-1]["end"]
+    while t < end:
+        length = rng.uniform(2.0, 20.0)
+        diarization.append({"start": t, "end": t + length, "speaker": f"SPEAKER_{rng.randrange(n_speakers):02d}"})
+        t += length + rng.uniform(-0.5, 2.0)
+    return transcript, diarization
+
+
+def measure(n_segments, repeat=3):
+    transcript, diarization = make_meeting(n_segments)
+    best = math.inf
+    for _ in range(repeat):
+        start = time.perf_counter()
+        align_speakers(transcript, diarization)
+        best = min(best, time.perf_counter() - start)
+    return best, len(diarization)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 2000, 4000, 8000, 16000, 32000])
+    parser.add_argument("--max-exponent", type=float, default=1.3,
+                        help="時間 ∝ n^k の k の上限（線形対数なら約1.1、二重ループなら約2）")
+    args = parser.parse_args()
+
+    print(f"{'segments':>10} {'turns':>8} {'time_ms':>10} {'us/(n log n)':>14}")
+    timings = []
+    for n in args.sizes:
+        elapsed, n_turns = measure(n)
+        total = n + n_turns
+        print(f"{n:>10} {n_turns:>8} {elapsed * 1000:>10.2f} {elapsed * 1e6 / (total * math.log2(total)):>14.4f}")
+        timings.append((n, elapsed))
+    (n0, t0), (n1, t1) = timings[0], timings[-1]
+    exponent = math.log(t1 / t0) / math.log(n1 / n0)
+    print(f"scaling exponent: {exponent:.2f}")
+    if exponent > args.max_exponent:
+        print("スケーリングが線形対数時間を超えています。")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
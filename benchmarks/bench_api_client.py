@@ -0,0 +1,95 @@
+"""共有 API クライアント（services.api_client）の負荷・再試行の確認
+
+    python benchmarks/bench_api_client.py
+    python benchmarks/bench_api_client.py --calls 200 --concurrency 16 --error-rate 0.3 --rpm 600
+
+ローカルの OpenAI 代替サーバーに 429（Retry-After 付き）と遅延を注入し、
+複数スレッドから同時に呼び出しても全件が再試行で成功するか、
+1分あたりの上限を超えて送信していないかを確認する。失敗があれば終了コード1を返す。
+"""
+import argparse
+import json
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(ROOT))
+sys.path.insert(0, str(ROOT / "benchmarks"))
+
+from fake_openai import FakeOpenAIServer  # noqa: E402
+
+
+def main():
+    parser = argparse.ArgumentParser(description="共有 API クライアントの負荷・再試行の確認")
+    parser.add_argument("--calls", type=int, default=100, help="呼び出し回数")
+    parser.add_argument("--concurrency", type=int, default=16, help="同時に呼び出すスレッド数")
+    parser.add_argument("--latency-ms", type=float, default=50.0)
+    parser.add_argument("--error-rate", type=float, default=0.3, help="429 を返す割合")
+    parser.add_argument("--retry-after", type=float, default=0.2, help="429 の Retry-After（秒）")
+    parser.add_argument("--rpm", type=int, default=6000, help="クライアント側のリクエスト上限（1分あたり）")
+    parser.add_argument("--max-retries", type=int, default=10)
+    parser.add_argument("--json", help="結果をJSONで保存するパス")
+    args = parser.parse_args()
+
+    with FakeOpenAIServer(
+        latency_ms=args.latency_ms, error_rate=args.error_rate, retry_after=args.retry_after
+    ) as server:
+        os.environ["OPENAI_BASE_URL"] = server.base_url
+        os.environ.setdefault("OPENAI_API_KEY", "sk-benchmark")
+        from services.api_client import ApiClient
+
+        api = ApiClient(rpm=args.rpm, max_retries=args.max_retries)
+
+        def one_call(i):
+            return api.call(
+                "chat",
+                api.openai.chat.completions.create,
+                tokens=100,
+                model="fake",
+                messages=[{"role": "user", "content": f"request {i}"}],
+                max_tokens=50,
+            )
+
+        start = time.perf_counter()
+        failures = 0
+        with ThreadPoolExecutor(max_workers=args.concurrency) as pool:
+            for future in [pool.submit(one_call, i) for i in range(args.calls)]:
+                try:
+                    future.result()
+                except Exception as exc:
+                    failures += 1
+                    print(f"failed: {exc.__class__.__name__}: {exc}")
+        elapsed = time.perf_counter() - start
+        injected = sum(r["status"] == 429 for r in server.requests)
+        sent = len(server.requests)
+
+    summary = api.summary().get("chat", {})
+    # バケット容量を超えた分は rpm の速さでしか送れない
+    capacity = api.requests.capacity
+    min_seconds = max(0.0, (sent - capacity) / (args.rpm / 60.0))
+    results = {
+        "calls": args.calls,
+        "failures": failures,
+        "injected_429": injected,
+        "server_requests": sent,
+        "elapsed_seconds": round(elapsed, 3),
+        "calls_per_second": round(args.calls / elapsed, 1),
+        "client": summary,
+    }
+    print(json.dumps(results, ensure_ascii=False, indent=2))
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(results, f, ensure_ascii=False, indent=2)
+
+    failed = failures > 0
+    if elapsed < min_seconds:
+        print(f"リクエスト上限（{args.rpm}/分）を超える速さで送信しています。")
+        failed = True
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,168 @@
+"""沈黙を除いた話者分離（SpeechTimeline）の時刻の対応と処理時間の確認
+
+    python benchmarks/bench_diarization_skip.py
+    python benchmarks/bench_diarization_skip.py --duration 3600
+
+pyannote のモデルや HF_TOKEN なしで動かせるよう、話者分離の代わりに
+「短い窓をずらしながら基本周波数で話者を判定する」代替処理を使う（合成音声は話者ごとに音の高さが違う）。
+代替処理も pyannote と同じく入力の長さに比例して時間がかかる。
+
+全体に対して実行した場合と、長い沈黙を取り除いた圧縮時間軸で実行して元の時刻に戻した場合を比べ、
+次のいずれかを満たさなければ終了コード1を返す。
+
+- 元の時刻に戻した話者区間が、取り除いた沈黙と重ならない
+- 正しい話者を割り当てた発話の割合が、全体に対して実行した場合より --max-accuracy-drop 以上下がらない
+- 処理時間の比が「残した長さの割合 × 1.25 + 0.05」以下に収まる
+
+torch がインストールされていれば、SpeakerDiarizationService.diarize(silences=...) 経由でも同じ結果になるか確認する。
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import numpy as np
+
+ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(ROOT))
+sys.path.insert(0, str(ROOT / "benchmarks"))
+
+import synthetic  # noqa: E402
+from services.audio_processor import AudioProcessor  # noqa: E402
+from services.speaker_diarization import SpeakerDiarizationService, SpeechTimeline  # noqa: E402
+
+WINDOW_SECONDS = 0.1
+STEP_SECONDS = 0.02
+SPEECH_RMS = 0.02
+
+
+def pitch_turns(y, sr):
+    """窓ごとの基本周波数から話者区間を作る（話者分離の代替）"""
+    win, step = int(WINDOW_SECONDS * sr), int(STEP_SECONDS * sr)
+    if len(y) < win:
+        return []
+    frames = np.lib.stride_tricks.sliding_window_view(np.asarray(y, dtype=np.float32), win)[::step]
+    rms = np.sqrt(np.mean(frames.astype(np.float64) ** 2, axis=1))
+    spectrum = np.abs(np.fft.rfft(frames * np.hanning(win), axis=1))
+    freqs = np.fft.rfftfreq(win, 1.0 / sr)
+    band = (freqs >= 60) & (freqs <= 400)
+    f0 = freqs[band][np.argmax(spectrum[:, band], axis=1)]
+    labels = np.where(rms > SPEECH_RMS, np.rint((f0 - 110.0) / 60.0).astype(int), -1)
+
+    turns = []
+    changes = np.flatnonzero(np.diff(labels)) + 1
+    for first, last in zip(np.concatenate(([0], changes)), np.concatenate((changes, [len(labels)]))):
+        if labels[first] < 0:
+            continue
+        center = (np.array([first, last - 1]) * step + win / 2) / sr
+        turns.append(
+            {
+                "start": float(max(center[0] - STEP_SECONDS / 2, 0.0)),
+                "end": float(center[1] + STEP_SECONDS / 2),
+                "speaker": f"SPEAKER_{labels[first]:02d}",
+            }
+        )
+    return turns
+
+
+class PitchPipeline:
+    """pyannote のパイプラインと同じ呼び出し方・戻り値の代替（torch がある場合のみ使用）"""
+
+    class _Segment:
+        def __init__(self, start, end):
+            self.start, self.end = start, end
+
+    class _Annotation:
+        def __init__(self, turns):
+            self.turns = turns
+
+        def itertracks(self, yield_label=False):
+            for turn in self.turns:
+                yield PitchPipeline._Segment(turn["start"], turn["end"]), None, turn["speaker"]
+
+    def __call__(self, file):
+        waveform = file["waveform"].numpy()[0]
+        return self._Annotation(pitch_turns(waveform, file["sample_rate"]))
+
+
+def labels_on_grid(turns, duration, resolution=0.01):
+    """10ms ごとの話者ラベル（発話なしは空文字）"""
+    grid = np.full(int(duration / resolution), "", dtype=object)
+    for turn in turns:
+        grid[int(turn["start"] / resolution):int(turn["end"] / resolution)] = turn["speaker"]
+    return grid
+
+
+def accuracy(reference, hypothesis):
+    speech = reference != ""
+    return float(np.mean(hypothesis[speech] == reference[speech])) if speech.any() else 1.0
+
+
+def timed(func, repeat):
+    best, result = float("inf"), None
+    for _ in range(repeat):
+        start = time.process_time()
+        result = func()
+        best = min(best, time.process_time() - start)
+    return result, best
+
+
+def main():
+    parser = argparse.ArgumentParser(description="沈黙を除いた話者分離の確認")
+    parser.add_argument("--duration", type=float, default=1800, help="合成音声の長さ（秒）")
+    parser.add_argument("--repeat", type=int, default=3, help="処理時間の計測回数（最小値を使う）")
+    parser.add_argument("--max-accuracy-drop", type=float, default=0.005)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    layout = synthetic.make_layout(args.duration, seed=args.seed)
+    path = os.path.join(tempfile.mkdtemp(prefix="dannwa-diar-"), "synthetic.wav")
+    synthetic.write_audio(path, layout, seed=args.seed)
+    y, sr = AudioProcessor.load_audio(path)
+    os.remove(path)
+    silences = AudioProcessor.detect_silence(y, sr)
+
+    timeline = SpeechTimeline.from_silences(silences, len(y), sr)
+    kept = timeline.duration / (len(y) / sr)
+    full, full_seconds = timed(lambda: pitch_turns(y, sr), args.repeat)
+    compact = timeline.compact(y)
+    mapped, compact_seconds = timed(lambda: timeline.map_turns(pitch_turns(compact, sr)), args.repeat)
+    failed = False
+    print(f"沈黙 {len(silences)} 件, 取り除いた長さ {timeline.removed_seconds(len(y)):.1f} 秒（残した割合 {kept:.3f}）")
+
+    # 元の時刻に戻した区間は、残した区間のどれか1つに収まる
+    region = np.searchsorted(timeline.starts, [t["start"] * sr for t in mapped], side="right") - 1
+    inside = all(
+        i >= 0 and t["start"] * sr >= timeline.starts[i] - 1 and t["end"] * sr <= timeline.ends[i] + 1
+        for i, t in zip(region, mapped)
+    )
+    print(f"話者区間 {len(mapped)} 件, 取り除いた沈黙と重ならない: {inside}")
+    failed |= not inside
+
+    reference = labels_on_grid(layout["speech"], args.duration)
+    full_acc = accuracy(reference, labels_on_grid(full, args.duration))
+    compact_acc = accuracy(reference, labels_on_grid(mapped, args.duration))
+    print(f"正しい話者の割合: 全体 {full_acc:.4f}, 沈黙除去 {compact_acc:.4f}")
+    failed |= compact_acc < full_acc - args.max_accuracy_drop
+
+    ratio = compact_seconds / full_seconds
+    print(f"処理時間（CPU）: 全体 {full_seconds:.3f} 秒, 沈黙除去 {compact_seconds:.3f} 秒（比 {ratio:.3f}）")
+    failed |= ratio > kept * 1.25 + 0.05
+
+    try:
+        import torch  # noqa: F401
+    except ImportError:
+        print("torch がないため SpeakerDiarizationService 経由の確認は省略")
+    else:
+        via_service = SpeakerDiarizationService(pipeline=PitchPipeline()).diarize(y, sample_rate=sr, silences=silences)
+        same = via_service == mapped
+        print(f"SpeakerDiarizationService.diarize(silences=...) と一致: {same}")
+        failed |= not same
+
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,146 @@
+"""音量の索引（services.energy_index.EnergyIndex）と librosa.feature.rms の比較
+
+    python benchmarks/bench_energy_index.py
+    python benchmarks/bench_energy_index.py --duration 3600 --sr 48000
+
+合成音声に対して、複数のフレーム長・ホップ長のRMSを「分解能ごとに librosa.feature.rms」と
+「索引を1回作って各分解能を索引から」の2通りで求め、次のいずれかを満たさなければ終了コード1を返す。
+
+- 各分解能のRMSが librosa と float32 の精度で一致し、沈黙イベントが完全に一致する
+- 任意の区間の音量（話者区間・文字起こしセグメント相当）が、サンプルから直接求めた値と一致する
+  （大きな音が長く続いた後の、ごく静かな区間でも相対誤差 1e-6 以内）
+- run_analysis に既定の刻み幅（64 サンプル）の倍数でないフレーム長・ホップ長を渡しても、
+  包絡が librosa と一致する（フレームの端が既定の刻み幅に丸められない）
+- 全分解能の合計時間が librosa より --min-speedup 倍以上速い
+"""
+import argparse
+import os
+import shutil
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import librosa
+import numpy as np
+import soundfile as sf
+
+ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(ROOT))
+sys.path.insert(0, str(ROOT / "benchmarks"))
+
+import synthetic  # noqa: E402
+from services.audio_processor import AudioAnalysis  # noqa: E402
+from services.energy_index import EnergyIndex  # noqa: E402
+
+RESOLUTIONS = [(2048, 512), (1024, 256), (4096, 1024), (2048, 256), (512, 128)]
+# ホップ長・フレーム長の半分が既定の刻み幅の倍数でない分解能（run_analysis 経由で確認する）
+UNALIGNED_RESOLUTIONS = [(2048, 100), (1000, 250)]
+
+
+def synthesize(path, duration, sr, seed):
+    """合成音声を書き出して配列として読み込む"""
+    layout = synthetic.make_layout(duration, seed=seed)
+    synthetic.write_audio(path, layout, sr=sr, seed=seed)
+    y, _ = sf.read(path, dtype="float32")
+    return y, layout
+
+
+def check_pipeline(path, y, sr, work_dir):
+    """run_analysis（音声解析のみ）で刻み幅の倍数でない分解能を指定し、librosa と一致すれば True"""
+    from services import StageCache, run_analysis
+
+    cache = StageCache(os.path.join(work_dir, "cache"))
+    ok = True
+    for fl, hop in UNALIGNED_RESOLUTIONS:
+        analysis = run_analysis(path, cache=cache, local_only=True, frame_length=fl, hop_length=hop)["analysis"]
+        expected = librosa.feature.rms(y=y, frame_length=fl, hop_length=hop)[0]
+        same_rms = len(expected) == len(analysis.rms) and np.allclose(analysis.rms, expected, rtol=1e-5, atol=1e-8)
+        print(f"  run_analysis frame {fl:>5} / hop {hop:>5}: 索引の step {analysis.energy.step}, RMS一致 {same_rms}")
+        ok &= same_rms
+    return ok
+
+
+def direct_rms(y, index, start, end):
+    """索引と同じ step 単位に丸めた区間のRMSをサンプルから直接求める"""
+    first = min(int(round(start * index.sr / index.step)) * index.step, len(y))
+    last = min(int(round(end * index.sr / index.step)) * index.step, len(y))
+    if last <= first:
+        return 0.0
+    block = y[first:last].astype(np.float64)
+    return float(np.sqrt(np.dot(block, block) / (last - first)))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="音量の索引と librosa.feature.rms の比較")
+    parser.add_argument("--duration", type=float, default=600, help="合成音声の長さ（秒）")
+    parser.add_argument("--sr", type=int, default=44100)
+    parser.add_argument("--min-speedup", type=float, default=3.0)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    work_dir = tempfile.mkdtemp(prefix="dannwa-energy-")
+    path = os.path.join(work_dir, "synthetic.wav")
+    y, layout = synthesize(path, args.duration, args.sr, args.seed)
+    failed = False
+
+    start = time.perf_counter()
+    reference = {
+        (fl, hop): librosa.feature.rms(y=y, frame_length=fl, hop_length=hop)[0] for fl, hop in RESOLUTIONS
+    }
+    librosa_seconds = time.perf_counter() - start
+
+    start = time.perf_counter()
+    step = np.gcd.reduce([EnergyIndex.exact_step(fl, hop) for fl, hop in RESOLUTIONS])
+    index = EnergyIndex.from_signal(y, args.sr, step=int(step))
+    build_seconds = time.perf_counter() - start
+    start = time.perf_counter()
+    from_index = {(fl, hop): index.rms(fl, hop) for fl, hop in RESOLUTIONS}
+    query_seconds = time.perf_counter() - start
+
+    print(f"{args.duration:.0f} 秒 / {args.sr} Hz, 索引 {index.granules.nbytes / 1e6:.1f} MB（step {index.step}）")
+    for fl, hop in RESOLUTIONS:
+        expected, actual = reference[(fl, hop)], from_index[(fl, hop)]
+        same_rms = len(expected) == len(actual) and np.allclose(actual, expected, rtol=1e-5, atol=1e-8)
+        events = AudioAnalysis(expected, args.sr, fl, hop).silence_events().records()
+        same_events = AudioAnalysis(actual, args.sr, fl, hop).silence_events().records() == events
+        print(f"  frame {fl:>5} / hop {hop:>5}: RMS一致 {same_rms}, 沈黙 {len(events)} 件一致 {same_events}")
+        failed |= not (same_rms and same_events)
+
+    # 発話区間ごとの音量と、長い録音の末尾に置いたごく静かな区間
+    spans = [(s["start"], s["end"]) for s in layout["speech"]]
+    quiet = y.copy()
+    tail = len(quiet) - 2 * args.sr
+    quiet[tail:tail + args.sr] *= 1e-4
+    quiet_index = EnergyIndex.from_signal(quiet, args.sr, step=index.step)
+    quiet_span = (tail / args.sr + 0.1, tail / args.sr + 0.9)
+    starts, ends = np.array(spans).T
+    span_rms = index.span_rms(starts, ends)
+    errors = [abs(span_rms[i] - direct_rms(y, index, s, e)) / max(direct_rms(y, index, s, e), 1e-12)
+              for i, (s, e) in enumerate(spans)]
+    quiet_expected = direct_rms(quiet, quiet_index, *quiet_span)
+    quiet_error = abs(quiet_index.span_rms(*quiet_span) - quiet_expected) / quiet_expected
+    # 比較用: 全体を1本の累積和にした場合の同じ区間の誤差
+    naive = np.concatenate(([0.0], np.cumsum(np.square(quiet, dtype=np.float64))))
+    a, b = (int(round(t * args.sr / index.step)) * index.step for t in quiet_span)
+    naive_error = abs(np.sqrt(max(naive[b] - naive[a], 0.0) / (b - a)) - quiet_expected) / quiet_expected
+    print(f"区間の音量: 発話 {len(spans)} 件の最大相対誤差 {max(errors):.2e}, "
+          f"末尾の静かな区間 {quiet_error:.2e}（1本の累積和なら {naive_error:.2e}）")
+    failed |= max(errors) > 1e-9 or quiet_error > 1e-6
+
+    try:
+        failed |= not check_pipeline(path, y, args.sr, work_dir)
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+    index_seconds = build_seconds + query_seconds
+    speedup = librosa_seconds / index_seconds
+    print(f"{len(RESOLUTIONS)} 通りの分解能: librosa {librosa_seconds:.2f} 秒, "
+          f"索引 {index_seconds:.2f} 秒（作成 {build_seconds:.2f} + 計算 {query_seconds:.3f}）, {speedup:.1f} 倍")
+    failed |= speedup < args.min_speedup
+
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,163 @@
+"""逐次沈黙検出（services.live_silence）と一括検出（detect_silence）の比較
+
+    python benchmarks/bench_live_silence.py
+    python benchmarks/bench_live_silence.py --file recording.wav --max-block 4096
+
+録音済みの音声（省略時は沈黙の位置が分かっている合成音声）をランダムな長さのブロックで
+LiveSilenceDetector に流し込み、次を確認する。いずれかを満たさなければ終了コード1を返す。
+
+- 基準を一括検出と同じ最大RMSに固定した場合、沈黙イベントが detect_silence と完全に一致する
+- 適応基準の場合も、一括検出の沈黙の大半（--min-match 以上）を同じ区間として検出する
+- 開始・終了の通知の遅れが「規定の沈黙長＋フレーム半分＋1ブロック」以内に収まる
+- 書き込み中の WAV を follow_wav で追いかけても同じイベントになる
+- ピークメモリが音声の長さに依存しない
+"""
+import argparse
+import os
+import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+from pathlib import Path
+
+import numpy as np
+import soundfile as sf
+
+ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(ROOT))
+sys.path.insert(0, str(ROOT / "benchmarks"))
+
+import synthetic  # noqa: E402
+from config import FRAME_LENGTH, MIN_SILENCE_DURATION  # noqa: E402
+from services.audio_processor import AudioAnalysis, AudioProcessor  # noqa: E402
+from services.live_silence import LiveSilenceDetector, follow_wav  # noqa: E402
+
+EVENT_KEYS = ("start", "end", "duration", "category")
+
+
+def feed(detector, y, rng, max_block):
+    """ランダムな長さのブロックで流し込み、全イベントを返す"""
+    events = []
+    pos = 0
+    while pos < len(y):
+        n = int(rng.integers(1, max_block + 1))
+        events.extend(detector.push(y[pos:pos + n]))
+        pos += n
+    events.extend(detector.close())
+    return events
+
+
+def silences(events):
+    return [{k: e[k] for k in EVENT_KEYS} for e in events if e["type"] == "end"]
+
+
+def match_rate(expected, found, tolerance=0.05):
+    if not expected:
+        return 1.0
+    found_arr = np.array([(e["start"], e["end"]) for e in found]) if found else np.zeros((0, 2))
+    hits = sum(
+        bool(len(found_arr))
+        and bool(np.any((np.abs(found_arr[:, 0] - e["start"]) <= tolerance) & (np.abs(found_arr[:, 1] - e["end"]) <= tolerance)))
+        for e in expected
+    )
+    return hits / len(expected)
+
+
+def max_latency(events):
+    starts = [e["detected_at"] - e["start"] for e in events if e["type"] == "start"]
+    ends = [e["detected_at"] - e["end"] for e in events if e["type"] == "end"]
+    return max(starts, default=0.0), max(ends, default=0.0)
+
+
+def follow_growing_file(y, sr, ref, block_seconds=0.5):
+    """別スレッドで WAV を少しずつ書きながら follow_wav で読み、イベントを返す"""
+    path = os.path.join(tempfile.mkdtemp(prefix="dannwa-live-"), "growing.wav")
+    ready = threading.Event()
+
+    def writer():
+        with sf.SoundFile(path, "w", sr, 1, subtype="PCM_16") as out:
+            ready.set()
+            step = int(block_seconds * sr)
+            for pos in range(0, len(y), step):
+                out.write(y[pos:pos + step])
+                out.flush()
+                time.sleep(0.005)
+
+    thread = threading.Thread(target=writer)
+    thread.start()
+    ready.wait()
+    detector = LiveSilenceDetector(sr, ref=ref)
+    events = []
+    for block in follow_wav(path, block_size=4096, poll_seconds=0.05, idle_timeout=5.0):
+        events.extend(detector.push(block))
+    events.extend(detector.close())
+    thread.join()
+    os.remove(path)
+    return events
+
+
+def live_peak_mb(y, sr, repeat):
+    """同じ音声を repeat 回つなげて流したときのピークメモリ（MB）"""
+    detector = LiveSilenceDetector(sr)
+    tracemalloc.start()
+    for _ in range(repeat):
+        for pos in range(0, len(y), 8192):
+            detector.push(y[pos:pos + 8192])
+    detector.close()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return peak / (1024 * 1024)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="逐次沈黙検出と一括検出の比較")
+    parser.add_argument("--file", help="比較に使う音声ファイル（省略時は合成音声）")
+    parser.add_argument("--duration", type=float, default=600, help="合成音声の長さ（秒）")
+    parser.add_argument("--max-block", type=int, default=8192, help="ブロック長の上限（サンプル数）")
+    parser.add_argument("--min-match", type=float, default=0.9, help="適応基準で一致すべき沈黙の割合")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(args.seed)
+    work_dir = tempfile.mkdtemp(prefix="dannwa-live-")
+    if args.file:
+        path = args.file
+    else:
+        path = os.path.join(work_dir, "synthetic.wav")
+        synthetic.write_audio(path, synthetic.make_layout(args.duration, seed=args.seed), seed=args.seed)
+    y, sr = AudioProcessor.load_audio(path)
+    batch = AudioProcessor.detect_silence(y, sr).records()
+    ref = float(AudioAnalysis.from_signal(y, sr).rms.max())
+
+    failed = False
+    fixed = feed(LiveSilenceDetector(sr, ref=ref), y, rng, args.max_block)
+    identical = silences(fixed) == batch
+    print(f"一括検出の沈黙: {len(batch)} 件")
+    print(f"固定基準: {len(silences(fixed))} 件, 一括検出と完全一致: {identical}")
+    failed |= not identical
+
+    adaptive = feed(LiveSilenceDetector(sr), y, rng, args.max_block)
+    rate = match_rate(batch, silences(adaptive))
+    print(f"適応基準: {len(silences(adaptive))} 件, 一括検出との一致率: {rate:.3f}")
+    failed |= rate < args.min_match
+
+    start_latency, end_latency = max_latency(fixed)
+    bound = MIN_SILENCE_DURATION + (FRAME_LENGTH // 2 + args.max_block) / sr + 0.02
+    print(f"通知の遅れ（最大）: 開始 {start_latency:.3f} 秒, 終了 {end_latency:.3f} 秒（上限 {bound:.3f} 秒）")
+    failed |= max(start_latency, end_latency) > bound
+
+    followed = follow_growing_file(y, sr, ref)
+    follow_identical = silences(followed) == batch
+    print(f"書き込み中のファイルの追跡: 一括検出と完全一致: {follow_identical}")
+    failed |= not follow_identical
+
+    short_mb, long_mb = live_peak_mb(y, sr, 1), live_peak_mb(y, sr, 4)
+    print(f"ピークメモリ: 1倍 {short_mb:.2f} MB, 4倍の長さ {long_mb:.2f} MB")
+    failed |= long_mb > short_mb * 1.5 + 0.5
+
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,85 @@
+"""分析メモのストリーミング生成の確認（最初の断片までの時間と全文の一致）
+
+    python benchmarks/bench_memo_stream.py
+    python benchmarks/bench_memo_stream.py --duration 3600 --latency-ms 500 --token-ms 30
+
+ローカルの OpenAI 代替サーバー（server-sent events で少しずつ返す）に対して、
+generate_memo（一括）と stream_memo（ストリーミング）を実行し、
+最初の断片が届くまでの時間・全体の時間を比べる。
+両者の全文が一致しなければ終了コード1を返す。
+"""
+import argparse
+import json
+import os
+import sys
+import time
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(ROOT))
+sys.path.insert(0, str(ROOT / "benchmarks"))
+
+from fake_openai import FakeOpenAIServer  # noqa: E402
+import synthetic  # noqa: E402
+from services.audio_processor import AudioProcessor, SilenceTable  # noqa: E402
+
+
+def main():
+    parser = argparse.ArgumentParser(description="分析メモのストリーミング生成の確認")
+    parser.add_argument("--duration", type=float, default=600, help="合成する会話の長さ（秒）")
+    parser.add_argument("--latency-ms", type=float, default=500.0, help="応答開始までの遅延")
+    parser.add_argument("--token-ms", type=float, default=30.0, help="ストリーミング断片ごとの間隔")
+    parser.add_argument("--json", help="結果をJSONで保存するパス")
+    args = parser.parse_args()
+
+    layout = synthetic.make_layout(args.duration)
+    segments = synthetic.transcript_segments(layout)
+    stats = AudioProcessor.calculate_silence_stats(
+        SilenceTable.from_times([s["start"] for s in layout["silences"]], [s["end"] for s in layout["silences"]])
+    )
+    kwargs = dict(
+        transcript="".join(s["text"] for s in segments),
+        silence_stats=stats,
+        total_duration=args.duration,
+        segments=segments,
+    )
+
+    with FakeOpenAIServer(latency_ms=args.latency_ms, token_ms=args.token_ms) as server:
+        os.environ["OPENAI_BASE_URL"] = server.base_url
+        os.environ.setdefault("OPENAI_API_KEY", "sk-benchmark")
+        from services.memo_generator import MemoGenerationService
+
+        service = MemoGenerationService()
+        start = time.perf_counter()
+        memo = service.generate_memo(**kwargs)
+        blocking_seconds = time.perf_counter() - start
+
+        start = time.perf_counter()
+        first_token = None
+        streamed = ""
+        usage = []
+        for delta in service.stream_memo(**kwargs, usage=usage):
+            if first_token is None:
+                first_token = time.perf_counter() - start
+            streamed += delta
+        streaming_seconds = time.perf_counter() - start
+
+    results = {
+        "duration": args.duration,
+        "blocking": {"total_seconds": round(blocking_seconds, 3)},
+        "streaming": {
+            "first_token_seconds": round(first_token or 0.0, 3),
+            "total_seconds": round(streaming_seconds, 3),
+            "usage": usage,
+        },
+        "identical": streamed == memo,
+    }
+    print(json.dumps(results, ensure_ascii=False, indent=2))
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(results, f, ensure_ascii=False, indent=2)
+    sys.exit(0 if results["identical"] else 1)
+
+
+if __name__ == "__main__":
+    main()
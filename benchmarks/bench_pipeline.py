@@ -0,0 +1,212 @@
+"""合成音声によるステージ別・エンドツーエンドのベンチマーク
+
+    python benchmarks/bench_pipeline.py
+    python benchmarks/bench_pipeline.py --durations 60 600 3600 --latency-ms 300 --json bench.json
+    python benchmarks/bench_pipeline.py --json new.json --baseline old.json --tolerance 0.2
+
+沈黙の位置が分かっている合成音声（数分〜数時間）を作り、各ステージの
+処理時間・スループット（音声秒/実時間秒）・ピークメモリ（tracemalloc）を計測する。
+API を使うステージはローカルの OpenAI 代替サーバー（遅延を指定可能）に接続する。
+結果は JSON で保存し、--baseline で以前の結果と比較して遅くなったステージを報告する。
+"""
+import argparse
+import gc
+import json
+import os
+import platform
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(ROOT))
+sys.path.insert(0, str(ROOT / "benchmarks"))
+
+from fake_openai import FakeOpenAIServer  # noqa: E402
+import synthetic  # noqa: E402
+
+
+def measure(func, *args, **kwargs):
+    """1回実行し、(戻り値, 経過秒, ピークメモリMB) を返す"""
+    gc.collect()
+    tracemalloc.start()
+    start = time.perf_counter()
+    try:
+        value = func(*args, **kwargs)
+        elapsed = time.perf_counter() - start
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return value, elapsed, peak / (1024 * 1024)
+
+
+def warm_up(work_dir, sr):
+    """import や numba の JIT コンパイルが最初の計測に混ざらないよう、短い音声で一度通す"""
+    from services import AudioProcessor
+    from services.preprocess import prepare_audio
+
+    path = os.path.join(work_dir, "warmup.wav")
+    synthetic.write_audio(path, synthetic.make_layout(5.0), sr=sr)
+    y, file_sr = AudioProcessor.load_audio(path)
+    AudioProcessor.detect_silence(y, file_sr)
+    prepare_audio(path).cleanup()
+    os.remove(path)
+
+
+def bench_duration(duration, work_dir, sr, server):
+    """1つの長さについて全ステージを計測"""
+    from config import MIN_SILENCE_DURATION, SILENCE_DB_OPTIONS, SILENCE_DB_THRESHOLD
+    from services import AudioProcessor, MemoGenerationService, StageCache, run_analysis
+    from services.alignment import align_speakers
+    from services.preprocess import prepare_audio
+
+    layout = synthetic.make_layout(duration)
+    audio_path = os.path.join(work_dir, f"synthetic_{int(duration)}s.wav")
+    synthetic.write_audio(audio_path, layout, sr=sr)
+    stages = {}
+
+    def record(name, elapsed, peak_mb, **extra):
+        stages[name] = {
+            "seconds": round(elapsed, 4),
+            "audio_sec_per_sec": round(duration / elapsed, 1) if elapsed > 0 else None,
+            "peak_mb": round(peak_mb, 1),
+            **extra,
+        }
+
+    # 従来の一括読み込み経路（librosa.load → detect_silence → calculate_silence_stats）
+    (y, file_sr), elapsed, peak = measure(AudioProcessor.load_audio, audio_path)
+    record("load_audio", elapsed, peak)
+    events, elapsed, peak = measure(AudioProcessor.detect_silence, y, file_sr, db_threshold=SILENCE_DB_THRESHOLD)
+    record(
+        "detect_silence", elapsed, peak,
+        recall=round(synthetic.silence_recall(layout, events, MIN_SILENCE_DURATION), 3),
+    )
+    _, elapsed, peak = measure(AudioProcessor.calculate_silence_stats, events)
+    record("calculate_silence_stats", elapsed, peak, events=len(events))
+    del y
+
+    # ストリーミング経路（1回のデコードで包絡・16kHz音声を作成し、圧縮版は16kHz音声から作る）
+    prepared, elapsed, peak = measure(prepare_audio, audio_path, with_speech=True)
+    record("prepare_audio", elapsed, peak)
+    upload_path, elapsed, peak = measure(prepared.encode_upload)
+    record("encode_upload", elapsed, peak, upload_mb=round(os.path.getsize(upload_path) / 1e6, 2))
+    analysis = prepared.analysis
+    prepared.cleanup()
+    sweep, elapsed, peak = measure(analysis.silence_sweep, SILENCE_DB_OPTIONS)
+    record("silence_sweep", elapsed, peak, thresholds=len(SILENCE_DB_OPTIONS))
+
+    segments = synthetic.transcript_segments(layout)
+    turns = synthetic.diarization_turns(layout)
+    _, elapsed, peak = measure(align_speakers, segments, turns)
+    record("align_speakers", elapsed, peak, segments=len(segments), turns=len(turns))
+
+    transcript = "".join(s["text"] for s in segments)
+    service = MemoGenerationService()
+    (_, memo_usage), elapsed, peak = measure(
+        service.generate_memo,
+        transcript=transcript,
+        silence_stats=sweep[SILENCE_DB_THRESHOLD],
+        total_duration=duration,
+        segments=segments,
+        return_usage=True,
+    )
+    record("generate_memo", elapsed, peak, transcript_chars=len(transcript), chat_requests=len(memo_usage))
+
+    # エンドツーエンド（キャッシュなし、APIは代替サーバー）
+    cache = StageCache(os.path.join(work_dir, f"cache_{int(duration)}"))
+    cache.clear()
+    n_requests = len(server.requests)
+    result, elapsed, peak = measure(run_analysis, audio_path, cache=cache)
+    record(
+        "end_to_end", elapsed, peak,
+        api_requests=len(server.requests) - n_requests,
+        stage_seconds={k: round(v, 4) for k, v in result["timings"].items()},
+    )
+    os.remove(audio_path)
+    return stages
+
+
+def compare(results, baseline, tolerance, min_seconds=0.01):
+    """以前の結果より tolerance 以上遅くなったステージを列挙（min_seconds 未満の誤差は無視）"""
+    regressions = []
+    for duration, stages in results["runs"].items():
+        for stage, current in stages.items():
+            before = baseline.get("runs", {}).get(duration, {}).get(stage)
+            if not before or not before.get("seconds"):
+                continue
+            if max(current["seconds"], before["seconds"]) < min_seconds:
+                continue
+            ratio = current["seconds"] / before["seconds"]
+            if ratio > 1 + tolerance:
+                regressions.append(f"{duration}s {stage}: {before['seconds']:.3f}s → {current['seconds']:.3f}s (x{ratio:.2f})")
+    return regressions
+
+
+def _git_commit():
+    try:
+        out = subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, capture_output=True, text=True)
+        return out.stdout.strip() or None
+    except OSError:
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description="合成音声によるパイプラインのベンチマーク")
+    parser.add_argument("--durations", type=float, nargs="+", default=[60, 600, 3600], help="音声の長さ（秒）")
+    parser.add_argument("--sr", type=int, default=16000, help="合成音声のサンプリングレート")
+    parser.add_argument("--latency-ms", type=float, default=300.0, help="代替APIサーバーの応答遅延")
+    parser.add_argument("--jitter-ms", type=float, default=0.0, help="応答遅延のばらつき")
+    parser.add_argument("--json", help="結果をJSONで保存するパス")
+    parser.add_argument("--baseline", help="比較する以前の結果（JSON）")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="遅くなったとみなす割合（0.2 = 20%%）")
+    args = parser.parse_args()
+
+    with FakeOpenAIServer(latency_ms=args.latency_ms, jitter_ms=args.jitter_ms) as server:
+        # サービスが作る OpenAI クライアントを代替サーバーに向ける（config の読み込み前に設定）
+        os.environ["OPENAI_BASE_URL"] = server.base_url
+        os.environ.setdefault("OPENAI_API_KEY", "sk-benchmark")
+        os.environ.setdefault("DANNWA_CACHE_DIR", tempfile.mkdtemp(prefix="dannwa-bench-cache-"))
+        runs = {}
+        with tempfile.TemporaryDirectory(prefix="dannwa-bench-") as work_dir:
+            warm_up(work_dir, args.sr)
+            for duration in args.durations:
+                stages = bench_duration(duration, work_dir, args.sr, server)
+                runs[str(int(duration))] = stages
+                print(f"\n== {duration:.0f}s audio ==")
+                print(f"{'stage':<24} {'seconds':>9} {'audio s/s':>10} {'peak MB':>9}")
+                for name, stage in stages.items():
+                    print(f"{name:<24} {stage['seconds']:>9.3f} {stage['audio_sec_per_sec'] or 0:>10.1f} {stage['peak_mb']:>9.1f}")
+
+    import numpy as np
+
+    results = {
+        "commit": _git_commit(),
+        "created_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "python": platform.python_version(),
+        "numpy": np.__version__,
+        "sample_rate": args.sr,
+        "latency_ms": args.latency_ms,
+        "max_rss_mb": round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1),
+        "runs": runs,
+    }
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(results, f, ensure_ascii=False, indent=2)
+
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as f:
+            regressions = compare(results, json.load(f), args.tolerance)
+        if regressions:
+            print("\n遅くなったステージ:")
+            for line in regressions:
+                print(f"  {line}")
+            sys.exit(1)
+        print("\n以前の結果からの遅延はありません。")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,156 @@
+"""1回のデコード（services.preprocess.prepare_audio）の時刻の対応と、一括処理でのデコード回数の確認
+
+    python benchmarks/bench_prepare_audio.py
+    python benchmarks/bench_prepare_audio.py --duration 1800 --sr 48000 --files 4
+
+44.1kHz の合成音声を prepare_audio で 16kHz の共有音声と文字起こし用の圧縮音声に変換し、
+元の音声と時刻がずれていないかを確認する。続けて batch.py をローカルの OpenAI 代替サーバーに
+向けて実行し、ファイルごとのデコードが1回で済んでいるかを計測記録（stages.jsonl）から数える。
+次のいずれかを満たさなければ終了コード1を返す。
+
+- 16kHz版のサンプル数が「元のサンプル数 × 16000 / sr」に一致し、圧縮音声の長さも元の長さに一致する
+- 16kHz版・圧縮音声から検出した沈黙が、元の音声から検出した沈黙と --tolerance 秒以内で対応する
+- 一括処理で prepare_audio がファイルごとに1回だけ実行され、一時ファイルが残らない
+- 一括処理の文字起こしセグメントが、元の音声の長さの中に収まり末尾まで届いている
+"""
+import argparse
+import json
+import os
+import sys
+import tempfile
+from pathlib import Path
+
+import numpy as np
+import soundfile as sf
+
+ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(ROOT))
+sys.path.insert(0, str(ROOT / "benchmarks"))
+
+from fake_openai import FakeOpenAIServer  # noqa: E402
+import synthetic  # noqa: E402
+
+
+def events_match(reference, events, tolerance):
+    """沈黙の件数が同じで、開始・終了が tolerance 秒以内で対応するか"""
+    if len(reference) != len(events):
+        return False, float("inf")
+    if not len(events):
+        return True, 0.0
+    error = max(np.max(np.abs(reference.start - events.start)), np.max(np.abs(reference.end - events.end)))
+    return error <= tolerance, float(error)
+
+
+def check_renditions(path, sr, tolerance):
+    """prepare_audio の16kHz版・圧縮音声と元の音声の時刻を比べ、満たしていれば True"""
+    from config import FRAME_LENGTH, HOP_LENGTH, SPEECH_SAMPLE_RATE
+    from services.audio_processor import AudioProcessor
+    from services.preprocess import prepare_audio
+
+    n_samples = sf.info(path).frames
+    prepared = prepare_audio(path, with_speech=True)
+    try:
+        prepared.encode_upload()
+        reference = prepared.analysis.silence_events()
+        expected = n_samples * SPEECH_SAMPLE_RATE / sr
+        same_length = abs(len(prepared.shared) - expected) <= 1
+        upload, upload_sr = sf.read(prepared.upload_path, dtype="float32")
+        upload_drift = abs(len(upload) / upload_sr - n_samples / sr)
+        print(
+            f"16kHz版 {len(prepared.shared)} サンプル（期待値 {expected:.1f}）, "
+            f"圧縮音声の長さのずれ {upload_drift * 1000:.1f} ms, "
+            f"{os.path.getsize(path) / os.path.getsize(prepared.upload_path):.0f} 分の1"
+        )
+        ok = same_length and upload_drift <= tolerance
+
+        for label, (y, y_sr) in (("16kHz版", (prepared.shared.samples, prepared.shared.sr)), ("圧縮音声", (upload, upload_sr))):
+            # フレーム長・ホップ長は元の音声と同じ秒数にそろえる
+            scale = y_sr / sr
+            events = AudioProcessor.detect_silence(
+                np.asarray(y), y_sr, frame_length=round(FRAME_LENGTH * scale), hop_length=round(HOP_LENGTH * scale)
+            )
+            matched, error = events_match(reference, events, tolerance)
+            print(f"  {label}の沈黙 / 元の音声の沈黙 {len(reference)} 件: 対応 {matched}（最大のずれ {error * 1000:.0f} ms）")
+            ok &= matched
+        return ok
+    finally:
+        prepared.cleanup()
+
+
+def configure(work_dir, server):
+    """計測記録の出力先・一時ディレクトリ・API の接続先を切り替える（設定を読み込む前に呼ぶ。ワーカープロセスにも引き継ぐ）"""
+    log_path = os.path.join(work_dir, "stages.jsonl")
+    temp_dir = os.path.join(work_dir, "tmp")
+    os.makedirs(temp_dir)
+    os.environ.update(
+        {
+            "OPENAI_BASE_URL": server.base_url,
+            "DANNWA_METRICS_LOG": log_path,
+            "DANNWA_METRICS_TEXTFILE": "",
+            "TMPDIR": temp_dir,
+        }
+    )
+    os.environ.setdefault("OPENAI_API_KEY", "sk-benchmark")
+    tempfile.tempdir = temp_dir
+    return log_path, temp_dir
+
+
+def check_batch(paths, work_dir, log_path, temp_dir, tolerance):
+    """batch.py を実行し、ファイルごとのデコード回数と文字起こしの時刻を確認して、満たしていれば True"""
+    import batch
+    from services import StageCache
+
+    output_dir = os.path.join(work_dir, "results")
+    source = os.path.join(work_dir, "inputs")
+    status = batch.main([source, "-o", output_dir, "--cache-dir", os.path.join(work_dir, "cache"), "--workers", "2"])
+
+    with open(log_path, encoding="utf-8") as f:
+        records = [json.loads(line) for line in f]
+    ok = status == 0
+    leftovers = os.listdir(temp_dir)
+    print(f"一括処理: 終了コード {status}, 残った一時ファイル {len(leftovers)} 件")
+    ok &= not leftovers
+    for path in paths:
+        content_hash = StageCache.hash_file(path)
+        decodes = [r["parent"] for r in records if r["stage"] == "prepare_audio" and r.get("content_hash") == content_hash]
+        with open(os.path.join(output_dir, f"{Path(path).stem}.json"), encoding="utf-8") as f:
+            result = json.load(f)
+        segments = result["segments"]
+        last_end = segments[-1]["end"] if segments else 0.0
+        aligned = all(s["end"] <= result["duration"] + tolerance for s in segments)
+        aligned &= abs(last_end - result["duration"]) <= tolerance
+        print(
+            f"  {Path(path).name}: prepare_audio {len(decodes)} 回（{', '.join(map(str, decodes))}）, "
+            f"最後のセグメントの終了 {last_end:.2f} 秒 / 長さ {result['duration']:.2f} 秒, 対応 {aligned}"
+        )
+        ok &= len(decodes) == 1 and aligned
+    return ok
+
+
+def main():
+    parser = argparse.ArgumentParser(description="1回のデコードの時刻の対応と一括処理でのデコード回数の確認")
+    parser.add_argument("--duration", type=float, default=300, help="合成音声の長さ（秒）")
+    parser.add_argument("--sr", type=int, default=44100, help="合成音声のサンプリングレート")
+    parser.add_argument("--files", type=int, default=3, help="一括処理するファイル数")
+    parser.add_argument("--tolerance", type=float, default=0.05, help="時刻のずれの許容値（秒）")
+    args = parser.parse_args()
+
+    failed = False
+    with tempfile.TemporaryDirectory(prefix="dannwa-prepare-") as work_dir:
+        os.makedirs(os.path.join(work_dir, "inputs"))
+        paths = []
+        for i in range(args.files):
+            path = os.path.join(work_dir, "inputs", f"recording_{i}.wav")
+            synthetic.write_audio(path, synthetic.make_layout(args.duration, seed=i), sr=args.sr, seed=i)
+            paths.append(path)
+
+        with FakeOpenAIServer() as server:
+            log_path, temp_dir = configure(work_dir, server)
+            failed |= not check_renditions(paths[0], args.sr, args.tolerance)
+            failed |= not check_batch(paths, work_dir, log_path, temp_dir, args.tolerance)
+
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
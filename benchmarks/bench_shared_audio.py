@@ -0,0 +1,112 @@
+"""共有音声（メモリマップ）を複数のワーカープロセスで読むときのメモリ使用量の確認
+
+    python benchmarks/bench_shared_audio.py
+    python benchmarks/bench_shared_audio.py --duration 3600 --workers 8
+
+合成音声を prepare_audio で1回だけデコードし、同じ処理（全サンプルの二乗和）を
+N個のワーカープロセスで実行する。ワーカーへの渡し方を次の2通りで比べる。
+
+- pickle: デコード済みの配列をそのまま渡す（ワーカーごとにコピーができる）
+- shared: SharedAudio を渡す（パスだけが渡り、各ワーカーはメモリマップのビューを読む）
+
+各ワーカーの匿名メモリ（RssAnon）の増加量を合計し、shared の合計が
+1コピー分の --max-ratio 倍を超えるか、両者の計算結果が一致しなければ終了コード1を返す。
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+import numpy as np
+
+ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(ROOT))
+sys.path.insert(0, str(ROOT / "benchmarks"))
+
+import synthetic  # noqa: E402
+
+_baseline = None
+
+
+def rss_anon_bytes():
+    """このプロセスの匿名メモリ（Linux の /proc/self/status の RssAnon）"""
+    with open("/proc/self/status") as f:
+        for line in f:
+            if line.startswith("RssAnon:"):
+                return int(line.split()[1]) * 1024
+    return 0
+
+
+def init_worker():
+    global _baseline
+    _baseline = rss_anon_bytes()
+
+
+def energy(audio):
+    """全サンプルを読む処理（二乗和）と、その時点での匿名メモリの増加量"""
+    samples = audio.samples if hasattr(audio, "samples") else audio
+    total = 0.0
+    for start in range(0, len(samples), 1 << 20):
+        block = samples[start:start + (1 << 20)]
+        total += float(np.dot(block, block))
+    return total, rss_anon_bytes() - _baseline
+
+
+def run_workers(payload, workers):
+    context = multiprocessing.get_context("spawn")
+    start = time.perf_counter()
+    with ProcessPoolExecutor(max_workers=workers, mp_context=context, initializer=init_worker) as pool:
+        results = list(pool.map(energy, [payload] * workers))
+    return results, time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description="共有音声のメモリ使用量の確認")
+    parser.add_argument("--duration", type=float, default=600, help="合成音声の長さ（秒）")
+    parser.add_argument("--workers", type=int, default=4, help="ワーカープロセス数")
+    parser.add_argument("--max-ratio", type=float, default=0.25, help="shared で許容する増加量（1コピー比）")
+    parser.add_argument("--json", help="結果をJSONで保存するパス")
+    args = parser.parse_args()
+
+    from services.preprocess import prepare_audio
+
+    work_dir = tempfile.mkdtemp(prefix="dannwa-shared-")
+    path = os.path.join(work_dir, "synthetic.wav")
+    synthetic.write_audio(path, synthetic.make_layout(args.duration))
+    prepared = prepare_audio(path, with_speech=True)
+    try:
+        shared = prepared.shared
+        copy_mb = shared.samples.nbytes / 1e6
+        in_memory = np.array(shared.samples)
+        pickled, pickled_seconds = run_workers(in_memory, args.workers)
+        del in_memory
+        mapped, mapped_seconds = run_workers(shared, args.workers)
+    finally:
+        prepared.cleanup()
+        os.remove(path)
+
+    pickled_mb = sum(growth for _, growth in pickled) / 1e6
+    mapped_mb = sum(growth for _, growth in mapped) / 1e6
+    identical = len({round(total, 3) for total, _ in pickled + mapped}) == 1
+    results = {
+        "duration": args.duration,
+        "workers": args.workers,
+        "signal_mb": round(copy_mb, 1),
+        "pickle": {"anon_growth_mb": round(pickled_mb, 1), "seconds": round(pickled_seconds, 3)},
+        "shared": {"anon_growth_mb": round(mapped_mb, 1), "seconds": round(mapped_seconds, 3)},
+        "identical": identical,
+    }
+    print(json.dumps(results, ensure_ascii=False, indent=2))
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(results, f, ensure_ascii=False, indent=2)
+    sys.exit(0 if identical and mapped_mb <= copy_mb * args.max_ratio else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,88 @@
+"""起動時間（import時間）の計測と回帰チェック
+
+    python benchmarks/bench_startup.py
+    python benchmarks/bench_startup.py --budget-ms 1500 --json startup.json
+
+毎回新しいPythonプロセスで app.py（と services パッケージ）を import し、
+所要時間の中央値と、起動時に読み込まれてはいけない重い依存が読み込まれていないかを確認する。
+予算を超えた場合は終了コード1を返す。
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parents[1]
+
+# 起動時には読み込まず、各ステージの実行時に読み込むべきモジュール
+HEAVY_MODULES = ["librosa", "numba", "scipy", "openai", "torch", "pyannote", "matplotlib", "soundfile"]
+
+_PROBE = """
+import json, sys, time
+start = time.perf_counter()
+import {target}
+elapsed = time.perf_counter() - start
+print(json.dumps({{"seconds": elapsed, "loaded": [m for m in {heavy!r} if m in sys.modules]}}))
+"""
+
+
+def measure(target, runs):
+    """新しいプロセスで target を import した時間（秒）と読み込まれた重いモジュール"""
+    env = dict(os.environ)
+    env.setdefault("OPENAI_API_KEY", "sk-benchmark")
+    samples = []
+    loaded = set()
+    for _ in range(runs):
+        out = subprocess.run(
+            [sys.executable, "-c", _PROBE.format(target=target, heavy=HEAVY_MODULES)],
+            cwd=ROOT,
+            env=env,
+            capture_output=True,
+            text=True,
+            check=True,
+        )
+        result = json.loads(out.stdout.strip().splitlines()[-1])
+        samples.append(result["seconds"])
+        loaded.update(result["loaded"])
+    return samples, sorted(loaded)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="起動時間の計測")
+    parser.add_argument("--runs", type=int, default=5, help="計測回数（最初の1回はバイトコード生成のため除外）")
+    parser.add_argument("--budget-ms", type=float, default=1500.0, help="app の import 時間の上限（中央値, ms）")
+    parser.add_argument("--json", help="結果をJSONで保存するパス")
+    args = parser.parse_args()
+
+    results = {}
+    failed = False
+    for target in ("services", "app"):
+        samples, loaded = measure(target, args.runs + 1)
+        samples = samples[1:]
+        median_ms = statistics.median(samples) * 1000
+        results[target] = {
+            "median_ms": round(median_ms, 1),
+            "min_ms": round(min(samples) * 1000, 1),
+            "max_ms": round(max(samples) * 1000, 1),
+            "heavy_modules_loaded": loaded,
+        }
+        print(f"import {target:<9} median {median_ms:8.1f} ms  heavy modules: {', '.join(loaded) or '-'}")
+        if loaded:
+            failed = True
+    if results["app"]["median_ms"] > args.budget_ms:
+        print(f"app の import が予算 {args.budget_ms:.0f} ms を超えています。")
+        failed = True
+    results["budget_ms"] = args.budget_ms
+    results["passed"] = not failed
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(results, f, ensure_ascii=False, indent=2)
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,163 @@
+"""分割文字起こし（TranscriptionService.transcribe_chunked）の順序・時刻・同時実行数の確認
+
+    python benchmarks/bench_transcription_chunks.py
+    python benchmarks/bench_transcription_chunks.py --duration 3600 --chunk-seconds 300 --workers 8
+
+合成音声を沈黙位置で分割して文字起こしする。APIの代わりに、受け取ったチャンクの長さを
+本文に書き、長さに合わせた一定間隔のセグメントを返す代替クライアントを渡す。
+応答の遅延はチャンクごとにばらつかせ、完了順が送信順と入れ替わるようにする。
+ファイルから切り出す場合、共有音声（SharedAudio）から切り出す場合、
+共有音声から切り出してリクエストごとに受付制御の API の枠（--api-slots）を取る場合のそれぞれで、
+次のいずれかを満たさなければ終了コード1を返す。
+
+- 結合した本文が、plan_chunks の区間の順に並んでいる
+- 各セグメントの時刻が「チャンクの開始時刻 + チャンク内の時刻」に補正され、そのチャンク内に収まる
+- 同時に処理中のリクエスト数が上限（--workers、枠を取る場合は --api-slots との小さい方）を超えず、
+  チャンク数が足りるときは上限まで並列になる
+"""
+import argparse
+import io
+import os
+import random
+import re
+import sys
+import tempfile
+import threading
+import time
+from pathlib import Path
+from types import SimpleNamespace
+
+import soundfile as sf
+
+ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(ROOT))
+sys.path.insert(0, str(ROOT / "benchmarks"))
+
+import synthetic  # noqa: E402
+
+SEGMENT_SECONDS = 5.0
+TOLERANCE = 0.02  # 圧縮形式の前後の詰め物による長さのずれ（秒）
+
+
+class FakeTranscriptions:
+    """audio.transcriptions.create の代替（同時に処理中の件数を数える）"""
+
+    def __init__(self, min_latency, max_latency, seed=0):
+        self.min_latency = min_latency
+        self.max_latency = max_latency
+        self.in_flight = 0
+        self.peak = 0
+        self.calls = 0
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+
+    def create(self, model, file, language=None, response_format=None):
+        with self._lock:
+            self.in_flight += 1
+            self.peak = max(self.peak, self.in_flight)
+            self.calls += 1
+            latency = self._random.uniform(self.min_latency, self.max_latency)
+        try:
+            duration = sf.info(io.BytesIO(file[1])).duration
+            time.sleep(latency)
+            segments = []
+            t = 0.0
+            while t < duration - TOLERANCE:
+                end = min(t + SEGMENT_SECONDS, duration)
+                segments.append({"start": round(t, 3), "end": round(end, 3), "text": "あ"})
+                t = end
+            return SimpleNamespace(text=f"<{duration:.3f}>", segments=segments)
+        finally:
+            with self._lock:
+                self.in_flight -= 1
+
+    def reset(self):
+        self.in_flight = self.peak = self.calls = 0
+
+
+def check(label, chunks, text, segments, transcriptions, workers):
+    """順序・時刻・同時実行数を確認して、満たしていれば True"""
+    durations = [float(d) for d in re.findall(r"<([\d.]+)>", text)]
+    ordered = len(durations) == len(chunks) and all(
+        abs(d - (end - start)) <= TOLERANCE for d, (start, end) in zip(durations, chunks)
+    )
+
+    expected = []
+    for start, end in chunks:
+        t = 0.0
+        while t < end - start - TOLERANCE:
+            expected.append((start + t, min(start + t + SEGMENT_SECONDS, end)))
+            t += SEGMENT_SECONDS
+    offsets = len(segments) == len(expected) and all(
+        abs(seg["start"] - s) <= TOLERANCE and abs(seg["end"] - e) <= TOLERANCE
+        for seg, (s, e) in zip(segments, expected)
+    )
+
+    limit = min(workers, len(chunks))
+    bounded = transcriptions.peak <= workers and transcriptions.peak == limit and transcriptions.calls == len(chunks)
+    print(
+        f"  {label}: チャンク {len(chunks)} 件の順序 {ordered}, セグメント {len(segments)} 件の時刻 {offsets}, "
+        f"同時実行 最大 {transcriptions.peak}（上限 {workers}）{bounded}"
+    )
+    return ordered and offsets and bounded
+
+
+def main():
+    parser = argparse.ArgumentParser(description="分割文字起こしの順序・時刻・同時実行数の確認")
+    parser.add_argument("--duration", type=float, default=900, help="合成音声の長さ（秒）")
+    parser.add_argument("--chunk-seconds", type=float, default=60, help="1チャンクの最大長（秒）")
+    parser.add_argument("--workers", type=int, default=4, help="同時に送信するリクエスト数の上限")
+    parser.add_argument("--api-slots", type=int, default=2, help="受付制御の API の枠の数")
+    parser.add_argument("--min-latency-ms", type=float, default=300.0)
+    parser.add_argument("--max-latency-ms", type=float, default=1500.0)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    os.environ.setdefault("OPENAI_API_KEY", "sk-benchmark")
+    from services.admission import AdmissionController
+    from services.audio_processor import AudioProcessor
+    from services.preprocess import prepare_audio
+    from services.transcription import TranscriptionService
+
+    work_dir = tempfile.mkdtemp(prefix="dannwa-chunks-")
+    path = os.path.join(work_dir, "synthetic.wav")
+    synthetic.write_audio(path, synthetic.make_layout(args.duration, seed=args.seed), seed=args.seed)
+    prepared = prepare_audio(path)
+    transcriptions = FakeTranscriptions(args.min_latency_ms / 1000, args.max_latency_ms / 1000, args.seed)
+    service = TranscriptionService(client=SimpleNamespace(audio=SimpleNamespace(transcriptions=transcriptions)))
+    silences = prepared.analysis.silence_events()
+
+    failed = False
+    print(f"{args.duration:.0f} 秒の音声, 沈黙 {len(silences)} 件, チャンク上限 {args.chunk_seconds:.0f} 秒")
+    try:
+        admission = AdmissionController(api_slots=args.api_slots)
+        runs = (
+            ("ファイルから", None, None, args.workers),
+            ("共有音声から", prepared.shared, None, args.workers),
+            ("APIの枠あり", prepared.shared, lambda: admission.admit("api"), min(args.workers, args.api_slots)),
+        )
+        for label, shared, admit, limit in runs:
+            transcriptions.reset()
+            # transcribe_chunked と同じ長さから区間を決める
+            duration = round(shared.duration, 2) if shared is not None else AudioProcessor.get_file_duration(path)
+            chunks = service.plan_chunks(duration, silences, args.chunk_seconds)
+            text, segments = service.transcribe_chunked(
+                path,
+                silences,
+                return_segments=True,
+                max_chunk_seconds=args.chunk_seconds,
+                max_workers=args.workers,
+                shared_audio=shared,
+                admit=admit,
+            )
+            failed |= not check(label, chunks, text, segments, transcriptions, limit)
+    finally:
+        prepared.cleanup()
+        os.remove(path)
+        os.rmdir(work_dir)
+
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
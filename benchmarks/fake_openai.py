@@ -0,0 +1,247 @@
+"""ベンチマーク用の OpenAI API 代替サーバー（ローカル HTTP）
+
+    python benchmarks/fake_openai.py --port 8765 --latency-ms 300
+
+文字起こし（/v1/audio/transcriptions）とチャット（/v1/chat/completions）に
+固定の応答を返す。応答前に指定した遅延を入れ、実際のAPI呼び出しに近い待ち時間を再現する。
+--error-rate を指定すると、その割合で 429（Retry-After 付き）を返す。
+チャットで stream=true が指定された場合は server-sent events で少しずつ返す（--token-ms 間隔）。
+アプリ側は OPENAI_BASE_URL=http://127.0.0.1:<port>/v1 を設定すれば接続先が切り替わる。
+"""
+import argparse
+import io
+import json
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+SEGMENT_SECONDS = 6.0
+STREAM_CHARS = 4  # ストリーミング応答の1断片の文字数
+
+
+class FakeOpenAIServer:
+    """別スレッドで動く OpenAI API 代替サーバー"""
+
+    def __init__(
+        self, host="127.0.0.1", port=0, latency_ms=0.0, jitter_ms=0.0, error_rate=0.0, retry_after=1.0, token_ms=20.0
+    ):
+        """
+        Args:
+            host: 待ち受けアドレス
+            port: 待ち受けポート（0なら空きポート）
+            latency_ms: 1リクエストあたりの遅延（ミリ秒）
+            jitter_ms: 遅延のばらつき（±ミリ秒）
+            error_rate: 429 を返す割合（0〜1）
+            retry_after: 429 に付ける Retry-After（秒、None なら付けない）
+            token_ms: ストリーミング応答の断片ごとの間隔（ミリ秒）
+        """
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.error_rate = error_rate
+        self.retry_after = retry_after
+        self.token_ms = token_ms
+        self.requests = []
+        self._lock = threading.Lock()
+        self._httpd = ThreadingHTTPServer((host, port), self._handler())
+        self._httpd.daemon_threads = True
+        self._thread = None
+
+    @property
+    def base_url(self):
+        host, port = self._httpd.server_address[:2]
+        return f"http://{host}:{port}/v1"
+
+    def start(self):
+        self._thread = threading.Thread(target=self._httpd.serve_forever, name="fake-openai", daemon=True)
+        self._thread.start()
+        return self
+
+    def serve_forever(self):
+        """現在のスレッドで待ち受ける（Ctrl+C で終了）"""
+        try:
+            self._httpd.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            self._httpd.server_close()
+
+    def stop(self):
+        self._httpd.shutdown()
+        self._httpd.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    def _record(self, path, status, request_bytes, response_bytes, elapsed):
+        with self._lock:
+            self.requests.append(
+                {
+                    "path": path,
+                    "status": status,
+                    "request_bytes": request_bytes,
+                    "response_bytes": response_bytes,
+                    "seconds": elapsed,
+                }
+            )
+
+    def _delay(self):
+        delay = self.latency_ms + random.uniform(-self.jitter_ms, self.jitter_ms)
+        if delay > 0:
+            time.sleep(delay / 1000)
+
+    def _generate(self, content):
+        if self.token_ms > 0:
+            time.sleep(-(-len(content) // STREAM_CHARS) * self.token_ms / 1000)
+
+    def _handler(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, *args):
+                pass
+
+            def do_POST(self):
+                start = time.perf_counter()
+                body = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+                request = None
+                if self.path.endswith("/audio/transcriptions"):
+                    payload = _transcription_response(self.headers.get("Content-Type", ""), body)
+                elif self.path.endswith("/chat/completions"):
+                    request = json.loads(body or b"{}")
+                    payload = _chat_response(request)
+                else:
+                    self.send_error(404)
+                    return
+                server._delay()
+                status = 200
+                if random.random() < server.error_rate:
+                    status = 429
+                    payload = {"error": {"message": "Rate limit reached", "type": "requests", "code": "rate_limit_exceeded"}}
+                elif request is not None and request.get("stream"):
+                    sent = self._stream(payload)
+                    server._record(self.path, status, len(body), sent, time.perf_counter() - start)
+                    return
+                elif request is not None:
+                    # 一括応答でも、ストリーミングと同じだけ生成に時間がかかるものとする
+                    server._generate(payload["choices"][0]["message"]["content"])
+                data = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                if status == 429 and server.retry_after is not None:
+                    self.send_header("Retry-After", str(server.retry_after))
+                self.end_headers()
+                self.wfile.write(data)
+                server._record(self.path, status, len(body), len(data), time.perf_counter() - start)
+
+            def _stream(self, payload):
+                """chat.completion.chunk を server-sent events で送る（応答全体を数文字ずつ）"""
+                self.send_response(200)
+                self.send_header("Content-Type", "text/event-stream")
+                self.send_header("Cache-Control", "no-cache")
+                self.send_header("Connection", "close")
+                self.end_headers()
+                self.close_connection = True
+                content = payload["choices"][0]["message"]["content"]
+                pieces = [content[i:i + STREAM_CHARS] for i in range(0, len(content), STREAM_CHARS)]
+                sent = 0
+                for i, piece in enumerate(pieces + [None]):
+                    delta = {} if piece is None else ({"role": "assistant", "content": piece} if i == 0 else {"content": piece})
+                    chunk = {
+                        "id": payload["id"],
+                        "object": "chat.completion.chunk",
+                        "created": payload["created"],
+                        "model": payload["model"],
+                        "choices": [{"index": 0, "delta": delta, "finish_reason": "stop" if piece is None else None}],
+                    }
+                    data = f"data: {json.dumps(chunk, ensure_ascii=False)}\n\n".encode("utf-8")
+                    self.wfile.write(data)
+                    self.wfile.flush()
+                    sent += len(data)
+                    if piece is not None and server.token_ms > 0:
+                        time.sleep(server.token_ms / 1000)
+                done = b"data: [DONE]\n\n"
+                self.wfile.write(done)
+                self.wfile.flush()
+                return sent + len(done)
+
+        return Handler
+
+
+def _uploaded_file(content_type, body):
+    """multipart/form-data から file パートの中身を取り出す"""
+    if "boundary=" not in content_type:
+        return None
+    boundary = content_type.split("boundary=", 1)[1].strip('"').encode()
+    for part in body.split(b"--" + boundary):
+        head, _, payload = part.partition(b"\r\n\r\n")
+        if b'name="file"' in head:
+            return payload[:-2] if payload.endswith(b"\r\n") else payload
+    return None
+
+
+def _transcription_response(content_type, body):
+    """アップロードされた音声の長さに合わせて、一定間隔のセグメントを返す"""
+    duration = 0.0
+    audio = _uploaded_file(content_type, body)
+    if audio:
+        try:
+            import soundfile as sf
+
+            duration = sf.info(io.BytesIO(audio)).duration
+        except Exception:
+            duration = 0.0
+    segments = []
+    t = 0.0
+    while t < duration:
+        end = min(t + SEGMENT_SECONDS, duration)
+        segments.append({"id": len(segments), "start": round(t, 3), "end": round(end, 3), "text": "こんにちは。"})
+        t = end
+    return {
+        "task": "transcribe",
+        "language": "japanese",
+        "duration": duration,
+        "text": "".join(s["text"] for s in segments),
+        "segments": segments,
+    }
+
+
+def _chat_response(request):
+    prompt_chars = sum(len(m.get("content") or "") for m in request.get("messages", []))
+    content = "1. 【まとめ】 合成音声\n2. 【特徴】 なし\n3. 【注目区間】 なし\n4. 【注意点】 なし"
+    return {
+        "id": "chatcmpl-fake",
+        "object": "chat.completion",
+        "created": int(time.time()),
+        "model": request.get("model", "fake"),
+        "choices": [{"index": 0, "message": {"role": "assistant", "content": content}, "finish_reason": "stop"}],
+        "usage": {"prompt_tokens": prompt_chars, "completion_tokens": len(content), "total_tokens": prompt_chars + len(content)},
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="OpenAI API 代替サーバー")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--latency-ms", type=float, default=300.0)
+    parser.add_argument("--jitter-ms", type=float, default=0.0)
+    parser.add_argument("--error-rate", type=float, default=0.0, help="429 を返す割合")
+    parser.add_argument("--retry-after", type=float, default=1.0, help="429 の Retry-After（秒）")
+    parser.add_argument("--token-ms", type=float, default=20.0, help="ストリーミング応答の断片ごとの間隔")
+    args = parser.parse_args()
+
+    server = FakeOpenAIServer(
+        args.host, args.port, args.latency_ms, args.jitter_ms, args.error_rate, args.retry_after, args.token_ms
+    )
+    print(f"OPENAI_BASE_URL={server.base_url}")
+    server.serve_forever()
+
+
+if __name__ == "__main__":
+    main()
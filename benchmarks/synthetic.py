@@ -0,0 +1,104 @@
+"""ベンチマーク用の合成音声（沈黙の位置が分かっている話し声風の信号）
+
+音節ごとに振幅が揺れる調波音＋ノイズを「発話」、ごく小さなノイズを「沈黙」とし、
+発話と沈黙を交互に並べる。ブロック単位で書き出すため、数時間の音声でも
+メモリ使用量は一定に収まる。
+"""
+import numpy as np
+import soundfile as sf
+
+SPEECH_LEVEL = 0.3     # 発話の振幅（最大音量付近）
+NOISE_FLOOR = 3e-4     # 沈黙区間のノイズ振幅（発話より約60dB小さい）
+SYLLABLE_HZ = 4.0      # 音節の揺れ（1秒あたり）
+
+
+def make_layout(duration, n_speakers=2, seed=0):
+    """発話区間と沈黙区間の並びを作る
+
+    沈黙は短いもの（区切り）から2秒以上の長いものまで混ぜ、各カテゴリが現れるようにする。
+
+    Args:
+        duration: 全体の長さ（秒）
+        n_speakers: 話者数（発話ごとに交代）
+
+    Returns:
+        dict: speech（start, end, speaker のリスト）と silences（start, end のリスト）
+    """
+    rng = np.random.default_rng(seed)
+    speech, silences = [], []
+    t = rng.uniform(0.5, 1.5)
+    silences.append({"start": 0.0, "end": t})
+    speaker = 0
+    while t < duration:
+        end = min(t + rng.uniform(1.5, 8.0), duration)
+        speech.append({"start": t, "end": end, "speaker": f"SPEAKER_{speaker:02d}"})
+        if end >= duration:
+            break
+        gap = rng.choice([rng.uniform(0.6, 1.4), rng.uniform(1.5, 2.0), rng.uniform(2.0, 6.0)], p=[0.5, 0.25, 0.25])
+        gap_end = min(end + gap, duration)
+        silences.append({"start": end, "end": gap_end})
+        t = gap_end
+        if rng.random() < 0.6:
+            speaker = (speaker + 1) % n_speakers
+    return {"duration": duration, "speech": speech, "silences": silences}
+
+
+def write_audio(path, layout, sr=16000, block_seconds=30, seed=0):
+    """レイアウトどおりの合成音声をWAVに書き出す（ブロック単位）"""
+    rng = np.random.default_rng(seed)
+    total = int(round(layout["duration"] * sr))
+    block = int(block_seconds * sr)
+    starts = np.array([s["start"] for s in layout["speech"]])
+    ends = np.array([s["end"] for s in layout["speech"]])
+    pitch = {s["speaker"]: 110.0 + 60.0 * int(s["speaker"][-2:]) for s in layout["speech"]}
+    pitches = np.array([pitch[s["speaker"]] for s in layout["speech"]])
+    with sf.SoundFile(path, "w", sr, 1, subtype="PCM_16") as out:
+        for offset in range(0, total, block):
+            n = min(block, total - offset)
+            t = (offset + np.arange(n)) / sr
+            # 各サンプルが属する発話（なければ -1）
+            idx = np.searchsorted(starts, t, side="right") - 1
+            in_speech = (idx >= 0) & (t < ends[np.clip(idx, 0, None)])
+            f0 = np.where(in_speech, pitches[np.clip(idx, 0, None)], 0.0)
+            voice = np.sin(2 * np.pi * f0 * t) + 0.5 * np.sin(4 * np.pi * f0 * t) + 0.3 * rng.standard_normal(n)
+            envelope = SPEECH_LEVEL * (0.55 + 0.45 * np.abs(np.sin(np.pi * SYLLABLE_HZ * t)))
+            y = np.where(in_speech, envelope * voice / 1.8, 0.0) + NOISE_FLOOR * rng.standard_normal(n)
+            out.write(y.astype(np.float32))
+
+
+def transcript_segments(layout, max_seconds=6.0):
+    """発話区間から文字起こしセグメント（Whisper の verbose_json 相当）を作る"""
+    segments = []
+    for s in layout["speech"]:
+        t = s["start"]
+        while t < s["end"]:
+            end = min(t + max_seconds, s["end"])
+            segments.append({"start": round(t, 3), "end": round(end, 3), "text": "こんにちは、よろしくお願いします。"})
+            t = end
+    return segments
+
+
+def diarization_turns(layout):
+    """発話区間から話者区間を作る（同じ話者が続く区間はまとめる）"""
+    turns = []
+    for s in layout["speech"]:
+        if turns and turns[-1]["speaker"] == s["speaker"]:
+            turns[-1]["end"] = s["end"]
+        else:
+            turns.append(dict(s))
+    return turns
+
+
+def silence_recall(layout, events, min_duration, tolerance=0.15):
+    """既知の沈黙（min_duration 以上）のうち、検出できた（events: SilenceTable）ものの割合"""
+    expected = [s for s in layout["silences"] if s["end"] - s["start"] >= min_duration + 2 * tolerance]
+    if not expected:
+        return 1.0
+    found = np.column_stack([events.start, events.end])
+    hits = 0
+    for s in expected:
+        if len(found) and np.any(
+            (np.abs(found[:, 0] - s["start"]) <= tolerance) & (np.abs(found[:, 1] - s["end"]) <= tolerance)
+        ):
+            hits += 1
+    return hits / len(expected)
@@ -12,6 +12,31 @@ OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
 HF_TOKEN = os.getenv("HF_TOKEN")
 WHISPER_MODEL = "whisper-1"
 GPT_MODEL = "gpt-4o-mini"
+DIARIZATION_MODEL = os.getenv("DIARIZATION_MODEL", "pyannote/speaker-diarization-3.1")  # モデルIDまたはローカルパス
+DIARIZATION_CACHE_DIR = os.getenv("DIARIZATION_CACHE_DIR")  # 未設定なら Hugging Face の既定キャッシュ
+DIARIZATION_PRELOAD = os.getenv("DIARIZATION_PRELOAD", "0") == "1"  # サーバー起動時に読み込む
+DIARIZATION_SKIP_SILENCE = os.getenv("DIARIZATION_SKIP_SILENCE", "1") == "1"  # 長い沈黙を除いた音声だけを話者分離
+DIARIZATION_MIN_GAP_SECONDS = 1.0      # 除く沈黙の最小長（秒）。短い間は発話の一部として残す
+DIARIZATION_GAP_PADDING_SECONDS = 0.25  # 除く沈黙の前後に残す長さ（秒）。発話の立ち上がり・減衰を削らない
+DIARIZATION_TORCH_THREADS = int(os.getenv("DIARIZATION_TORCH_THREADS", "0"))  # torch の演算スレッド数（0 ならCPU数÷CPUの枠数）
+DIARIZATION_BATCH_SIZE = int(os.getenv("DIARIZATION_BATCH_SIZE", "0"))  # 区分・埋め込みのバッチサイズ（0 ならモデルの既定）
+WHISPER_MAX_UPLOAD_MB = 25   # Whisper API のアップロード上限
+WHISPER_CHUNK_SECONDS = 600  # 分割文字起こしの1チャンク上限（秒）
+TRANSCRIPTION_WORKERS = 4    # 分割文字起こしの同時リクエスト数
+BATCH_API_CONCURRENCY = 4    # 一括処理でAPI処理を同時に行うファイル数
+MEMO_CHUNK_TOKENS = 6000     # メモ生成で1リクエストに入れる文字起こしの上限（概算トークン）
+MEMO_SUMMARY_TOKENS = 400    # チャンク要約1件あたりの最大出力トークン
+MEMO_MAP_WORKERS = 4         # チャンク要約の同時リクエスト数
+
+# API Client (process-wide connection pool, rate limits, retries)
+API_RPM = int(os.getenv("DANNWA_API_RPM", "500"))        # 1分あたりのリクエスト数の上限
+API_TPM = int(os.getenv("DANNWA_API_TPM", "200000"))     # 1分あたりのトークン数の上限
+API_MAX_CONNECTIONS = 20       # keep-alive で保持する接続数
+API_TIMEOUT_SECONDS = 600      # 1リクエストのタイムアウト（長い音声の文字起こしを含む）
+API_MAX_RETRIES = 5            # 429・5xx・接続エラーの再試行回数
+API_BACKOFF_BASE_SECONDS = 1.0
+API_BACKOFF_MAX_SECONDS = 60.0
+API_METRICS_SIZE = 1000        # 保持する呼び出し記録の件数
 
 # Silence Detection Configuration
 SILENCE_CONFIG = {
@@ -21,7 +46,55 @@ SILENCE_CONFIG = {
 SILENCE_DB_OPTIONS = [-35.0, -40.0]  # dB choices (relative to max RMS)
 SILENCE_DB_THRESHOLD = SILENCE_DB_OPTIONS[0]
 MIN_SILENCE_DURATION = 0.5  # 秒
+SILENCE_TOP_K = 10  # 統計に載せる長い沈黙の件数
+SILENCE_HISTOGRAM_EDGES = [0.0, 1.5, 2.0, 3.0, 5.0, 10.0, 30.0, 60.0]  # 秒（最後の区間は上限なし）
+SILENCE_PERCENTILES = [50, 90, 99]
+FRAME_LENGTH = 2048  # RMSのフレーム長（サンプル数）
+HOP_LENGTH = 512     # RMSのホップ長（サンプル数）
 
 # Audio Processing
 SUPPORTED_FORMATS = ["mp3", "wav", "m4a"]
 MAX_FILE_SIZE_MB = 100
+STREAM_BLOCK_SIZE = 262144  # サンプル数（ストリーミング解析の1ブロック）
+ENERGY_INDEX_STEP = 64      # 音量の索引（二乗和の累積）の粒度（サンプル数）。区間の端はこの単位に丸める
+ENERGY_INDEX_BLOCK = 65536  # 累積和を数え直す単位（サンプル数）。長い録音でも静かな区間の精度を保つ
+
+# Live Silence Detection (recording in progress)
+LIVE_REF_DECAY_DB_PER_MIN = 3.0  # 0dB基準（これまでの最大音量）が1分あたりに下がる量
+LIVE_MIN_REF_DBFS = -30.0        # 0dB基準の下限（録音の冒頭が静かでも沈黙と判定できるように）
+
+# Preprocessing (decode once → 16kHz mono + compressed upload rendition)
+SPEECH_SAMPLE_RATE = 16000  # Whisper / pyannote が内部で使うサンプリングレート
+UPLOAD_FORMAT = "OGG"       # 文字起こしAPIに送る圧縮形式（soundfile の format）
+UPLOAD_SUBTYPE = "OPUS"     # 音声向けコーデック（libsndfile 1.0.29 以降）
+
+# Waveform Rendering
+WAVEFORM_FIGSIZE = (10, 3)   # インチ
+WAVEFORM_DPI = 150           # 横 1500px → 描画点数の上限もこれに合わせる
+WAVEFORM_CACHE_SIZE = 32     # 描画済みPNGを保持する数（解析結果×しきい値）
+EXPORT_CACHE_SIZE = 16       # 作成済みの出力ファイルを保持する数
+
+# Cache (content-addressed, per pipeline stage)
+CACHE_DIR = os.getenv("DANNWA_CACHE_DIR", str(Path(__file__).resolve().parent / ".cache"))
+CACHE_MAX_MB = float(os.getenv("DANNWA_CACHE_MAX_MB", "2048"))
+
+# Background Jobs (SQLite-backed queue; results survive page reloads)
+JOBS_DIR = os.getenv("DANNWA_JOBS_DIR", str(Path(__file__).resolve().parent / ".jobs"))
+JOB_WORKERS = int(os.getenv("DANNWA_JOB_WORKERS", "4"))  # 同時に実行する解析ジョブ数（重い処理は下の枠で制限）
+JOB_POLL_SECONDS = 1.0       # 画面がジョブの進捗を確認する間隔（秒）
+JOB_RETENTION_HOURS = 72     # 完了したジョブの結果を保持する時間
+MEMO_PARTIAL_INTERVAL_SECONDS = 0.3  # 生成途中のメモを書き込む間隔（秒）
+UPLOAD_CHUNK_BYTES = 1 << 20  # アップロードをディスクに書き出す単位（バイト）
+
+# Admission Control (process-wide slots for heavy stages, shared by all sessions and jobs)
+ADMISSION_CPU_SLOTS = int(os.getenv("DANNWA_CPU_SLOTS", "2"))   # デコード・RMS・話者分離を同時に実行する数
+ADMISSION_API_SLOTS = int(os.getenv("DANNWA_API_SLOTS", "8"))   # 文字起こし・メモ生成のAPIリクエストを同時に送る数（分割文字起こしはチャンクごとに1つ）
+
+# Instrumentation (per-stage metrics; JSON lines + Prometheus textfile)
+METRICS_DIR = os.getenv("DANNWA_METRICS_DIR", str(Path(__file__).resolve().parent / ".metrics"))
+METRICS_LOG_PATH = os.getenv("DANNWA_METRICS_LOG", os.path.join(METRICS_DIR, "stages.jsonl"))  # 空なら出力しない
+METRICS_LOG_MAX_MB = 50      # 超えたら .1 に退避して新しいファイルに書く
+# node exporter の textfile collector が読む場所（空なら出力しない）
+METRICS_TEXTFILE = os.getenv("DANNWA_METRICS_TEXTFILE", os.path.join(METRICS_DIR, "dannwa.prom"))
+# tracemalloc による確保量の計測（Python 側の確保が遅くなるため既定は無効）
+METRICS_TRACE_ALLOCATIONS = os.getenv("DANNWA_METRICS_TRACE_ALLOCATIONS", "") == "1"
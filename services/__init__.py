@@ -1,6 +1,45 @@
-from .audio_processor import AudioProcessor
-from .transcription import TranscriptionService
-from .memo_generator import MemoGenerationService
-from .speaker_diarization import SpeakerDiarizationService
+"""分析サービス群
 
-__all__ = ["AudioProcessor", "TranscriptionService", "MemoGenerationService"]
+重い依存（librosa / OpenAI クライアント / pyannote など）を起動時に読み込まないよう、
+各クラス・関数は初めて参照された時点でモジュールごと読み込む。
+"""
+import importlib
+
+_EXPORTS = {
+    "AudioAnalysis": ".audio_processor",
+    "AudioProcessor": ".audio_processor",
+    "SilenceTable": ".audio_processor",
+    "EnergyIndex": ".energy_index",
+    "LiveSilenceDetector": ".live_silence",
+    "SharedAudio": ".shared_audio",
+    "Instrumentation": ".metrics",
+    "get_metrics_registry": ".metrics",
+    "AdmissionController": ".admission",
+    "get_admission_controller": ".admission",
+    "StageCache": ".cache",
+    "JobQueue": ".jobs",
+    "get_job_queue": ".jobs",
+    "TranscriptionService": ".transcription",
+    "MemoGenerationService": ".memo_generator",
+    "SpeakerDiarizationService": ".speaker_diarization",
+    "SpeechTimeline": ".speaker_diarization",
+    "StageScheduler": ".pipeline",
+    "STAGE_LABELS": ".pipeline",
+    "run_analysis": ".pipeline",
+    "align_speakers": ".alignment",
+    "render_waveform_png": ".waveform",
+}
+
+__all__ = list(_EXPORTS)
+
+
+def __getattr__(name):
+    if name not in _EXPORTS:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    value = getattr(importlib.import_module(_EXPORTS[name], __name__), name)
+    globals()[name] = value
+    return value
+
+
+def __dir__():
+    return sorted(set(globals()) | set(__all__))
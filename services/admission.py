@@ -0,0 +1,110 @@
+import os
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+
+from config import ADMISSION_API_SLOTS, ADMISSION_CPU_SLOTS
+
+from .metrics import observe_admission_wait
+
+# プロセス内で共有する受付制御（Streamlit の全セッション・全ジョブで共用）
+_controller = None
+_controller_lock = threading.Lock()
+
+
+def get_admission_controller():
+    """プロセス内で共有する AdmissionController（初回呼び出し時に作成）"""
+    global _controller
+    with _controller_lock:
+        if _controller is None:
+            _controller = AdmissionController()
+        return _controller
+
+
+class AdmissionController:
+    """重い処理の同時実行数を、処理の種類ごとの枠でプロセス全体に制限する
+
+    - "cpu": デコード・RMS・話者分離など、手元のCPUを使い切るステージ
+    - "api": 文字起こし・メモ生成など、外部APIの応答を待つステージ（分割文字起こしはチャンクのリクエストごと）
+    - "diarization": 話者分離（共有パイプラインは同時に1件しか推論できないため枠は1つ）
+
+    種類ごとに独立した枠を持つため、API の応答待ちのジョブがCPUの枠を塞がない。
+    話者分離は "diarization" の枠に入ってから "cpu" の枠を取るため、推論の順番待ちの間はCPUの枠を使わない。
+    枠が埋まっているときは到着順に待ち、待っている間は前に何件いるかを通知する。
+    """
+
+    def __init__(self, cpu_slots=ADMISSION_CPU_SLOTS, api_slots=ADMISSION_API_SLOTS, cpu_count=None):
+        """
+        Args:
+            cpu_slots: CPUを使うステージの同時実行数
+            api_slots: APIを呼ぶステージの同時実行数
+            cpu_count: 論理CPU数（省略時は os.cpu_count()。torch のスレッド数の算出に使う）
+        """
+        self.slots = {"cpu": max(1, int(cpu_slots)), "api": max(1, int(api_slots)), "diarization": 1}
+        self.cpu_count = cpu_count or os.cpu_count() or 1
+        self._active = {kind: 0 for kind in self.slots}
+        self._waiting = {kind: deque() for kind in self.slots}
+        self._cond = threading.Condition()
+
+    @property
+    def torch_threads(self):
+        """CPUの枠1つあたりの torch 演算スレッド数（枠が全部埋まってもコア数を超えない）"""
+        return max(1, self.cpu_count // self.slots["cpu"])
+
+    @contextmanager
+    def admit(self, kind, on_wait=None):
+        """枠が空くまで待ってから with ブロックを実行する
+
+        Args:
+            kind: "cpu" / "api" / "diarization"
+            on_wait: 待ち順が変わるたびに呼ばれるコールバック。引数は前に待っている件数で、
+                待ったあと枠に入った時点で None を渡す（待たずに入れた場合は呼ばれない）
+        """
+        if kind not in self.slots:
+            raise ValueError(f"未知の処理の種類です: {kind}")
+        ticket = object()
+        queue = self._waiting[kind]
+        reported = None
+        start = time.perf_counter()
+        with self._cond:
+            queue.append(ticket)
+        try:
+            while True:
+                with self._cond:
+                    if queue[0] is ticket and self._active[kind] < self.slots[kind]:
+                        queue.popleft()
+                        self._active[kind] += 1
+                        # 後ろで待っている側の待ち順が1つ進む
+                        self._cond.notify_all()
+                        break
+                    position = queue.index(ticket)
+                    if position == reported or on_wait is None:
+                        self._cond.wait()
+                        continue
+                # コールバック（進捗の書き込みなど）はロックの外で呼ぶ
+                on_wait(position)
+                reported = position
+        except BaseException:
+            with self._cond:
+                queue.remove(ticket)
+                self._cond.notify_all()
+            raise
+        waited = time.perf_counter() - start
+        observe_admission_wait(kind, waited)
+        if reported is not None:
+            on_wait(None)
+        try:
+            yield
+        finally:
+            with self._cond:
+                self._active[kind] -= 1
+                self._cond.notify_all()
+
+    def stats(self):
+        """種類ごとの枠数・実行中・待機中の件数"""
+        with self._cond:
+            return {
+                kind: {"slots": self.slots[kind], "active": self._active[kind], "waiting": len(self._waiting[kind])}
+                for kind in self.slots
+            }
@@ -0,0 +1,92 @@
+import heapq
+
+
+def align_segments(transcript_segments, diar_segments):
+    """文字起こしセグメントを、時間の重なりが最大の話者に割り当てる
+
+    両者を開始時刻でソートし、1回の走査で処理する（O((T + D) log D)）。
+    どの話者区間とも重ならないセグメントは、時間的に最も近い話者区間に割り当てる。
+
+    Args:
+        transcript_segments: {"start", "end", "text"} のリスト
+        diar_segments: {"start", "end", "speaker"} のリスト
+
+    Returns:
+        list: {"speaker", "start", "end", "text"} のリスト（時刻順）
+    """
+    turns = sorted(diar_segments, key=lambda d: d["start"])
+    segments = sorted(transcript_segments, key=lambda t: t["start"])
+    records = []
+    active = []  # (end, index) のヒープ: 現在のセグメントと重なりうる話者区間
+    next_turn = 0
+    last_ended = None  # 直前に終わった話者区間（重なりがない場合の候補）
+    for seg in segments:
+        start, end = seg["start"], seg["end"]
+        while next_turn < len(turns) and turns[next_turn]["start"] < end:
+            heapq.heappush(active, (turns[next_turn]["end"], next_turn))
+            next_turn += 1
+        while active and active[0][0] <= start:
+            _, index = heapq.heappop(active)
+            if last_ended is None or turns[index]["end"] >= turns[last_ended]["end"]:
+                last_ended = index
+
+        best, best_overlap = None, 0.0
+        for _, index in active:
+            overlap = min(end, turns[index]["end"]) - max(start, turns[index]["start"])
+            if overlap > best_overlap or (overlap == best_overlap and best is not None and index < best):
+                best, best_overlap = index, overlap
+        if best is None:
+            best = _nearest_turn(turns, start, end, last_ended, next_turn)
+
+        records.append(
+            {
+                "speaker": turns[best]["speaker"] if best is not None else None,
+                "start": start,
+                "end": end,
+                "text": seg["text"],
+            }
+        )
+    return records
+
+
+def _nearest_turn(turns, start, end, previous, following):
+    """重なる区間がない場合に、前後で最も近い話者区間を選ぶ"""
+    candidates = []
+    if previous is not None:
+        candidates.append((start - turns[previous]["end"], previous))
+    if following < len(turns):
+        candidates.append((turns[following]["start"] - end, following))
+    if not candidates:
+        return None
+    return min(candidates)[1]
+
+
+def merge_turns(records):
+    """同じ話者が連続するレコードを1つの発話にまとめる
+
+    Returns:
+        list: {"speaker", "start", "end", "text"} のリスト
+    """
+    turns = []
+    for record in records:
+        if turns and turns[-1]["speaker"] == record["speaker"]:
+            turns[-1]["end"] = max(turns[-1]["end"], record["end"])
+            turns[-1]["text"] += record["text"]
+        else:
+            turns.append(dict(record))
+    return turns
+
+
+def align_speakers(transcript_segments, diar_segments):
+    """話者割り当てと連続発話の結合をまとめて行う"""
+    return merge_turns(align_segments(transcript_segments, diar_segments))
+
+
+def format_speaker_lines(turns):
+    """発話レコードを「話者: テキスト」の行に整形（UI表示用）"""
+    lines = []
+    for turn in turns:
+        text = turn["text"].strip()
+        if text:
+            lines.append(f"{turn['speaker'] or '不明'}: {text}")
+    return lines
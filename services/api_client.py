@@ -0,0 +1,315 @@
+import contextvars
+import email.utils
+import random
+import threading
+import time
+from collections import deque
+
+import httpx
+import openai
+from openai import OpenAI
+from config import (
+    API_BACKOFF_BASE_SECONDS,
+    API_BACKOFF_MAX_SECONDS,
+    API_MAX_CONNECTIONS,
+    API_MAX_RETRIES,
+    API_METRICS_SIZE,
+    API_RPM,
+    API_TIMEOUT_SECONDS,
+    API_TPM,
+    OPENAI_API_KEY,
+)
+
+from .metrics import observe_api_call
+
+# 再試行する例外（429・5xx・接続エラー・タイムアウト）
+RETRYABLE_ERRORS = (
+    openai.RateLimitError,
+    openai.InternalServerError,
+    openai.APIConnectionError,
+)
+
+# 実行中の呼び出しの記録（送受信バイト数を _CountingTransport が加算する）
+_current_call = contextvars.ContextVar("dannwa_api_call", default=None)
+
+# プロセス内で共有する API クライアント（Streamlitの全セッション・全ジョブで共用）
+_client = None
+_client_lock = threading.Lock()
+
+
+def get_api_client():
+    """プロセス内で共有する ApiClient（初回呼び出し時に作成）"""
+    global _client
+    with _client_lock:
+        if _client is None:
+            _client = ApiClient()
+        return _client
+
+
+def estimate_tokens(text):
+    """トークン数の概算（日本語は1文字≒1トークンとして多めに見積もる）"""
+    return len(text or "")
+
+
+class TokenBucket:
+    """1分あたりの上限を平滑化して配分するトークンバケット"""
+
+    def __init__(self, per_minute, capacity=None):
+        """
+        Args:
+            per_minute: 1分あたりに補充する量
+            capacity: 貯められる上限（省略時は6秒ぶん。1分ぶんを一度に使い切らないようにする）
+        """
+        self.rate = per_minute / 60.0
+        self.capacity = capacity or max(1, per_minute // 10)
+        self.tokens = float(self.capacity)
+        self.updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self, now):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def acquire(self, amount=1):
+        """amount 分が貯まるまで待ってから消費
+
+        Returns:
+            float: 待った秒数
+        """
+        amount = min(amount, self.capacity)
+        waited = 0.0
+        while True:
+            with self._lock:
+                self._refill(time.monotonic())
+                if self.tokens >= amount:
+                    self.tokens -= amount
+                    return waited
+                wait = (amount - self.tokens) / self.rate
+            time.sleep(wait)
+            waited += wait
+
+    def adjust(self, amount):
+        """見積もりと実際の差分を反映（残高が負になれば次の呼び出しが待つ）"""
+        with self._lock:
+            self._refill(time.monotonic())
+            self.tokens = min(self.capacity, self.tokens - amount)
+
+
+class ApiClient:
+    """接続プール・レート制限・再試行・計測をまとめた OpenAI クライアント層
+
+    HTTP接続（keep-alive）はプロセス内で1つのプールを共有し、リクエスト数（RPM）と
+    トークン数（TPM）はトークンバケットで全呼び出しに配分する。429・5xx・接続エラーは
+    Retry-After（なければジッター付き指数バックオフ）に従って再試行する。
+    """
+
+    def __init__(
+        self,
+        client=None,
+        rpm=API_RPM,
+        tpm=API_TPM,
+        max_retries=API_MAX_RETRIES,
+        backoff_base=API_BACKOFF_BASE_SECONDS,
+        backoff_max=API_BACKOFF_MAX_SECONDS,
+    ):
+        """
+        Args:
+            client: OpenAI互換クライアント（省略時は共有の接続プールで生成）
+            rpm: 1分あたりのリクエスト数の上限
+            tpm: 1分あたりのトークン数の上限
+            max_retries: 再試行の最大回数
+            backoff_base: バックオフの初期値（秒）
+            backoff_max: バックオフの上限（秒）
+        """
+        self.openai = client or OpenAI(
+            api_key=OPENAI_API_KEY,
+            # 再試行はこの層で行うため、SDK 側の再試行は無効にする
+            max_retries=0,
+            http_client=httpx.Client(
+                transport=_CountingTransport(
+                    limits=httpx.Limits(
+                        max_connections=API_MAX_CONNECTIONS,
+                        max_keepalive_connections=API_MAX_CONNECTIONS,
+                    ),
+                ),
+                timeout=httpx.Timeout(API_TIMEOUT_SECONDS, connect=10.0),
+            ),
+        )
+        self.requests = TokenBucket(rpm)
+        self.tokens = TokenBucket(tpm)
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self._paused_until = 0.0
+        self._pause_lock = threading.Lock()
+        self._metrics = deque(maxlen=API_METRICS_SIZE)
+        self._metrics_lock = threading.Lock()
+
+    def call(self, endpoint, func, *args, tokens=0, **kwargs):
+        """レート制限と再試行つきで API を呼ぶ
+
+        Args:
+            endpoint: 計測用の名前（"transcription" / "chat" など）
+            func: 呼び出す SDK のメソッド（例: client.chat.completions.create）
+            tokens: 見積もりトークン数（TPM の配分に使う）
+
+        Returns:
+            func の戻り値
+        """
+        start = time.perf_counter()
+        record = {"endpoint": endpoint, "request_bytes": 0, "response_bytes": 0}
+        observe_api_call(record)
+        context_token = _current_call.set(record)
+        try:
+            return self._call(record, func, args, kwargs, tokens, start)
+        finally:
+            _current_call.reset(context_token)
+
+    def _call(self, record, func, args, kwargs, tokens, start):
+        attempts = 0
+        waited = 0.0
+        while True:
+            attempts += 1
+            waited += self._wait_for_pause()
+            waited += self.requests.acquire(1)
+            if tokens:
+                waited += self.tokens.acquire(tokens)
+            try:
+                response = func(*args, **kwargs)
+            except RETRYABLE_ERRORS as exc:
+                if attempts > self.max_retries:
+                    self._record(record, start, attempts, waited, exc.__class__.__name__)
+                    raise
+                delay = self._retry_delay(exc, attempts)
+                if isinstance(exc, openai.RateLimitError):
+                    # 429 はプロセス全体で待つ（他の呼び出しも同じ上限に当たるため）
+                    self._pause(delay)
+                else:
+                    time.sleep(delay)
+                    waited += delay
+                continue
+            except Exception as exc:
+                self._record(record, start, attempts, waited, exc.__class__.__name__)
+                raise
+            usage = getattr(response, "usage", None)
+            if tokens and usage is not None and getattr(usage, "total_tokens", None) is not None:
+                self.tokens.adjust(usage.total_tokens - tokens)
+            self._record(record, start, attempts, waited, "ok")
+            return response
+
+    def _retry_delay(self, exc, attempts):
+        """Retry-After があればそれに従い、なければフルジッターの指数バックオフ"""
+        retry_after = _retry_after_seconds(getattr(exc, "response", None))
+        if retry_after is not None:
+            return min(retry_after, self.backoff_max)
+        return random.uniform(0, min(self.backoff_max, self.backoff_base * 2 ** (attempts - 1)))
+
+    def _pause(self, seconds):
+        with self._pause_lock:
+            self._paused_until = max(self._paused_until, time.monotonic() + seconds)
+
+    def _wait_for_pause(self):
+        waited = 0.0
+        while True:
+            with self._pause_lock:
+                remaining = self._paused_until - time.monotonic()
+            if remaining <= 0:
+                return waited
+            time.sleep(remaining)
+            waited += remaining
+
+    def _record(self, record, start, attempts, waited, status):
+        record.update(
+            seconds=time.perf_counter() - start,
+            wait_seconds=waited,
+            attempts=attempts,
+            status=status,
+            at=time.time(),
+        )
+        with self._metrics_lock:
+            self._metrics.append(record)
+
+    def metrics(self):
+        """直近の呼び出しごとの記録（新しいものが最後）
+
+        request_bytes / response_bytes は再試行を含めた送受信量（ストリーミング応答は読み終えた分まで）。
+        """
+        with self._metrics_lock:
+            return list(self._metrics)
+
+    def summary(self):
+        """エンドポイントごとの呼び出し数・失敗数・再試行数・レイテンシ（p50 / p95）"""
+        by_endpoint = {}
+        for record in self.metrics():
+            by_endpoint.setdefault(record["endpoint"], []).append(record)
+        summary = {}
+        for endpoint, records in by_endpoint.items():
+            latencies = sorted(r["seconds"] for r in records)
+            summary[endpoint] = {
+                "calls": len(records),
+                "errors": sum(r["status"] != "ok" for r in records),
+                "retries": sum(r["attempts"] - 1 for r in records),
+                "p50_seconds": round(_percentile(latencies, 50), 3),
+                "p95_seconds": round(_percentile(latencies, 95), 3),
+                "wait_seconds": round(sum(r["wait_seconds"] for r in records), 3),
+            }
+        return summary
+
+
+class _CountingTransport(httpx.HTTPTransport):
+    """送受信したバイト数（ボディ部分）を、実行中の呼び出しの記録に加算する"""
+
+    def handle_request(self, request):
+        record = _current_call.get()
+        if record is not None:
+            # multipart（音声ファイル）もボディ長は Content-Length に入る
+            record["request_bytes"] += int(request.headers.get("content-length") or 0)
+        response = super().handle_request(request)
+        if record is not None:
+            # ストリーミング応答は読まれた時点で加算するため、呼び出しが返ったあとも増える
+            response.stream = _CountingStream(response.stream, record)
+        return response
+
+
+class _CountingStream(httpx.SyncByteStream):
+    def __init__(self, stream, record):
+        self._stream = stream
+        self._record = record
+
+    def __iter__(self):
+        for chunk in self._stream:
+            self._record["response_bytes"] += len(chunk)
+            yield chunk
+
+    def close(self):
+        self._stream.close()
+
+
+def _retry_after_seconds(response):
+    """Retry-After（秒 / HTTP日付）または retry-after-ms ヘッダーを秒に変換"""
+    if response is None:
+        return None
+    headers = response.headers
+    if headers.get("retry-after-ms"):
+        try:
+            return float(headers["retry-after-ms"]) / 1000
+        except ValueError:
+            pass
+    value = headers.get("retry-after")
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, email.utils.parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+def _percentile(sorted_values, q):
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, int(round(q / 100 * (len(sorted_values) - 1))))
+    return sorted_values[index]
@@ -1,6 +1,29 @@
+from functools import cached_property
+
 import librosa
 import numpy as np
-from config import MIN_SILENCE_DURATION, SILENCE_CONFIG, SILENCE_DB_THRESHOLD
+import soundfile as sf
+from config import (
+    FRAME_LENGTH,
+    HOP_LENGTH,
+    MIN_SILENCE_DURATION,
+    SILENCE_CONFIG,
+    SILENCE_DB_OPTIONS,
+    SILENCE_DB_THRESHOLD,
+    SILENCE_HISTOGRAM_EDGES,
+    SILENCE_PERCENTILES,
+    SILENCE_TOP_K,
+    STREAM_BLOCK_SIZE,
+)
+
+from .energy_index import EnergyIndex
+
+# librosa.amplitude_to_db の既定値（ストリーミング時も同じdBスケールにする）
+_AMIN = 1e-5
+_TOP_DB = 80.0
+
+# SilenceTable のカテゴリコード（添字）とカテゴリ名の対応
+SILENCE_CATEGORIES = ("other", "1.5-2s", "2s+")
 
 
 class AudioProcessor:
@@ -20,70 +43,217 @@ class AudioProcessor:
         return y, sr
     
     @staticmethod
-    def detect_silence(y, sr, frame_length=2048, hop_length=512, db_threshold=SILENCE_DB_THRESHOLD):
+    def detect_silence(
+        y, sr, frame_length=FRAME_LENGTH, hop_length=HOP_LENGTH, db_threshold=SILENCE_DB_THRESHOLD, energy=None
+    ):
         """沈黙を検出
         
         Args:
-            y: 音声配列
+            y: 音声配列（energy を渡す場合は None でよい）
             sr: サンプリングレート
             frame_length: フレーム長
             hop_length: ホップ長
+            energy: 作成済みの EnergyIndex（渡すとフレーム長・ホップ長を変えても y を読み直さない）
             
         Returns:
-            list: 沈黙イベントのリスト
+            SilenceTable: 沈黙イベントの表
         """
-        # RMS（音量）をdBに変換（最大値=0dB）
-        rms = librosa.feature.rms(y=y, frame_length=frame_length, hop_length=hop_length)[0]
-        rms_db = librosa.amplitude_to_db(rms, ref=np.max)
-        silent_frames = rms_db < db_threshold
-        
-        # フレームから時間に変換
-        times = librosa.frames_to_time(np.arange(len(silent_frames)), sr=sr, hop_length=hop_length)
-        
-        # 連続した沈黙区間を検出
-        silence_events = []
+        analysis = AudioAnalysis.from_signal(y, sr, frame_length=frame_length, hop_length=hop_length, energy=energy)
+        return analysis.silence_events(db_threshold)
+
+    @staticmethod
+    def _make_event(silence_start, silence_end):
+        """沈黙区間をイベント辞書に変換（規定秒未満はNone）"""
+        duration = silence_end - silence_start
+        if duration < MIN_SILENCE_DURATION:
+            return None
+        return {
+            "start": round(silence_start, 2),
+            "end": round(silence_end, 2),
+            "duration": round(duration, 2),
+            "category": AudioProcessor._categorize_silence(duration)
+        }
+
+    @staticmethod
+    def rms_db(y, sr, frame_length=FRAME_LENGTH, hop_length=HOP_LENGTH, energy=None):
+        """RMS音量(dB)と時間軸を取得（energy は detect_silence と同じ）"""
+        analysis = AudioAnalysis.from_signal(y, sr, frame_length=frame_length, hop_length=hop_length, energy=energy)
+        return analysis.times, analysis.rms_db
+
+    @staticmethod
+    def iter_blocks(file_path, block_size=STREAM_BLOCK_SIZE):
+        """音声ファイルをモノラルのブロック単位で読み込む
+
+        Args:
+            file_path: 音声ファイルパス
+            block_size: 1ブロックあたりのサンプル数
+
+        Yields:
+            np.ndarray: float32のモノラル音声ブロック（load_audioと同じ値）
+        """
+        try:
+            f = sf.SoundFile(file_path)
+        except RuntimeError:
+            # libsndfileで読めない形式（m4aなど）は一括デコードで代替
+            y, _ = AudioProcessor.load_audio(file_path)
+            for start in range(0, len(y), block_size):
+                yield y[start:start + block_size]
+            return
+        with f:
+            while True:
+                block = f.read(block_size, dtype="float32", always_2d=True)
+                if not len(block):
+                    break
+                yield block.mean(axis=1) if block.shape[1] > 1 else block[:, 0]
+
+    @staticmethod
+    def read_segment(file_path, start, end):
+        """指定区間だけをモノラルで読み込む
+
+        Args:
+            file_path: 音声ファイルパス
+            start: 開始時刻（秒）
+            end: 終了時刻（秒）
+
+        Returns:
+            tuple: (y: 区間の音声配列, sr: サンプリングレート)
+        """
+        try:
+            f = sf.SoundFile(file_path)
+        except RuntimeError:
+            y, sr = librosa.load(file_path, sr=None, offset=start, duration=end - start)
+            return y, sr
+        with f:
+            sr = f.samplerate
+            f.seek(min(int(round(start * sr)), f.frames))
+            block = f.read(max(int(round((end - start) * sr)), 0), dtype="float32", always_2d=True)
+        return (block.mean(axis=1) if block.shape[1] > 1 else block[:, 0]), sr
+
+    @staticmethod
+    def get_samplerate(file_path):
+        """デコードせずにサンプリングレートを取得"""
+        try:
+            return sf.info(file_path).samplerate
+        except RuntimeError:
+            return librosa.get_samplerate(file_path)
+
+    @staticmethod
+    def get_file_duration(file_path):
+        """デコードせずに音声全体の長さ（秒）を取得"""
+        return round(librosa.get_duration(path=file_path), 2)
+
+    @staticmethod
+    def iter_rms(file_path, frame_length=FRAME_LENGTH, hop_length=HOP_LENGTH, block_size=STREAM_BLOCK_SIZE):
+        """RMSをブロック単位で計算
+
+        librosa.feature.rms(center=True) と同じフレーム分割になるよう、
+        先頭と末尾に frame_length // 2 のゼロを詰めて処理する。
+
+        Yields:
+            np.ndarray: ブロックごとのRMS配列（連結すると一括計算と一致）
+        """
+        blocks = AudioProcessor.iter_blocks(file_path, block_size)
+        return AudioProcessor.rms_from_blocks(blocks, frame_length, hop_length)
+
+    @staticmethod
+    def rms_from_blocks(blocks, frame_length=FRAME_LENGTH, hop_length=HOP_LENGTH):
+        """任意のブロック列（iter_blocks の出力など）からRMSを逐次計算"""
+        pad = np.zeros(frame_length // 2, dtype=np.float32)
+        buf = pad
+        for block in blocks:
+            buf = np.concatenate([buf, block])
+            rms, buf = AudioProcessor._consume_frames(buf, frame_length, hop_length)
+            if rms is not None:
+                yield rms
+        rms, _ = AudioProcessor._consume_frames(np.concatenate([buf, pad]), frame_length, hop_length)
+        if rms is not None:
+            yield rms
+
+    @staticmethod
+    def _consume_frames(buf, frame_length, hop_length):
+        """バッファから計算可能なフレームのRMSを求め、残りのバッファを返す"""
+        if len(buf) < frame_length:
+            return None, buf
+        n_frames = 1 + (len(buf) - frame_length) // hop_length
+        used = (n_frames - 1) * hop_length + frame_length
+        # librosa.feature.rms(center=False) と同じフレームを二乗和の累積から求める（フレームの重なりを再計算しない）
+        step = EnergyIndex.exact_step(frame_length, hop_length)
+        rms = EnergyIndex.from_signal(buf[:used], 1, step=step).rms(frame_length, hop_length, center=False)
+        return rms, buf[n_frames * hop_length:]
+
+    @staticmethod
+    def _to_db(rms, ref):
+        """amplitude_to_db(ref=np.max) と同じ変換を既知の最大RMSで行う"""
+        db = librosa.amplitude_to_db(rms, ref=ref, amin=_AMIN, top_db=None)
+        return np.maximum(db, -_TOP_DB)
+
+    @staticmethod
+    def stream_max_rms(file_path, frame_length=FRAME_LENGTH, hop_length=HOP_LENGTH, block_size=STREAM_BLOCK_SIZE):
+        """1パス目: 0dB基準となる最大RMSを求める"""
+        ref = None
+        for rms in AudioProcessor.iter_rms(file_path, frame_length, hop_length, block_size):
+            block_max = rms.max()
+            ref = block_max if ref is None else max(ref, block_max)
+        return ref
+
+    @staticmethod
+    def stream_silence(
+        file_path,
+        frame_length=FRAME_LENGTH,
+        hop_length=HOP_LENGTH,
+        db_threshold=SILENCE_DB_THRESHOLD,
+        block_size=STREAM_BLOCK_SIZE,
+        ref=None,
+    ):
+        """音声ファイルをブロック単位で読み込みながら沈黙を検出
+
+        ref=np.max のdB正規化は2パスで行う（1パス目で最大RMSを求める）。
+        メモリ使用量は録音の長さに依存せず、detect_silence と同じイベントを返す。
+
+        Args:
+            file_path: 音声ファイルパス
+            frame_length: フレーム長
+            hop_length: ホップ長
+            db_threshold: 沈黙判定しきい値（最大音量=0dB）
+            block_size: 1ブロックあたりのサンプル数
+            ref: 既知の最大RMS（指定時は1パス目を省略）
+
+        Yields:
+            dict: 沈黙イベント（確定した順に逐次出力）
+        """
+        if ref is None:
+            ref = AudioProcessor.stream_max_rms(file_path, frame_length, hop_length, block_size)
+        if ref is None:
+            return
+        sr = AudioProcessor.get_samplerate(file_path)
         in_silence = False
         silence_start = 0
-        
-        for i, is_silent in enumerate(silent_frames):
-            if is_silent and not in_silence:
-                silence_start = times[i]
-                in_silence = True
-            elif not is_silent and in_silence:
-                silence_end = times[i]
-                duration = silence_end - silence_start
-                
-                # 規定秒以上の沈黙のみカウント
-                if duration >= MIN_SILENCE_DURATION:
-                    silence_events.append({
-                        "start": round(silence_start, 2),
-                        "end": round(silence_end, 2),
-                        "duration": round(duration, 2),
-                        "category": AudioProcessor._categorize_silence(duration)
-                    })
-                in_silence = False
-        
-        # 最後が沈黙で終わった場合
+        frame_index = 0
+        for rms in AudioProcessor.iter_rms(file_path, frame_length, hop_length, block_size):
+            silent_frames = AudioProcessor._to_db(rms, ref) < db_threshold
+            # 状態が切り替わるフレームだけを走査
+            changes = np.flatnonzero(silent_frames != np.concatenate(([in_silence], silent_frames[:-1])))
+            for i in changes:
+                t = (frame_index + int(i)) * hop_length / float(sr)
+                if silent_frames[i]:
+                    silence_start = t
+                    in_silence = True
+                else:
+                    event = AudioProcessor._make_event(silence_start, t)
+                    if event:
+                        yield event
+                    in_silence = False
+            frame_index += len(rms)
         if in_silence:
-            silence_end = times[-1]
-            duration = silence_end - silence_start
-            if duration >= MIN_SILENCE_DURATION:
-                silence_events.append({
-                    "start": round(silence_start, 2),
-                    "end": round(silence_end, 2),
-                    "duration": round(duration, 2),
-                    "category": AudioProcessor._categorize_silence(duration)
-                })
-        
-        return silence_events
+            event = AudioProcessor._make_event(silence_start, (frame_index - 1) * hop_length / float(sr))
+            if event:
+                yield event
 
     @staticmethod
-    def rms_db(y, sr, frame_length=2048, hop_length=512):
-        """RMS音量(dB)と時間軸を取得"""
-        rms = librosa.feature.rms(y=y, frame_length=frame_length, hop_length=hop_length)[0]
-        rms_db = librosa.amplitude_to_db(rms, ref=np.max)
-        times = librosa.frames_to_time(np.arange(len(rms_db)), sr=sr, hop_length=hop_length)
-        return times, rms_db
+    def stream_rms_db(file_path, frame_length=FRAME_LENGTH, hop_length=HOP_LENGTH, block_size=STREAM_BLOCK_SIZE):
+        """rms_db のストリーミング版（音声全体を保持せずRMS包絡のみ保持）"""
+        analysis = AudioAnalysis.from_file(file_path, frame_length, hop_length, block_size)
+        return analysis.times, analysis.rms_db
     
     @staticmethod
     def _categorize_silence(duration):
@@ -107,35 +277,38 @@ class AudioProcessor:
         """沈黙統計を計算
         
         Args:
-            silence_events: 沈黙イベントのリスト
+            silence_events: 沈黙イベントの表（SilenceTable、イベント辞書のリストも可）
             
         Returns:
-            dict: 統計情報
+            dict: 統計情報（all_silences は SilenceTable のまま保持）
         """
-        # 統計は2秒以上のみ対象
-        short_silences = []
-        long_silences = [e for e in silence_events if e["category"] == "2s+"]
-        
-        total_duration = sum(e["duration"] for e in long_silences)
-        
-        # Top10の長い沈黙を取得（2秒以上のみ）
-        sorted_silences = sorted(long_silences, key=lambda x: x["duration"], reverse=True)[:10]
+        table = silence_events if isinstance(silence_events, SilenceTable) else SilenceTable.from_records(silence_events)
+        # 件数・合計・Top10は2秒以上のみ対象、分布（ヒストグラム・パーセンタイル）は全沈黙が対象
+        long_silences = table.select(table.category == SILENCE_CATEGORIES.index("2s+"))
+        long_total = round(float(long_silences.duration.sum()), 2)
         
         stats = {
-            "total_silence_time": round(total_duration, 2),
+            "total_silence_time": long_total,
             "1.5-2s": {
-                "count": len(short_silences),
-                "total_time": round(sum(e["duration"] for e in short_silences), 2)
+                "count": 0,
+                "total_time": 0.0
             },
             "2s+": {
                 "count": len(long_silences),
-                "total_time": round(sum(e["duration"] for e in long_silences), 2)
+                "total_time": long_total
             },
-            "longest_silences": sorted_silences,
-            "all_silences": silence_events
+            "longest_silences": long_silences.top_k(SILENCE_TOP_K).records(),
+            "duration_histogram": table.histogram(),
+            "duration_percentiles": table.percentiles(),
+            "all_silences": table
         }
         
         return stats
+
+    @staticmethod
+    def export_silence_stats(stats):
+        """沈黙統計をJSONで書き出せる形にする（all_silences をイベント辞書のリストに変換）"""
+        return {**stats, "all_silences": stats["all_silences"].records()}
     
     @staticmethod
     def get_duration(y, sr):
@@ -149,3 +322,321 @@ class AudioProcessor:
             float: 音声の長さ（秒）
         """
         return round(librosa.get_duration(y=y, sr=sr), 2)
+
+
+class SilenceTable:
+    """沈黙イベントの列指向テーブル
+
+    イベントごとの辞書の代わりに、開始・終了・長さ（秒, 小数第2位で丸め済み）と
+    カテゴリコード（SILENCE_CATEGORIES の添字）を列ごとの NumPy 配列で持つ。
+    統計・描画・分割位置の計算は配列のまま行い、辞書や DataFrame は表示・書き出しの直前にだけ作る。
+    """
+
+    COLUMNS = ("start", "end", "duration", "category")
+
+    def __init__(self, start, end, duration, category):
+        """
+        Args:
+            start: 開始時刻の配列（秒）
+            end: 終了時刻の配列（秒）
+            duration: 長さの配列（秒）
+            category: カテゴリコードの配列
+        """
+        self.start = np.asarray(start, dtype=np.float64)
+        self.end = np.asarray(end, dtype=np.float64)
+        self.duration = np.asarray(duration, dtype=np.float64)
+        self.category = np.asarray(category, dtype=np.int8)
+
+    @classmethod
+    def from_times(cls, start_times, end_times):
+        """沈黙区間の開始・終了時刻（秒）から作成（規定秒未満は除外、_make_event と同じ丸め・カテゴリ）"""
+        start_times = np.asarray(start_times, dtype=np.float64)
+        end_times = np.asarray(end_times, dtype=np.float64)
+        durations = end_times - start_times
+        keep = durations >= MIN_SILENCE_DURATION
+        start_times, end_times, durations = start_times[keep], end_times[keep], durations[keep]
+        return cls(
+            np.round(start_times, 2),
+            np.round(end_times, 2),
+            np.round(durations, 2),
+            SilenceTable._category_codes(durations),
+        )
+
+    @classmethod
+    def from_records(cls, events):
+        """イベント辞書のリスト（_make_event の形式）から作成"""
+        codes = {name: code for code, name in enumerate(SILENCE_CATEGORIES)}
+        return cls(
+            [e["start"] for e in events],
+            [e["end"] for e in events],
+            [e["duration"] for e in events],
+            [codes[e["category"]] for e in events],
+        )
+
+    def to_dict(self, prefix=""):
+        """キャッシュ保存用の辞書（列名→配列）"""
+        return {f"{prefix}{name}": getattr(self, name) for name in SilenceTable.COLUMNS}
+
+    @classmethod
+    def from_dict(cls, data, prefix=""):
+        """to_dict の結果から復元"""
+        return cls(*(np.asarray(data[f"{prefix}{name}"]) for name in SilenceTable.COLUMNS))
+
+    @staticmethod
+    def pack(tables):
+        """{しきい値: SilenceTable} を1つの配列辞書にまとめる（.npz 保存用）"""
+        packed = {}
+        for threshold, table in tables.items():
+            packed.update(table.to_dict(prefix=f"{threshold}:"))
+        return packed
+
+    @staticmethod
+    def unpack(data):
+        """pack の結果から {しきい値: SilenceTable} を復元"""
+        thresholds = dict.fromkeys(name.rsplit(":", 1)[0] for name in data)
+        return {float(t): SilenceTable.from_dict(data, prefix=f"{t}:") for t in thresholds}
+
+    def __len__(self):
+        return len(self.start)
+
+    @property
+    def categories(self):
+        """カテゴリ名の配列"""
+        return np.asarray(SILENCE_CATEGORIES)[self.category]
+
+    def select(self, mask):
+        """行を選択した新しい表（真偽値マスクまたはインデックス配列）"""
+        return SilenceTable(self.start[mask], self.end[mask], self.duration[mask], self.category[mask])
+
+    def top_k(self, k=SILENCE_TOP_K):
+        """長い順に k 件（同じ長さは時刻順）
+
+        全件の並べ替えはせず、argpartition で上位候補を選んでから候補だけを並べる。
+        """
+        if len(self) > k:
+            candidates = np.argpartition(-self.duration, k - 1)[:k]
+            kth = self.duration[candidates].min()
+            # k 番目と同じ長さが複数あれば、時刻の早いものを残す（安定ソートと同じ結果）
+            above = np.flatnonzero(self.duration > kth)
+            ties = np.flatnonzero(self.duration == kth)[:k - len(above)]
+            index = np.concatenate([above, ties])
+        else:
+            index = np.arange(len(self))
+        return self.select(index[np.lexsort((index, -self.duration[index]))])
+
+    def histogram(self, edges=SILENCE_HISTOGRAM_EDGES):
+        """長さの分布（最後の区間は上限なし）
+
+        Returns:
+            dict: edges（区間の下限, 秒）/ labels / counts
+        """
+        edges = np.asarray(edges, dtype=np.float64)
+        bins = np.maximum(np.searchsorted(edges, self.duration, side="right") - 1, 0)
+        counts = np.bincount(bins, minlength=len(edges))
+        labels = [f"{lo:g}-{hi:g}s" for lo, hi in zip(edges[:-1], edges[1:])] + [f"{edges[-1]:g}s+"]
+        return {"edges": edges.tolist(), "labels": labels, "counts": counts.tolist()}
+
+    def percentiles(self, q=SILENCE_PERCENTILES):
+        """長さのパーセンタイルと最大値（秒, 沈黙がなければ 0）"""
+        if not len(self):
+            values = np.zeros(len(q) + 1)
+        else:
+            values = np.append(np.percentile(self.duration, q), self.duration.max())
+        names = [f"p{p:g}" for p in q] + ["max"]
+        return {name: round(float(v), 2) for name, v in zip(names, values)}
+
+    def records(self, limit=None):
+        """イベント辞書のリスト（表示・JSON書き出し用）"""
+        rows = slice(None, limit)
+        return [
+            {"start": start, "end": end, "duration": duration, "category": category}
+            for start, end, duration, category in zip(
+                self.start[rows].tolist(),
+                self.end[rows].tolist(),
+                self.duration[rows].tolist(),
+                self.categories[rows].tolist(),
+            )
+        ]
+
+    def to_frame(self, limit=None):
+        """pandas の DataFrame（表示・書き出し用）"""
+        import pandas as pd
+
+        rows = slice(None, limit)
+        return pd.DataFrame(
+            {
+                "start": self.start[rows],
+                "end": self.end[rows],
+                "duration": self.duration[rows],
+                "category": self.categories[rows],
+            }
+        )
+
+    @staticmethod
+    def _category_codes(durations):
+        """_categorize_silence の配列版（カテゴリコードを返す）"""
+        short = SILENCE_CONFIG["threshold_short"]
+        return np.select(
+            [
+                (durations >= short["min"]) & (durations < short["max"]),
+                durations >= SILENCE_CONFIG["threshold_long"]["min"],
+            ],
+            [SILENCE_CATEGORIES.index("1.5-2s"), SILENCE_CATEGORIES.index("2s+")],
+            default=SILENCE_CATEGORIES.index("other"),
+        ).astype(np.int8)
+
+
+class AudioAnalysis:
+    """RMS包絡を一度だけ計算し、沈黙検出・統計・波形表示で共有する解析結果"""
+
+    def __init__(self, rms, sr, frame_length=FRAME_LENGTH, hop_length=HOP_LENGTH, duration=None, energy=None):
+        """
+        Args:
+            rms: フレームごとのRMS配列
+            sr: サンプリングレート
+            frame_length: フレーム長
+            hop_length: ホップ長
+            duration: 音声全体の長さ（秒）
+            energy: 元にした EnergyIndex（あれば at_resolution で別の分解能に作り直せる。保存はしない）
+        """
+        self.rms = rms
+        self.sr = sr
+        self.frame_length = frame_length
+        self.hop_length = hop_length
+        self.duration = duration
+        self.energy = energy
+
+    @classmethod
+    def from_signal(cls, y, sr, frame_length=FRAME_LENGTH, hop_length=HOP_LENGTH, energy=None):
+        """デコード済みの音声配列から解析（energy を渡すと y は使わない）"""
+        if energy is None:
+            energy = EnergyIndex.from_signal(y, sr, step=EnergyIndex.exact_step(frame_length, hop_length))
+        return cls.from_energy(energy, frame_length, hop_length)
+
+    @classmethod
+    def from_energy(cls, energy, frame_length=FRAME_LENGTH, hop_length=HOP_LENGTH, duration=None):
+        """EnergyIndex から任意のフレーム長・ホップ長で解析（O(フレーム数)）
+
+        フレーム長の半分とホップ長が energy.step の倍数でなければ、フレームの端を step 単位に丸める。
+        """
+        return cls(
+            energy.rms(frame_length, hop_length),
+            energy.sr,
+            frame_length,
+            hop_length,
+            round(energy.duration, 2) if duration is None else duration,
+            energy,
+        )
+
+    def at_resolution(self, frame_length, hop_length):
+        """同じ録音を別のフレーム長・ホップ長で解析し直す（音声は読み直さない）"""
+        if self.energy is None:
+            raise ValueError("EnergyIndex のない解析結果は分解能を変えられません。")
+        return AudioAnalysis.from_energy(self.energy, frame_length, hop_length, self.duration)
+
+    @classmethod
+    def from_file(cls, file_path, frame_length=FRAME_LENGTH, hop_length=HOP_LENGTH, block_size=STREAM_BLOCK_SIZE):
+        """音声ファイルをブロック単位で読み込み、1パスで解析"""
+        rms = np.concatenate(list(AudioProcessor.iter_rms(file_path, frame_length, hop_length, block_size)))
+        return cls(
+            rms,
+            AudioProcessor.get_samplerate(file_path),
+            frame_length,
+            hop_length,
+            AudioProcessor.get_file_duration(file_path),
+        )
+
+    def to_dict(self):
+        """キャッシュ保存用の辞書（NumPy配列を含む）"""
+        return {
+            "rms": self.rms,
+            "sr": np.asarray(self.sr),
+            "frame_length": np.asarray(self.frame_length),
+            "hop_length": np.asarray(self.hop_length),
+            "duration": np.asarray(self.duration if self.duration is not None else np.nan),
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        """to_dict の結果から復元"""
+        duration = float(data["duration"])
+        return cls(
+            np.asarray(data["rms"]),
+            int(data["sr"]),
+            int(data["frame_length"]),
+            int(data["hop_length"]),
+            None if np.isnan(duration) else duration,
+        )
+
+    @cached_property
+    def rms_db(self):
+        """RMS音量(dB)（最大値=0dB）"""
+        return librosa.amplitude_to_db(self.rms, ref=np.max)
+
+    @cached_property
+    def times(self):
+        """各フレームの時刻（秒）"""
+        return librosa.frames_to_time(np.arange(len(self.rms)), sr=self.sr, hop_length=self.hop_length)
+
+    def silent_runs(self, db_threshold=SILENCE_DB_THRESHOLD):
+        """しきい値未満が連続するフレーム区間を求める
+
+        Returns:
+            tuple: (starts: 開始フレーム配列, ends: 終了フレーム配列)
+                終了フレームは沈黙が明けた最初のフレーム（末尾まで続く場合は最終フレーム）
+        """
+        silent = self.rms_db < db_threshold
+        edges = np.diff(np.concatenate(([False], silent, [False])).astype(np.int8))
+        starts = np.flatnonzero(edges == 1)
+        ends = np.minimum(np.flatnonzero(edges == -1), len(silent) - 1)
+        return starts, ends
+
+    def silence_events(self, db_threshold=SILENCE_DB_THRESHOLD):
+        """沈黙イベントを一括で抽出（detect_silence と同じ結果）
+
+        Returns:
+            SilenceTable: 沈黙イベントの表
+        """
+        starts, ends = self.silent_runs(db_threshold)
+        return SilenceTable.from_times(self.times[starts], self.times[ends])
+
+    def silence_tables(self, db_thresholds=SILENCE_DB_OPTIONS):
+        """複数のしきい値の沈黙イベントを、包絡に対する1回のベクトル演算で抽出
+
+        Args:
+            db_thresholds: 沈黙判定しきい値のリスト（最大音量=0dB）
+
+        Returns:
+            dict: {しきい値: SilenceTable}
+        """
+        db_thresholds = list(db_thresholds)
+        n_frames = len(self.rms_db)
+        silent = np.zeros((len(db_thresholds), n_frames + 2), dtype=np.int8)
+        silent[:, 1:-1] = self.rms_db[np.newaxis, :] < np.asarray(db_thresholds, dtype=float)[:, np.newaxis]
+        edges = np.diff(silent, axis=1)
+        start_rows, starts = np.nonzero(edges == 1)
+        end_rows, ends = np.nonzero(edges == -1)
+        ends = np.minimum(ends, n_frames - 1)
+        # np.nonzero は行優先なので、行ごとの件数で分割できる
+        bounds = np.cumsum(np.bincount(start_rows, minlength=len(db_thresholds)))[:-1]
+        return {
+            threshold: SilenceTable.from_times(self.times[row_starts], self.times[row_ends])
+            for threshold, row_starts, row_ends in zip(
+                db_thresholds, np.split(starts, bounds), np.split(ends, bounds)
+            )
+        }
+
+    def silence_sweep(self, db_thresholds=SILENCE_DB_OPTIONS):
+        """複数のしきい値の沈黙統計
+
+        Returns:
+            dict: {しきい値: calculate_silence_stats の結果}
+        """
+        return {
+            threshold: AudioProcessor.calculate_silence_stats(table)
+            for threshold, table in self.silence_tables(db_thresholds).items()
+        }
+
+    def silence_stats(self, db_threshold=SILENCE_DB_THRESHOLD):
+        """沈黙統計を計算"""
+        return AudioProcessor.calculate_silence_stats(self.silence_events(db_threshold))
@@ -0,0 +1,133 @@
+import hashlib
+import json
+import os
+import threading
+from pathlib import Path
+
+import numpy as np
+from config import CACHE_DIR, CACHE_MAX_MB
+
+from .fsutil import atomic_write
+
+_MISSING = object()
+
+
+class StageCache:
+    """アップロード内容のハッシュ＋ステージパラメータをキーにしたディスクキャッシュ
+
+    ステージ（envelope / silence / transcript / diarization / memo）ごとに
+    別ファイルとして保存し、合計サイズが上限を超えたら最終アクセスが古い順に削除する。
+    NumPy配列を含む辞書は .npz、それ以外は .json で保存する。
+    """
+
+    _lock = threading.Lock()
+
+    def __init__(self, cache_dir=CACHE_DIR, max_mb=CACHE_MAX_MB):
+        """
+        Args:
+            cache_dir: キャッシュディレクトリ
+            max_mb: キャッシュ全体のサイズ上限（MB）
+        """
+        self.cache_dir = Path(cache_dir)
+        self.max_bytes = int(max_mb * 1024 * 1024)
+
+    @staticmethod
+    def hash_bytes(data):
+        """アップロードされたバイト列のハッシュ（キャッシュキーの元）"""
+        return hashlib.sha256(data).hexdigest()
+
+    @staticmethod
+    def hash_file(file_path, chunk_size=1 << 20):
+        """ファイル内容のハッシュ（チャンク単位で読み込む）"""
+        digest = hashlib.sha256()
+        with open(file_path, "rb") as f:
+            for chunk in iter(lambda: f.read(chunk_size), b""):
+                digest.update(chunk)
+        return digest.hexdigest()
+
+    @staticmethod
+    def key(stage, content_hash, params=None):
+        """ステージ名・内容ハッシュ・パラメータからキーを生成"""
+        payload = json.dumps(
+            {"stage": stage, "content": content_hash, "params": params or {}},
+            sort_keys=True,
+            ensure_ascii=False,
+            default=str,
+        )
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def get(self, stage, content_hash, params=None, default=None):
+        """キャッシュを読み込む（ヒット時は最終アクセス時刻を更新）"""
+        base = self.cache_dir / stage / self.key(stage, content_hash, params)
+        for suffix in (".json", ".npz"):
+            path = base.with_suffix(suffix)
+            try:
+                if suffix == ".json":
+                    with open(path, encoding="utf-8") as f:
+                        value = json.load(f)
+                else:
+                    with np.load(path, allow_pickle=False) as data:
+                        value = {name: data[name] for name in data.files}
+            except (OSError, ValueError):
+                continue
+            try:
+                os.utime(path)
+            except OSError:
+                pass
+            return value
+        return default
+
+    def put(self, stage, content_hash, params, value):
+        """キャッシュに書き込み、上限を超えた分を削除"""
+        stage_dir = self.cache_dir / stage
+        stage_dir.mkdir(parents=True, exist_ok=True)
+        key = self.key(stage, content_hash, params)
+        is_arrays = isinstance(value, dict) and any(isinstance(v, np.ndarray) for v in value.values())
+        suffix = ".npz" if is_arrays else ".json"
+        if is_arrays:
+            atomic_write(stage_dir / f"{key}{suffix}", lambda f: np.savez(f, **value))
+        else:
+            data = json.dumps(value, ensure_ascii=False).encode("utf-8")
+            atomic_write(stage_dir / f"{key}{suffix}", lambda f: f.write(data))
+        self._evict()
+        return value
+
+    def get_or_compute(self, stage, content_hash, params, compute):
+        """キャッシュがあれば返し、なければ compute() の結果を保存して返す"""
+        value = self.get(stage, content_hash, params, default=_MISSING)
+        if value is _MISSING:
+            value = self.put(stage, content_hash, params, compute())
+        return value
+
+    def clear(self):
+        """キャッシュを全削除"""
+        for path in self._entries():
+            try:
+                path.unlink()
+            except OSError:
+                pass
+
+    def _entries(self):
+        if not self.cache_dir.exists():
+            return []
+        return [p for p in self.cache_dir.glob("*/*") if p.suffix in (".json", ".npz")]
+
+    def _evict(self):
+        """合計サイズが上限以下になるまで、最終アクセスが古い順に削除（LRU）"""
+        with StageCache._lock:
+            entries = []
+            for path in self._entries():
+                try:
+                    stat = path.stat()
+                except OSError:
+                    continue
+                entries.append((stat.st_mtime, stat.st_size, path))
+            total = sum(size for _, size, _ in entries)
+            for _, size, path in sorted(entries, key=lambda e: e[0]):
+                if total <= self.max_bytes:
+                    break
+                try:
+                    path.unlink()
+                    total -= size
+                except OSError:
+                    pass
@@ -0,0 +1,173 @@
+import math
+from functools import cached_property
+
+import numpy as np
+from config import ENERGY_INDEX_BLOCK, ENERGY_INDEX_STEP, STREAM_BLOCK_SIZE
+
+# dBFS に変換するときの下限（librosa.amplitude_to_db の amin と同じ）
+_AMIN = 1e-5
+
+
+class EnergyIndex:
+    """二乗和の累積（prefix sum）による音量の索引
+
+    録音ごとに1回だけ作り、任意のフレーム長・ホップ長のRMSを O(フレーム数) で、
+    任意の区間（話者区間・文字起こしセグメントなど）のエネルギーを O(1) で求める。
+    生のサンプルは保持せず、step サンプルごとの二乗和（float64）だけを持つ。
+    区間の端は step サンプル単位に丸めるため、フレーム長の半分とホップ長が step の倍数なら
+    librosa.feature.rms と同じフレーム分割になる（exact_step で求められる）。
+
+    累積和は ENERGY_INDEX_BLOCK サンプルごとに0から数え直す2段構成にしている。
+    1本の累積和では長い録音の後半で値が大きくなり、静かな区間の差分が丸め誤差に埋もれるため。
+    """
+
+    def __init__(self, granules, sr, step, n_samples, block=ENERGY_INDEX_BLOCK):
+        """
+        Args:
+            granules: step サンプルごとの二乗和（末尾は端数のサンプルの和）
+            sr: サンプリングレート
+            step: 1要素あたりのサンプル数
+            n_samples: 音声全体のサンプル数
+            block: 累積和を数え直す単位（サンプル数）
+        """
+        self.granules = np.asarray(granules, dtype=np.float64)
+        self.sr = int(sr)
+        self.step = int(step)
+        self.n_samples = int(n_samples)
+        self._block = max(1, int(block) // self.step)
+
+    @staticmethod
+    def exact_step(frame_length, hop_length, step=ENERGY_INDEX_STEP):
+        """指定したフレーム長・ホップ長のフレーム境界を丸めずに表せる最大の step"""
+        return math.gcd(step, hop_length, frame_length // 2) or 1
+
+    @classmethod
+    def from_signal(cls, y, sr, step=ENERGY_INDEX_STEP, block_size=STREAM_BLOCK_SIZE):
+        """デコード済みの音声配列から作る（block_size ずつ処理し、一時的なメモリを抑える）"""
+        y = np.asarray(y)
+        return cls.from_blocks((y[i:i + block_size] for i in range(0, len(y), block_size)), sr, step)
+
+    @classmethod
+    def from_blocks(cls, blocks, sr, step=ENERGY_INDEX_STEP):
+        """任意の長さのブロック列（iter_blocks の出力など）から逐次作る"""
+        sums = []
+        pending = np.zeros(0, dtype=np.float64)
+        n_samples = 0
+        for block in blocks:
+            n_samples += len(block)
+            squared = np.square(block, dtype=np.float64)
+            if len(pending):
+                squared = np.concatenate([pending, squared])
+            usable = len(squared) - len(squared) % step
+            sums.append(squared[:usable].reshape(-1, step).sum(axis=1))
+            pending = squared[usable:]
+        if len(pending):
+            sums.append(np.array([pending.sum()]))
+        granules = np.concatenate(sums) if sums else np.zeros(0, dtype=np.float64)
+        return cls(granules, sr, step, n_samples)
+
+    def to_dict(self):
+        """キャッシュ保存用の辞書（NumPy配列を含む）"""
+        return {
+            "granules": self.granules,
+            "sr": np.asarray(self.sr),
+            "step": np.asarray(self.step),
+            "n_samples": np.asarray(self.n_samples),
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        """to_dict の結果から復元"""
+        return cls(np.asarray(data["granules"]), int(data["sr"]), int(data["step"]), int(data["n_samples"]))
+
+    def __getstate__(self):
+        # 累積和は使うときに作り直せるため、プロセス間で渡すときは要素だけを送る
+        state = dict(self.__dict__)
+        state.pop("_prefix", None)
+        return state
+
+    @property
+    def duration(self):
+        """音声の長さ（秒）"""
+        return self.n_samples / float(self.sr)
+
+    def rms(self, frame_length, hop_length, center=True):
+        """フレームごとのRMS（librosa.feature.rms と同じフレーム分割・ゼロ詰め）
+
+        Args:
+            frame_length: フレーム長（サンプル数）
+            hop_length: ホップ長（サンプル数）
+            center: True なら前後に frame_length // 2 のゼロを詰めた扱いにする
+
+        Returns:
+            np.ndarray: float32 のRMS配列
+        """
+        pad = frame_length // 2 if center else 0
+        span = self.n_samples + 2 * pad - frame_length
+        if span < 0:
+            return np.zeros(0, dtype=np.float32)
+        starts = np.arange(1 + span // hop_length, dtype=np.int64) * hop_length - pad
+        energy = self._energy(self._index(starts), self._index(starts + frame_length))
+        # ゼロ詰めした部分もフレーム長に含める（librosa と同じく frame_length で割る）
+        return np.sqrt(np.maximum(energy, 0.0) / frame_length).astype(np.float32)
+
+    def span_energy(self, start, end):
+        """区間の二乗和（秒で指定。配列を渡すと区間ごとにまとめて計算）"""
+        return self._scalar(self._energy(self._index(self._samples(start)), self._index(self._samples(end))), start)
+
+    def span_rms(self, start, end):
+        """区間のRMS（秒で指定。長さ0の区間は0）"""
+        first, last = self._index(self._samples(start)), self._index(self._samples(end))
+        length = self._position(last) - self._position(first)
+        energy = self._energy(first, last)
+        rms = np.sqrt(np.maximum(energy, 0.0) / np.maximum(length, 1))
+        return self._scalar(np.where(length > 0, rms, 0.0), start)
+
+    def span_db(self, start, end):
+        """区間の音量（dBFS。秒で指定）"""
+        return self._scalar(20.0 * np.log10(np.maximum(self.span_rms(start, end), _AMIN)), start)
+
+    def _samples(self, seconds):
+        return np.asarray(seconds, dtype=np.float64) * self.sr
+
+    def _index(self, positions):
+        """サンプル位置を要素の境界の番号に変換（範囲外は端に寄せ、末尾は端数を含めた終端）"""
+        positions = np.asarray(positions, dtype=np.float64)
+        index = np.rint(np.clip(positions, 0, self.n_samples) / self.step).astype(np.int64)
+        return np.where(positions >= self.n_samples, len(self.granules), np.minimum(index, len(self.granules)))
+
+    def _position(self, index):
+        return np.minimum(np.asarray(index) * self.step, self.n_samples)
+
+    @cached_property
+    def _prefix(self):
+        """(ブロック内の累積和, ブロックごとの合計, ブロック合計の累積和)"""
+        n_blocks = -(-len(self.granules) // self._block)
+        rows = np.zeros(n_blocks * self._block, dtype=np.float64)
+        rows[:len(self.granules)] = self.granules
+        rows = rows.reshape(n_blocks, self._block)
+        inclusive = np.cumsum(rows, axis=1)
+        local = np.zeros(n_blocks * self._block + 1, dtype=np.float64)
+        local[:-1].reshape(n_blocks, self._block)[:, 1:] = inclusive[:, :-1]
+        totals = inclusive[:, -1] if n_blocks else np.zeros(0, dtype=np.float64)
+        return local, totals, np.concatenate(([0.0], np.cumsum(totals)))
+
+    def _energy(self, first, last):
+        """要素の境界 first〜last の二乗和（O(1)、配列ならまとめて計算）"""
+        local, totals, cumulative = self._prefix
+        first, last = np.asarray(first), np.asarray(last)
+        if not len(totals):
+            return np.zeros(np.broadcast(first, last).shape)
+        block_first, block_last = first // self._block, last // self._block
+        # 同じブロック内ならブロック内の累積和の差、またぐ場合は前後の端数と間のブロック合計を足す
+        inner = np.minimum(block_first, len(totals) - 1)
+        crossing = (
+            (totals[inner] - local[first])
+            + (cumulative[block_last] - cumulative[np.minimum(block_first + 1, len(totals))])
+            + local[last]
+        )
+        return np.where(block_first == block_last, local[last] - local[first], crossing)
+
+    @staticmethod
+    def _scalar(values, like):
+        return float(values) if np.ndim(like) == 0 else values
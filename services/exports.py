@@ -0,0 +1,98 @@
+import importlib.util
+import io
+import threading
+from collections import OrderedDict
+
+from config import EXPORT_CACHE_SIZE
+
+from .metrics import span
+
+EXPORT_FORMATS = {
+    "xlsx": ("Excel", ".xlsx", "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"),
+    "csv": ("CSV", ".csv", "text/csv"),
+    "parquet": ("Parquet", ".parquet", "application/vnd.apache.parquet"),
+}
+
+_cache = OrderedDict()
+_cache_lock = threading.Lock()
+
+
+def available_formats(multi_table=False):
+    """利用可能な出力形式（複数シートはExcelのみ、Parquetは pyarrow がある場合のみ）"""
+    if multi_table:
+        return ["xlsx"]
+    formats = ["xlsx", "csv"]
+    if importlib.util.find_spec("pyarrow") is not None:
+        formats.append("parquet")
+    return formats
+
+
+def get_cached_export(cache_key):
+    """作成済みの出力があれば返す（なければ None）"""
+    with _cache_lock:
+        if cache_key in _cache:
+            _cache.move_to_end(cache_key)
+            return _cache[cache_key]
+    return None
+
+
+def build_export(tables, fmt, cache_key=None):
+    """表データを指定形式のバイト列に変換（解析結果ごとに1回だけ作成）
+
+    Args:
+        tables: {シート名: DataFrame}（CSV / Parquet は1表のみ）
+        fmt: "xlsx" / "csv" / "parquet"
+        cache_key: 解析結果・しきい値・種類を識別するキー（Noneならキャッシュしない）
+
+    Returns:
+        bytes: 出力ファイルの内容
+    """
+    if cache_key is not None:
+        cached = get_cached_export((cache_key, fmt))
+        if cached is not None:
+            return cached
+
+    if fmt != "xlsx" and len(tables) != 1:
+        raise ValueError(f"{fmt} は1つの表のみ出力できます。")
+    with span(f"export_{fmt}"):
+        if fmt == "xlsx":
+            data = to_xlsx(tables)
+        else:
+            df = next(iter(tables.values()))
+            data = to_csv(df) if fmt == "csv" else to_parquet(df)
+
+    if cache_key is not None:
+        with _cache_lock:
+            _cache[(cache_key, fmt)] = data
+            while len(_cache) > EXPORT_CACHE_SIZE:
+                _cache.popitem(last=False)
+    return data
+
+
+def to_xlsx(tables):
+    """openpyxl の write-only モードでExcelを作成（行数が多くてもメモリを抑える）"""
+    from openpyxl import Workbook
+
+    wb = Workbook(write_only=True)
+    for sheet_name, df in tables.items():
+        ws = wb.create_sheet(title=sheet_name)
+        ws.append([str(c) for c in df.columns])
+        for row in zip(*(df[c].tolist() for c in df.columns)):
+            ws.append(row)
+    output = io.BytesIO()
+    wb.save(output)
+    return output.getvalue()
+
+
+def to_csv(df):
+    """CSV（Excelで文字化けしないよう BOM 付き UTF-8）"""
+    output = io.BytesIO()
+    df.to_csv(output, index=False, encoding="utf-8-sig")
+    return output.getvalue()
+
+
+def to_parquet(df):
+    """列指向の Parquet"""
+    output = io.BytesIO()
+    df.to_parquet(output, index=False)
+    return output.getvalue()
@@ -0,0 +1,29 @@
+import os
+import tempfile
+
+
+def atomic_write(path, write, mode=None):
+    """一時ファイルに書き終えてから path に置き換える（途中で落ちても壊れたファイルが残らない）
+
+    一時ファイルは path と同じディレクトリに作るため、置き換えは os.replace の1回で済む。
+    失敗した場合は一時ファイルを削除して例外をそのまま送出する。
+
+    Args:
+        path: 出力先のパス
+        write: バイナリモードで開いた一時ファイルを受け取り、内容を書き込む関数
+        mode: 置き換える前に設定するパーミッション（省略時は mkstemp の既定の 0600）
+    """
+    directory = os.path.dirname(os.fspath(path)) or "."
+    fd, tmp_path = tempfile.mkstemp(dir=directory, suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            write(f)
+        if mode is not None:
+            os.chmod(tmp_path, mode)
+        os.replace(tmp_path, path)
+    except BaseException:
+        try:
+            os.remove(tmp_path)
+        except OSError:
+            pass
+        raise
@@ -0,0 +1,338 @@
+import hashlib
+import io
+import json
+import os
+import shutil
+import sqlite3
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+import numpy as np
+from config import JOB_RETENTION_HOURS, JOB_WORKERS, JOBS_DIR, MEMO_PARTIAL_INTERVAL_SECONDS, UPLOAD_CHUNK_BYTES
+
+from .cache import StageCache
+from .fsutil import atomic_write
+
+QUEUED = "queued"
+RUNNING = "running"
+DONE = "done"
+FAILED = "failed"
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id TEXT PRIMARY KEY,
+    status TEXT NOT NULL,
+    params TEXT NOT NULL,
+    stages TEXT NOT NULL DEFAULT '{}',
+    error TEXT,
+    memo_partial TEXT,
+    owner_pid INTEGER,
+    owner_token TEXT,
+    created_at REAL NOT NULL,
+    started_at REAL,
+    finished_at REAL
+)
+"""
+
+# プロセス内で共有するジョブキュー（Streamlitの全セッションで共用）
+_queue = None
+_queue_lock = threading.Lock()
+
+# このプロセスを識別するトークン（コンテナの再起動などで同じPIDが再び使われても区別できるよう、PIDと一緒に記録する）
+_BOOT_TOKEN = uuid.uuid4().hex
+
+
+def get_job_queue():
+    """プロセス内で共有するジョブキュー（初回呼び出し時に未完了ジョブを再開）"""
+    global _queue
+    with _queue_lock:
+        if _queue is None:
+            _queue = JobQueue()
+            _queue.recover()
+        return _queue
+
+
+class JobQueue:
+    """SQLite に状態を保存するバックグラウンド解析ジョブのキュー
+
+    解析は Streamlit のスクリプト実行スレッドではなくワーカースレッドで行い、
+    ジョブの状態・ステージごとの進捗・結果はディスクに残す。画面の再読み込みや
+    サーバーの再起動後も、ジョブIDから進捗の確認と結果の取得ができる。
+    """
+
+    def __init__(self, jobs_dir=JOBS_DIR, max_workers=JOB_WORKERS, cache=None):
+        """
+        Args:
+            jobs_dir: ジョブの状態DB・入力音声・結果を置くディレクトリ
+            max_workers: 同時に実行するジョブ数
+            cache: 解析に使う StageCache（省略時は既定のディレクトリ）
+        """
+        self.jobs_dir = Path(jobs_dir)
+        self.jobs_dir.mkdir(parents=True, exist_ok=True)
+        self.db_path = self.jobs_dir / "jobs.sqlite3"
+        self.cache = cache or StageCache()
+        self._pool = ThreadPoolExecutor(max_workers=max(1, max_workers), thread_name_prefix="dannwa-job")
+        with self._connect() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(_SCHEMA)
+            columns = {row[1] for row in conn.execute("PRAGMA table_info(jobs)")}
+            if "memo_partial" not in columns:
+                conn.execute("ALTER TABLE jobs ADD COLUMN memo_partial TEXT")
+            if "owner_token" not in columns:
+                conn.execute("ALTER TABLE jobs ADD COLUMN owner_token TEXT")
+
+    def _connect(self):
+        # 接続はスレッドごとに作る（sqlite3 の接続はスレッド間で共有しない）
+        return sqlite3.connect(self.db_path, timeout=30, isolation_level=None)
+
+    def submit(self, audio, suffix, db_threshold, enable_diarization=False, content_hash=None):
+        """音声を保存してジョブを登録し、ジョブIDを返す
+
+        Args:
+            audio: アップロードされた音声（バイナリのファイルオブジェクト、またはバイト列）
+            suffix: 拡張子（例: ".mp3"）
+            db_threshold: メモ生成に使う沈黙判定しきい値
+            enable_diarization: 話者分離を行うか
+            content_hash: 音声内容のハッシュ（省略時は書き込みながら計算）
+
+        Returns:
+            str: ジョブID
+        """
+        job_id = uuid.uuid4().hex
+        job_dir = self.jobs_dir / job_id
+        job_dir.mkdir(parents=True)
+        input_path = job_dir / f"input{suffix}"
+        digest = _copy_upload(audio, input_path)
+        params = {
+            "input_path": str(input_path),
+            "db_threshold": db_threshold,
+            "enable_diarization": enable_diarization,
+            "content_hash": content_hash or digest,
+        }
+        with self._connect() as conn:
+            conn.execute(
+                "INSERT INTO jobs (id, status, params, created_at) VALUES (?, ?, ?, ?)",
+                (job_id, QUEUED, json.dumps(params, ensure_ascii=False), time.time()),
+            )
+        self._pool.submit(self._work_next)
+        # 長く動き続けるサーバーでも結果が溜まり続けないよう、登録のたびに期限切れのジョブを削除する
+        self.purge_expired()
+        return job_id
+
+    def get(self, job_id):
+        """ジョブの状態（存在しなければ None）
+
+        Returns:
+            dict: status / stages（ステージ名→{status, elapsed}。waiting なら position も）/ error /
+                  position（待ち順, 0始まり）/ memo_partial（生成途中のメモ）など
+        """
+        with self._connect() as conn:
+            row = conn.execute(
+                "SELECT status, params, stages, error, memo_partial, created_at, started_at, finished_at"
+                " FROM jobs WHERE id = ?",
+                (job_id,),
+            ).fetchone()
+            if row is None:
+                return None
+            status, params, stages, error, memo_partial, created_at, started_at, finished_at = row
+            position = None
+            if status == QUEUED:
+                position = conn.execute(
+                    "SELECT COUNT(*) FROM jobs WHERE status = ? AND created_at < ?", (QUEUED, created_at)
+                ).fetchone()[0]
+        return {
+            "id": job_id,
+            "status": status,
+            "params": json.loads(params),
+            "stages": json.loads(stages),
+            "error": error,
+            "memo_partial": memo_partial,
+            "position": position,
+            "created_at": created_at,
+            "started_at": started_at,
+            "finished_at": finished_at,
+        }
+
+    def result(self, job_id):
+        """完了したジョブの解析結果（run_analysis と同じ形式、未完了なら None）"""
+        from .audio_processor import AudioAnalysis, AudioProcessor, SilenceTable
+
+        job_dir = self.jobs_dir / job_id
+        try:
+            with open(job_dir / "result.json", encoding="utf-8") as f:
+                result = json.load(f)
+            with np.load(job_dir / "analysis.npz", allow_pickle=False) as data:
+                analysis = AudioAnalysis.from_dict({name: data[name] for name in data.files})
+            with np.load(job_dir / "silences.npz", allow_pickle=False) as data:
+                tables = SilenceTable.unpack({name: data[name] for name in data.files})
+        except (OSError, ValueError):
+            return None
+        # 沈黙統計は保存した沈黙イベント表から求め直す（ベクトル演算なので軽い）
+        result["silence_sweep"] = {k: AudioProcessor.calculate_silence_stats(t) for k, t in tables.items()}
+        result["silence_stats"] = result["silence_sweep"][result["db_threshold"]]
+        result["analysis"] = analysis
+        return result
+
+    def recover(self):
+        """前回のプロセスで未完了だったジョブを再開し、保持期間を過ぎたジョブを削除"""
+        with self._connect() as conn:
+            rows = conn.execute(
+                "SELECT id, owner_pid, owner_token FROM jobs WHERE status = ?", (RUNNING,)
+            ).fetchall()
+            for job_id, owner_pid, owner_token in rows:
+                if _owner_gone(owner_pid, owner_token):
+                    conn.execute(
+                        "UPDATE jobs SET status = ?, owner_pid = NULL, owner_token = NULL, stages = '{}',"
+                        " memo_partial = NULL WHERE id = ? AND status = ?",
+                        (QUEUED, job_id, RUNNING),
+                    )
+            queued = conn.execute("SELECT COUNT(*) FROM jobs WHERE status = ?", (QUEUED,)).fetchone()[0]
+        self.purge_expired()
+        for _ in range(queued):
+            self._pool.submit(self._work_next)
+
+    def purge_expired(self):
+        """保持期間（JOB_RETENTION_HOURS）を過ぎた完了・失敗ジョブを結果ごと削除
+
+        Returns:
+            int: 削除したジョブ数
+        """
+        with self._connect() as conn:
+            expired = conn.execute(
+                "SELECT id FROM jobs WHERE status IN (?, ?) AND finished_at < ?",
+                (DONE, FAILED, time.time() - JOB_RETENTION_HOURS * 3600),
+            ).fetchall()
+            for (job_id,) in expired:
+                shutil.rmtree(self.jobs_dir / job_id, ignore_errors=True)
+                conn.execute("DELETE FROM jobs WHERE id = ?", (job_id,))
+        return len(expired)
+
+    def _claim_next(self):
+        """最も古い待機中ジョブを実行中にして返す（他のワーカーと取り合わないよう条件付き更新）"""
+        with self._connect() as conn:
+            while True:
+                row = conn.execute(
+                    "SELECT id, params FROM jobs WHERE status = ? ORDER BY created_at LIMIT 1", (QUEUED,)
+                ).fetchone()
+                if row is None:
+                    return None
+                claimed = conn.execute(
+                    "UPDATE jobs SET status = ?, owner_pid = ?, owner_token = ?, started_at = ?"
+                    " WHERE id = ? AND status = ?",
+                    (RUNNING, os.getpid(), _BOOT_TOKEN, time.time(), row[0], QUEUED),
+                ).rowcount
+                if claimed:
+                    return row[0], json.loads(row[1])
+
+    def _work_next(self):
+        claimed = self._claim_next()
+        if claimed is None:
+            return
+        job_id, params = claimed
+        from .pipeline import run_analysis
+
+        stages = {}
+        stages_lock = threading.Lock()
+
+        def on_progress(stage, status, elapsed):
+            with stages_lock:
+                stages[stage] = {"status": status, "elapsed": round(elapsed, 3)}
+                self._update(job_id, stages=json.dumps(stages, ensure_ascii=False))
+
+        def on_wait(stage, position):
+            # 重い処理の枠が空くのを待っている間は waiting（前に待っている件数つき）にする
+            with stages_lock:
+                if stage not in stages:
+                    return
+                if position is None:
+                    stages[stage] = {"status": "running", "elapsed": 0.0}
+                else:
+                    stages[stage] = {"status": "waiting", "elapsed": 0.0, "position": position}
+                self._update(job_id, stages=json.dumps(stages, ensure_ascii=False))
+
+        last_memo_update = [0.0]
+
+        def on_memo_text(text):
+            # 書き込みは間引き、画面側は次の確認時に途中までのメモを表示する
+            now = time.monotonic()
+            if now - last_memo_update[0] >= MEMO_PARTIAL_INTERVAL_SECONDS:
+                last_memo_update[0] = now
+                self._update(job_id, memo_partial=text)
+
+        try:
+            result = run_analysis(
+                params["input_path"],
+                db_threshold=params["db_threshold"],
+                enable_diarization=params["enable_diarization"],
+                content_hash=params["content_hash"],
+                cache=self.cache,
+                on_progress=on_progress,
+                on_memo_text=on_memo_text,
+                on_wait=on_wait,
+            )
+            self._save_result(job_id, result)
+        except Exception as exc:
+            self._update(job_id, status=FAILED, error=str(exc) or exc.__class__.__name__, finished_at=time.time())
+        else:
+            self._update(job_id, status=DONE, finished_at=time.time())
+        finally:
+            try:
+                os.remove(params["input_path"])
+            except OSError:
+                pass
+
+    def _update(self, job_id, **fields):
+        columns = ", ".join(f"{name} = ?" for name in fields)
+        with self._connect() as conn:
+            conn.execute(f"UPDATE jobs SET {columns} WHERE id = ?", (*fields.values(), job_id))
+
+    def _save_result(self, job_id, result):
+        """解析結果を JSON（テキスト）と NPZ（RMS包絡・沈黙イベント表）に分けて保存"""
+        from .audio_processor import SilenceTable
+
+        job_dir = self.jobs_dir / job_id
+        payload = {k: v for k, v in result.items() if k not in ("analysis", "silence_sweep", "silence_stats")}
+        tables = {k: stats["all_silences"] for k, stats in result["silence_sweep"].items()}
+        atomic_write(job_dir / "analysis.npz", lambda f: np.savez(f, **result["analysis"].to_dict()))
+        atomic_write(job_dir / "silences.npz", lambda f: np.savez(f, **SilenceTable.pack(tables)))
+        atomic_write(job_dir / "result.json", lambda f: f.write(json.dumps(payload, ensure_ascii=False).encode("utf-8")))
+
+
+def _copy_upload(audio, path, chunk_size=UPLOAD_CHUNK_BYTES):
+    """アップロードをチャンク単位でディスクに書き出し、同時に内容のハッシュ（StageCache.hash_bytes と同じ値）を返す"""
+    digest = hashlib.sha256()
+    if isinstance(audio, (bytes, bytearray, memoryview)):
+        audio = io.BytesIO(audio)
+    elif hasattr(audio, "seek"):
+        audio.seek(0)
+    with open(path, "wb") as f:
+        for chunk in iter(lambda: audio.read(chunk_size), b""):
+            digest.update(chunk)
+            f.write(chunk)
+    return digest.hexdigest()
+
+
+def _owner_gone(owner_pid, owner_token):
+    """実行中のジョブを取ったプロセスが終了しているか
+
+    このプロセスのトークンなら実行中。PIDがこのプロセスと同じでもトークンが違えば、
+    同じPIDで再起動した前のプロセス（コンテナでは PID 1 が多い）の残りと見なす。
+    """
+    if owner_token == _BOOT_TOKEN:
+        return False
+    if owner_pid is None or owner_pid == os.getpid():
+        return True
+    return not _pid_alive(owner_pid)
+
+
+def _pid_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except OSError:
+        return True
+    return True
@@ -0,0 +1,272 @@
+import os
+import struct
+import time
+
+import numpy as np
+from config import (
+    FRAME_LENGTH,
+    HOP_LENGTH,
+    LIVE_MIN_REF_DBFS,
+    LIVE_REF_DECAY_DB_PER_MIN,
+    MIN_SILENCE_DURATION,
+    SILENCE_DB_THRESHOLD,
+    STREAM_BLOCK_SIZE,
+)
+
+from .audio_processor import _AMIN, _TOP_DB, AudioProcessor
+
+
+class LiveSilenceDetector:
+    """録音中の音声（マイク入力・書き込み中のファイル）に対する逐次沈黙検出
+
+    PCMブロックを push するたびに、計算できるフレームだけRMSを求めて沈黙の開始・終了を判定する。
+    保持するのは次のフレームに必要な直近 frame_length サンプル程度で、メモリは録音の長さに依存しない。
+
+    0dB基準は、ファイル全体の最大RMS（detect_silence）の代わりに、これまでの最大RMSを
+    ゆっくり減衰させた値を使う（小さい音で始まっても沈黙と誤判定しないよう下限つき）。
+    ref を指定すると固定の基準になり、同じ基準なら detect_silence と同じイベントを返す。
+
+    イベントは辞書で返す:
+        {"type": "start", "start": 秒, "detected_at": 秒}
+            沈黙が MIN_SILENCE_DURATION 続いた時点で通知
+        {"type": "end", "start", "end", "duration", "category", "detected_at": 秒}
+            沈黙が明けた時点で通知（_make_event と同じ形式・カテゴリ）
+    detected_at は通知した時点までに受け取った音声の長さで、detected_at - 時刻 が検出の遅れになる。
+    """
+
+    def __init__(
+        self,
+        sr,
+        frame_length=FRAME_LENGTH,
+        hop_length=HOP_LENGTH,
+        db_threshold=SILENCE_DB_THRESHOLD,
+        ref=None,
+        ref_decay_db_per_min=LIVE_REF_DECAY_DB_PER_MIN,
+        min_ref_dbfs=LIVE_MIN_REF_DBFS,
+    ):
+        """
+        Args:
+            sr: サンプリングレート
+            frame_length: フレーム長
+            hop_length: ホップ長
+            db_threshold: 沈黙判定しきい値（基準=0dB）
+            ref: 固定の基準RMS（省略時はこれまでの最大RMSを減衰させた適応基準）
+            ref_decay_db_per_min: 適応基準が1分あたりに下がる量（dB）
+            min_ref_dbfs: 適応基準の下限（dBFS）
+        """
+        self.sr = sr
+        self.frame_length = frame_length
+        self.hop_length = hop_length
+        self.db_threshold = db_threshold
+        self.fixed_ref_db = None if ref is None else 20.0 * np.log10(max(ref, _AMIN))
+        # 1フレームあたりの減衰量（dB）
+        self.decay_db = ref_decay_db_per_min * hop_length / (60.0 * sr)
+        self.min_ref_db = min_ref_dbfs
+        self.min_frames = MIN_SILENCE_DURATION * sr / hop_length
+        # center=True と同じく、先頭に frame_length // 2 のゼロを詰める
+        self._buf = np.zeros(frame_length // 2, dtype=np.float32)
+        self._frame_index = 0
+        self._samples = 0
+        self._peak_state = -np.inf
+        self._in_silence = False
+        self._silence_start_frame = 0
+        self._start_reported = False
+        self.ref_db = None
+        self.level_db = None
+        self._closed = False
+
+    def push(self, block):
+        """PCMブロックを追加し、確定したイベントを返す
+
+        Args:
+            block: モノラルの音声ブロック（float。多チャンネルは (n, ch) で渡せば平均する）
+
+        Returns:
+            list: イベントのリスト
+        """
+        if self._closed:
+            raise RuntimeError("close() 後に push はできません。")
+        block = np.asarray(block, dtype=np.float32)
+        if block.ndim > 1:
+            block = block.mean(axis=1)
+        self._samples += len(block)
+        self._buf = np.concatenate([self._buf, block])
+        rms, self._buf = AudioProcessor._consume_frames(self._buf, self.frame_length, self.hop_length)
+        return self._process(rms)
+
+    def close(self):
+        """入力の終わりを通知し、末尾のフレームと継続中の沈黙を確定する"""
+        if self._closed:
+            return []
+        self._closed = True
+        pad = np.zeros(self.frame_length // 2, dtype=np.float32)
+        rms, _ = AudioProcessor._consume_frames(np.concatenate([self._buf, pad]), self.frame_length, self.hop_length)
+        events = self._process(rms)
+        if self._in_silence:
+            event = self._end_event(self._frame_index - 1)
+            if event:
+                events.append(event)
+            self._in_silence = False
+        return events
+
+    @property
+    def position(self):
+        """これまでに受け取った音声の長さ（秒）"""
+        return self._samples / float(self.sr)
+
+    def _process(self, rms):
+        if rms is None or not len(rms):
+            return []
+        db = 20.0 * np.log10(np.maximum(rms, _AMIN))
+        ref_db = self._reference(db)
+        rel = np.maximum(db - ref_db, -_TOP_DB)
+        self.ref_db = float(ref_db[-1])
+        self.level_db = float(rel[-1])
+        silent = rel < self.db_threshold
+
+        events = []
+        detected_at = self.position
+        # 状態が切り替わるフレームだけを走査
+        changes = np.flatnonzero(silent != np.concatenate(([self._in_silence], silent[:-1])))
+        for i in changes:
+            frame = self._frame_index + int(i)
+            if silent[i]:
+                self._in_silence = True
+                self._silence_start_frame = frame
+                self._start_reported = False
+            else:
+                self._report_start(frame, events, detected_at)
+                event = self._end_event(frame)
+                if event:
+                    events.append(event)
+                self._in_silence = False
+        self._frame_index += len(rms)
+        if self._in_silence:
+            self._report_start(self._frame_index, events, detected_at)
+        return events
+
+    def _report_start(self, frame, events, detected_at):
+        """沈黙が規定の長さに達していれば開始を通知（1つの沈黙につき1回）"""
+        if self._start_reported or frame - self._silence_start_frame < self.min_frames:
+            return
+        self._start_reported = True
+        events.append(
+            {
+                "type": "start",
+                "start": round(self._frame_time(self._silence_start_frame), 2),
+                "detected_at": round(detected_at, 3),
+            }
+        )
+
+    def _end_event(self, frame):
+        event = AudioProcessor._make_event(self._frame_time(self._silence_start_frame), self._frame_time(frame))
+        if not event:
+            return None
+        return {"type": "end", **event, "detected_at": round(self.position, 3)}
+
+    def _reference(self, db):
+        """各フレームの基準レベル（dB）
+
+        適応基準は ref_k = max(下限, max_{j<=k}(db_j - decay * (k - j)))。
+        max の中を db_j + decay * j の累積最大に書き換え、ブロックをまたいで状態を引き継ぐ。
+        """
+        if self.fixed_ref_db is not None:
+            return np.full(len(db), self.fixed_ref_db)
+        k = self._frame_index + np.arange(len(db), dtype=np.float64)
+        running = np.maximum.accumulate(np.maximum(db + self.decay_db * k, self._peak_state))
+        running = np.maximum(running, self._peak_state)
+        self._peak_state = float(running[-1])
+        return np.maximum(running - self.decay_db * k, self.min_ref_db)
+
+    def _frame_time(self, frame):
+        return frame * self.hop_length / float(self.sr)
+
+
+def follow_wav(file_path, block_size=STREAM_BLOCK_SIZE, poll_seconds=0.5, idle_timeout=10.0):
+    """書き込み中の WAV ファイル（PCM 16bit / float32）を追いかけてブロック単位で読む
+
+    ヘッダーのデータ長は録音終了まで確定しないため、data チャンクの位置だけを読み、
+    以降はファイルに追記された分を順に返す。ヘッダーのデータ長が確定してその末尾まで読んだか、
+    idle_timeout 秒追記がなければ終了する。
+
+    Yields:
+        np.ndarray: float32のモノラル音声ブロック
+    """
+    with open(file_path, "rb") as f:
+        (channels, dtype), data_offset = _wav_layout(f)
+        frame_bytes = channels * np.dtype(dtype).itemsize
+        block_bytes = block_size * frame_bytes
+        consumed = 0
+        pending = b""
+        last_data = time.monotonic()
+        while True:
+            f.seek(data_offset + consumed + len(pending))
+            chunk = f.read(block_bytes - len(pending))
+            data_size = _finalized_data_size(f, data_offset)
+            if data_size is not None:
+                # 録音が終わっていれば、data チャンクより後ろ（LIST など）は読まない
+                chunk = chunk[:max(0, data_size - consumed - len(pending))]
+            if chunk:
+                pending += chunk
+                last_data = time.monotonic()
+            finished = data_size is not None and consumed + len(pending) >= data_size
+            usable = len(pending) - len(pending) % frame_bytes
+            if usable and (len(pending) >= block_bytes or not chunk or finished):
+                y = np.frombuffer(pending[:usable], dtype=dtype).reshape(-1, channels).astype(np.float32)
+                consumed += usable
+                pending = pending[usable:]
+                if dtype == "<i2":
+                    y /= 32768.0
+                yield y.mean(axis=1) if channels > 1 else y[:, 0]
+                continue
+            if finished:
+                # ヘッダーを途中で更新する録音ソフトもあるため、長さが変わらないことを確かめて終える
+                time.sleep(poll_seconds)
+                if _finalized_data_size(f, data_offset) == data_size:
+                    return
+                continue
+            if time.monotonic() - last_data > idle_timeout:
+                return
+            time.sleep(poll_seconds)
+
+
+def _finalized_data_size(f, data_offset):
+    """ヘッダーに書かれた data チャンクの長さ（録音中で未確定なら None）"""
+    position = f.tell()
+    f.seek(data_offset - 4)
+    size = struct.unpack("<I", f.read(4))[0]
+    f.seek(position)
+    return None if size in (0, 0xFFFFFFFF) else size
+
+
+def _wav_layout(f):
+    """RIFF/WAVE のチャンクをたどり、((チャンネル数, dtype), data の開始位置) を返す"""
+    header = f.read(12)
+    if len(header) < 12 or header[:4] != b"RIFF" or header[8:12] != b"WAVE":
+        raise ValueError("WAV（RIFF/WAVE）形式ではありません。")
+    fmt = None
+    while True:
+        chunk_header = f.read(8)
+        if len(chunk_header) < 8:
+            raise ValueError("data チャンクが見つかりません。")
+        chunk_id, size = chunk_header[:4], struct.unpack("<I", chunk_header[4:])[0]
+        if chunk_id == b"fmt ":
+            body = f.read(size)
+            audio_format, channels, _, _, _, bits = struct.unpack("<HHIIHH", body[:16])
+            if audio_format == 0xFFFE and len(body) >= 26:
+                # WAVE_FORMAT_EXTENSIBLE はサブフォーマットの先頭2バイトが実際の形式
+                audio_format = struct.unpack("<H", body[24:26])[0]
+            if audio_format == 1 and bits == 16:
+                fmt = (channels, "<i2")
+            elif audio_format == 3 and bits == 32:
+                fmt = (channels, "<f4")
+            else:
+                raise ValueError("対応している WAV は PCM 16bit と float32 のみです。")
+            if size % 2:
+                f.read(1)
+        elif chunk_id == b"data":
+            if fmt is None:
+                raise ValueError("fmt チャンクが data より後にあります。")
+            return fmt, f.tell()
+        else:
+            f.seek(size + size % 2, os.SEEK_CUR)
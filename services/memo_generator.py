@@ -1,62 +1,264 @@
-from openai import OpenAI
-from config import OPENAI_API_KEY, GPT_MODEL
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+from config import GPT_MODEL, MEMO_CHUNK_TOKENS, MEMO_MAP_WORKERS, MEMO_SUMMARY_TOKENS
+
+from .api_client import estimate_tokens, get_api_client
+from .metrics import map_in_context
+
+SYSTEM_PROMPT = "あなたは会話分析の専門家です。与えられたデータから簡潔で実用的な分析メモを生成します。"
+MEMO_MAX_TOKENS = 500
+
+OUTPUT_FORMAT = """【出力形式】
+以下の4項目を簡潔に出力してください：
+1. 【まとめ】 - 会話内容の要約（2-3行）
+2. 【特徴】 - 沈黙パターンや会話の流れの特徴（2-3行）
+3. 【注目区間】 - 長い沈黙や重要そうな箇所の解釈（2-3行、具体的な時間を含む）
+4. 【注意点】 - 音声品質や特記事項があれば（1-2行、なければ「なし」）
+
+簡潔に、箇条書きで出力してください。"""
 
 
 class MemoGenerationService:
     """LLMを使用した分析メモ生成サービス"""
-    
-    def __init__(self):
-        self.client = OpenAI(api_key=OPENAI_API_KEY)
+
+    def __init__(self, client=None):
+        """
+        Args:
+            client: OpenAI互換クライアント（省略時はプロセス内で共有するクライアント）
+        """
+        self.api = get_api_client()
+        self.client = client or self.api.openai
         self.model = GPT_MODEL
-    
-    def generate_memo(self, transcript, silence_stats, total_duration):
+
+    def generate_memo(
+        self,
+        transcript,
+        silence_stats,
+        total_duration,
+        segments=None,
+        return_usage=False,
+        chunk_tokens=MEMO_CHUNK_TOKENS,
+        max_workers=MEMO_MAP_WORKERS,
+    ):
         """文字起こしと沈黙統計から分析メモを生成
-        
+
+        segments（タイムスタンプ付きセグメント）を渡すと全文を対象にする。
+        1回のリクエストに収まらない長さなら、沈黙位置で区切ったチャンクを並列に要約し（map）、
+        その要約から4項目のメモを作る（reduce）。
+
         Args:
             transcript: 文字起こしテキスト
             silence_stats: 沈黙統計情報
             total_duration: 音声全体の長さ（秒）
-            
+            segments: 文字起こしセグメント（省略時は先頭1000文字のみを使う）
+            return_usage: Trueならリクエストごとのトークン使用量も返す
+            chunk_tokens: 1リクエストに入れる文字起こしの上限（概算トークン）
+            max_workers: チャンク要約の同時リクエスト数
+
         Returns:
-            str: 分析メモ
+            str: 分析メモ（return_usage=True なら (memo, usage)）
         """
-        # 統計情報をプリントアウト用に整形
-        total_silence = silence_stats["total_silence_time"]
-        silence_percentage = round((total_silence / total_duration * 100), 1) if total_duration > 0 else 0
-        
-        long_count = silence_stats["2s+"]["count"]
-        long_time = silence_stats["2s+"]["total_time"]
-        
-        longest_silence = max([e["duration"] for e in silence_stats["all_silences"]], default=0)
-        
-        # Prompt を作成
-        prompt = f"""以下の会話音声の分析データを基に、簡潔な分析メモを生成してください。
-        
+        usage = []
+        prompt = self._build_prompt(transcript, silence_stats, total_duration, segments, usage, chunk_tokens, max_workers)
+        memo, memo_usage = self._chat(prompt, MEMO_MAX_TOKENS)
+        usage.append({"step": "memo", **memo_usage})
+        if not return_usage:
+            return memo
+        return memo, usage
+
+    def stream_memo(
+        self,
+        transcript,
+        silence_stats,
+        total_duration,
+        segments=None,
+        usage=None,
+        chunk_tokens=MEMO_CHUNK_TOKENS,
+        max_workers=MEMO_MAP_WORKERS,
+    ):
+        """generate_memo のストリーミング版（メモ本文を届いた順に少しずつ返す）
+
+        チャンク要約（map）は通常どおり完了を待ち、最後のメモ生成だけをストリーミングする。
+
+        Args:
+            usage: 渡したリストにリクエストごとのトークン使用量を追加する
+                   （ストリーミング部分は estimate_tokens による概算）
+
+        Yields:
+            str: メモ本文の断片（連結すると generate_memo と同じ形式のメモ）
+        """
+        usage = usage if usage is not None else []
+        prompt = self._build_prompt(transcript, silence_stats, total_duration, segments, usage, chunk_tokens, max_workers)
+        stream = self.api.call(
+            "chat_stream",
+            self.client.chat.completions.create,
+            tokens=estimate_tokens(SYSTEM_PROMPT + prompt) + MEMO_MAX_TOKENS,
+            **self._chat_params(prompt, MEMO_MAX_TOKENS),
+            stream=True,
+        )
+        deltas = []
+        for chunk in stream:
+            if not chunk.choices:
+                continue
+            delta = chunk.choices[0].delta.content
+            if delta:
+                deltas.append(delta)
+                yield delta
+        usage.append(
+            {
+                "step": "memo",
+                "prompt_tokens": estimate_tokens(SYSTEM_PROMPT + prompt),
+                "completion_tokens": estimate_tokens("".join(deltas)),
+                "estimated": True,
+            }
+        )
+
+    def _build_prompt(self, transcript, silence_stats, total_duration, segments, usage, chunk_tokens, max_workers):
+        """メモ生成のプロンプト（長い文字起こしはチャンク要約に置き換える）"""
+        if not segments:
+            source = f"- 文字起こし:\n{transcript[:1000]}... (以下省略)"
+        else:
+            lines = [self._format_segment(seg) for seg in segments]
+            if estimate_tokens("\n".join(lines)) <= chunk_tokens:
+                source = "- 文字起こし（全文）:\n" + "\n".join(lines)
+            else:
+                chunks = self.plan_chunks(segments, silence_stats["all_silences"], chunk_tokens)
+                summaries = self._summarize_chunks(segments, lines, chunks, usage, max_workers)
+                summaries = self._collapse(summaries, chunk_tokens, usage, max_workers)
+                source = "- 区間ごとの要約（全文から作成）:\n" + "\n\n".join(s["text"] for s in summaries)
+
+        return f"""以下の会話音声の分析データを基に、簡潔な分析メモを生成してください。
+
 【音声データ】
 - 全体の長さ: {self._format_time(total_duration)}
-- 文字起こし:
-{transcript[:1000]}... (以下省略)
+{source}
 
-【沈黙統計】（2秒以上のみ集計）
-- 全体の沈黙時間: {self._format_time(total_silence)} ({silence_percentage}%)
-- 2秒以上の沈黙: {long_count}回（計{self._format_time(long_time)}）
-- 最長沈黙: {self._format_time(longest_silence)}
+{self._stats_block(silence_stats, total_duration)}
 
-【出力形式】
-以下の4項目を簡潔に出力してください：
-1. 【まとめ】 - 会話内容の要約（2-3行）
-2. 【特徴】 - 沈黙パターンや会話の流れの特徴（2-3行）
-3. 【注目区間】 - 長い沈黙や重要そうな箇所の解釈（2-3行、具体的な時間を含む）
-4. 【注意点】 - 音声品質や特記事項があれば（1-2行、なければ「なし」）
+{OUTPUT_FORMAT}"""
 
-簡潔に、箇条書きで出力してください。"""
+    @staticmethod
+    def plan_chunks(segments, silence_events, chunk_tokens=MEMO_CHUNK_TOKENS):
+        """セグメントをトークン上限以内のチャンクに分ける（区切りはなるべく長い沈黙の位置）
+
+        silence_events は沈黙イベントの表（SilenceTable）。
+
+        上限に達する手前で、チャンクの後半にあるセグメント間のうち
+        最も長い沈黙と重なる位置で区切る。沈黙がなければ上限の直前で区切る。
+
+        Returns:
+            list: (開始インデックス, 終了インデックス) のリスト（終了は含まない）
+        """
+        def gap_silence(i):
+            # セグメント i-1 と i の間にかかる沈黙の長さ
+            boundary = (segments[i - 1]["end"] + segments[i]["start"]) / 2
+            j = int(np.searchsorted(silence_events.start, boundary, side="right")) - 1
+            if j >= 0 and silence_events.end[j] >= boundary:
+                return float(silence_events.duration[j])
+            return 0.0
+
+        costs = [estimate_tokens(seg["text"]) + 12 for seg in segments]
+        chunks = []
+        start = 0
+        while start < len(segments):
+            total = 0
+            end = start
+            while end < len(segments) and (end == start or total + costs[end] <= chunk_tokens):
+                total += costs[end]
+                end += 1
+            if end < len(segments):
+                # 後半の区切りのうち沈黙が最も長い位置（同じ長さなら上限に近い方）
+                filled, best, best_gap = 0, end, 0.0
+                for i in range(start + 1, end):
+                    filled += costs[i - 1]
+                    if filled < total / 2:
+                        continue
+                    gap = gap_silence(i)
+                    if gap >= best_gap and gap > 0:
+                        best, best_gap = i, gap
+                end = best
+            chunks.append((start, end))
+            start = end
+        return chunks
+
+    def _summarize_chunks(self, segments, lines, chunks, usage, max_workers):
+        """各チャンクを並列に要約（map）"""
+
+        def run(chunk):
+            first, last = chunk
+            start, end = segments[first]["start"], segments[last - 1]["end"]
+            prompt = f"""以下は会話音声の {self._format_time(start)}〜{self._format_time(end)} の文字起こし（タイムスタンプ付き）です。
+話題・結論・重要な発言・間が空いた箇所を、時刻を付けて箇条書きで要約してください（5-8行）。
+
+{chr(10).join(lines[first:last])}"""
+            text, chunk_usage = self._chat(prompt, MEMO_SUMMARY_TOKENS)
+            header = f"[{self._format_time(start)}〜{self._format_time(end)}]"
+            return {"start": start, "end": end, "text": f"{header}\n{text}"}, chunk_usage
+
+        with ThreadPoolExecutor(max_workers=max(1, min(max_workers, len(chunks)))) as pool:
+            results = map_in_context(pool, run, chunks)
+        summaries = []
+        for i, (summary, chunk_usage) in enumerate(results):
+            usage.append({"step": "chunk", "chunk": i, "start": summary["start"], "end": summary["end"], **chunk_usage})
+            summaries.append(summary)
+        return summaries
+
+    def _collapse(self, summaries, chunk_tokens, usage, max_workers):
+        """要約の合計が上限を超える間、隣り合う要約をまとめて再要約する"""
+        while len(summaries) > 1 and estimate_tokens("\n\n".join(s["text"] for s in summaries)) > chunk_tokens:
+            groups, group, size = [], [], 0
+            for summary in summaries:
+                cost = estimate_tokens(summary["text"])
+                if group and size + cost > chunk_tokens:
+                    groups.append(group)
+                    group, size = [], 0
+                group.append(summary)
+                size += cost
+            groups.append(group)
+            if len(groups) == len(summaries):
+                # 1件ずつしか入らない場合はこれ以上まとめられない
+                break
 
-        response = self.client.chat.completions.create(
+            def run(group):
+                start, end = group[0]["start"], group[-1]["end"]
+                prompt = (
+                    "以下は会話音声の区間ごとの要約です。時刻を残したまま、1つの要約（5-8行）に統合してください。\n\n"
+                    + "\n\n".join(s["text"] for s in group)
+                )
+                text, group_usage = self._chat(prompt, MEMO_SUMMARY_TOKENS)
+                header = f"[{self._format_time(start)}〜{self._format_time(end)}]"
+                return {"start": start, "end": end, "text": f"{header}\n{text}"}, group_usage
+
+            with ThreadPoolExecutor(max_workers=max(1, min(max_workers, len(groups)))) as pool:
+                results = map_in_context(pool, run, groups)
+            summaries = []
+            for summary, group_usage in results:
+                usage.append({"step": "merge", "start": summary["start"], "end": summary["end"], **group_usage})
+                summaries.append(summary)
+        return summaries
+
+    def _chat(self, prompt, max_tokens):
+        """1回のチャット呼び出し（応答テキストとトークン使用量を返す）"""
+        response = self.api.call(
+            "chat",
+            self.client.chat.completions.create,
+            tokens=estimate_tokens(SYSTEM_PROMPT + prompt) + max_tokens,
+            **self._chat_params(prompt, max_tokens),
+        )
+        usage = getattr(response, "usage", None)
+        return response.choices[0].message.content, {
+            "prompt_tokens": getattr(usage, "prompt_tokens", None),
+            "completion_tokens": getattr(usage, "completion_tokens", None),
+        }
+
+    def _chat_params(self, prompt, max_tokens):
+        return dict(
             model=self.model,
             messages=[
                 {
                     "role": "system",
-                    "content": "あなたは会話分析の専門家です。与えられたデータから簡潔で実用的な分析メモを生成します。"
+                    "content": SYSTEM_PROMPT
                 },
                 {
                     "role": "user",
@@ -64,18 +266,34 @@ class MemoGenerationService:
                 }
             ],
             temperature=0.7,
-            max_tokens=500
+            max_tokens=max_tokens
         )
-        
-        return response.choices[0].message.content
-    
+
+    def _stats_block(self, silence_stats, total_duration):
+        """沈黙統計のプロンプト部分"""
+        total_silence = silence_stats["total_silence_time"]
+        silence_percentage = round((total_silence / total_duration * 100), 1) if total_duration > 0 else 0
+
+        long_count = silence_stats["2s+"]["count"]
+        long_time = silence_stats["2s+"]["total_time"]
+
+        longest_silence = silence_stats["duration_percentiles"]["max"]
+
+        return f"""【沈黙統計】（2秒以上のみ集計）
+- 全体の沈黙時間: {self._format_time(total_silence)} ({silence_percentage}%)
+- 2秒以上の沈黙: {long_count}回（計{self._format_time(long_time)}）
+- 最長沈黙: {self._format_time(longest_silence)}"""
+
+    def _format_segment(self, seg):
+        return f"[{self._format_time(seg['start'])}] {seg['text'].strip()}"
+
     @staticmethod
     def _format_time(seconds):
         """秒を MM:SS形式に変換
-        
+
         Args:
             seconds: 秒数
-            
+
         Returns:
             str: MM:SS形式の時間文字列
         """
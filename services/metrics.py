@@ -0,0 +1,335 @@
+import contextvars
+import json
+import multiprocessing
+import os
+import threading
+import time
+import tracemalloc
+import uuid
+from contextlib import contextmanager
+
+from config import METRICS_LOG_MAX_MB, METRICS_LOG_PATH, METRICS_TEXTFILE, METRICS_TRACE_ALLOCATIONS
+
+from .fsutil import atomic_write
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+# 計測中のステージ（ApiClient.call や span がここに記録を足す）
+_active = contextvars.ContextVar("dannwa_active_stage", default=None)
+
+# プロセス内で共有する集計（Prometheus textfile の元）
+_registry = None
+_registry_lock = threading.Lock()
+
+
+def get_metrics_registry():
+    """プロセス内で共有する MetricsRegistry（初回呼び出し時に作成）"""
+    global _registry
+    with _registry_lock:
+        if _registry is None:
+            _registry = MetricsRegistry()
+        return _registry
+
+
+class Instrumentation:
+    """1回の解析のステージごとの計測
+
+    ステージごとに壁時計時間・CPU時間・RSS・API の呼び出し数と送受信バイト数を記録する。
+    計測は開始・終了時の数回の時刻・/proc の読み取りだけで、常時有効にしておける。
+    （tracemalloc による確保量の計測は METRICS_TRACE_ALLOCATIONS で有効にしたときのみ）
+
+    受付制御（AdmissionController）の枠が空くのを待った時間は admission_wait_seconds に記録する
+    （wall_seconds にも含まれる）。
+
+    ステージは並列に走るため、RSS はプロセス全体の値（ステージ終了時点・増減・最大値）で、
+    cpu_seconds はステージを実行したスレッドのみ、process_cpu_seconds は同時に走る
+    他のステージを含むプロセス全体の値になる。
+    """
+
+    def __init__(self, run_id=None, labels=None, trace_allocations=METRICS_TRACE_ALLOCATIONS):
+        """
+        Args:
+            run_id: 解析を識別するID（省略時は自動生成）
+            labels: 全記録に付ける属性（content_hash など）
+            trace_allocations: tracemalloc で Python の確保量も計測するか
+        """
+        self.run_id = run_id or uuid.uuid4().hex
+        self.labels = labels or {}
+        self.trace_allocations = trace_allocations
+        self.records = []
+        self._lock = threading.Lock()
+        if trace_allocations and not tracemalloc.is_tracing():
+            tracemalloc.start()
+
+    @contextmanager
+    def stage(self, name):
+        """with ブロック内をステージとして計測（入れ子にすると parent 付きで記録）"""
+        parent = _active.get()
+        state = {"calls": [], "waits": []}
+        token = _active.set((self, name, state))
+        wall = time.perf_counter()
+        cpu = time.thread_time()
+        process_cpu = time.process_time()
+        rss = _rss_bytes()
+        traced = tracemalloc.get_traced_memory()[0] if self.trace_allocations else None
+        status = "done"
+        try:
+            yield
+        except BaseException:
+            status = "failed"
+            raise
+        finally:
+            _active.reset(token)
+            end_rss = _rss_bytes()
+            record = {
+                "ts": round(time.time(), 3),
+                "run_id": self.run_id,
+                **self.labels,
+                "stage": name,
+                "parent": parent[1] if parent and parent[0] is self else None,
+                "status": status,
+                "wall_seconds": round(time.perf_counter() - wall, 4),
+                "cpu_seconds": round(time.thread_time() - cpu, 4),
+                "process_cpu_seconds": round(time.process_time() - process_cpu, 4),
+                "rss_mb": _mb(end_rss),
+                "rss_delta_mb": _mb(end_rss - rss) if end_rss is not None and rss is not None else None,
+                "peak_rss_mb": _mb(max(filter(None, (_peak_rss_bytes(), end_rss)), default=None)),
+            }
+            if traced is not None:
+                current, peak = tracemalloc.get_traced_memory()
+                record["alloc_delta_mb"] = _mb(current - traced)
+                record["alloc_peak_mb"] = _mb(peak)
+            record["admission_wait_seconds"] = round(sum(seconds for _, seconds in state["waits"]), 4)
+            record.update(_summarize_calls(state["calls"]))
+            with self._lock:
+                self.records.append(record)
+
+    def finish(self):
+        """記録を JSON lines と Prometheus textfile に書き出す
+
+        Returns:
+            list: ステージごとの記録（完了順）
+        """
+        with self._lock:
+            records = list(self.records)
+        get_metrics_registry().publish(records)
+        return records
+
+
+@contextmanager
+def span(name):
+    """計測中のステージ内なら入れ子のステージとして、そうでなければ単独で計測する
+
+    prepare_audio や出力ファイルの作成など、パイプラインの外からも呼ばれる処理に使う。
+    """
+    active = _active.get()
+    if active is not None:
+        with active[0].stage(name):
+            yield
+        return
+    instrumentation = Instrumentation()
+    try:
+        with instrumentation.stage(name):
+            yield
+    finally:
+        instrumentation.finish()
+
+
+def observe_api_call(record):
+    """ApiClient の呼び出し記録を計測中のステージに結び付ける（記録はあとから更新されてよい）"""
+    active = _active.get()
+    if active is not None:
+        active[2]["calls"].append(record)
+
+
+def observe_admission_wait(kind, seconds):
+    """受付制御の枠が空くのを待った時間を計測中のステージに記録する"""
+    active = _active.get()
+    if active is not None:
+        active[2]["waits"].append((kind, seconds))
+
+
+def map_in_context(pool, func, items):
+    """pool.map と同じだが、呼び出し元のコンテキスト（計測中のステージ）をワーカーに引き継ぐ"""
+    futures = [pool.submit(contextvars.copy_context().run, func, item) for item in items]
+    return [future.result() for future in futures]
+
+
+class MetricsRegistry:
+    """ステージ・API の記録をプロセス内で累積し、JSON lines と Prometheus textfile に書き出す
+
+    textfile は node exporter の textfile collector が読めるよう、一時ファイルから置き換える。
+    プロセスプールの子プロセス（batch.py のローカル解析）は同じファイルを上書きし合わないよう
+    textfile を書かない（JSON lines への追記は行う）。
+    """
+
+    def __init__(self, log_path=METRICS_LOG_PATH, textfile=METRICS_TEXTFILE, log_max_mb=METRICS_LOG_MAX_MB):
+        """
+        Args:
+            log_path: JSON lines の出力先（空なら出力しない）
+            textfile: Prometheus textfile の出力先（空なら出力しない）
+            log_max_mb: JSON lines をローテーションするサイズ（MB）
+        """
+        self.log_path = log_path
+        self.textfile = textfile if multiprocessing.parent_process() is None else None
+        self.log_max_bytes = int(log_max_mb * 1024 * 1024)
+        self._stages = {}
+        self._api = {}
+        self._lock = threading.Lock()
+
+    def publish(self, records):
+        """1回の解析の記録を追加して書き出す"""
+        if not records:
+            return
+        with self._lock:
+            for record in records:
+                stage = self._stages.setdefault(
+                    record["stage"], {"wall": 0.0, "cpu": 0.0, "wait": 0.0, "count": 0, "status": {}}
+                )
+                stage["wall"] += record["wall_seconds"]
+                stage["wait"] += record.get("admission_wait_seconds", 0.0)
+                stage["cpu"] += record["cpu_seconds"]
+                stage["count"] += 1
+                stage["status"][record["status"]] = stage["status"].get(record["status"], 0) + 1
+                for endpoint, api in record.get("api", {}).items():
+                    total = self._api.setdefault(
+                        endpoint,
+                        {"calls": 0, "errors": 0, "request_bytes": 0, "response_bytes": 0, "seconds": 0.0},
+                    )
+                    for key in total:
+                        total[key] += api[key]
+            # 書き出しに失敗しても解析結果は返す（計測は付随的な情報のため）
+            try:
+                if self.log_path:
+                    self._append_log(records)
+                if self.textfile:
+                    self._write_textfile(self.render())
+            except OSError:
+                pass
+
+    def render(self):
+        """Prometheus の text exposition 形式"""
+        lines = []
+
+        def metric(name, kind, help_text, samples):
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} {kind}")
+            for suffix, labels, value in samples:
+                label_text = ",".join(f'{k}="{_escape(v)}"' for k, v in labels.items())
+                value_text = str(int(value)) if float(value).is_integer() else repr(round(value, 6))
+                lines.append(f"{name}{suffix}{{{label_text}}} {value_text}" if labels else f"{name}{suffix} {value_text}")
+
+        stages = sorted(self._stages.items())
+        api = sorted(self._api.items())
+        metric(
+            "dannwa_stage_wall_seconds", "summary", "ステージの壁時計時間（秒）",
+            [s for name, v in stages
+             for s in (("_sum", {"stage": name}, v["wall"]), ("_count", {"stage": name}, v["count"]))],
+        )
+        metric(
+            "dannwa_stage_cpu_seconds_total", "counter", "ステージを実行したスレッドのCPU時間（秒）",
+            [("", {"stage": name}, v["cpu"]) for name, v in stages],
+        )
+        metric(
+            "dannwa_stage_admission_wait_seconds_total", "counter", "受付制御の枠が空くのを待った時間（秒）",
+            [("", {"stage": name}, v["wait"]) for name, v in stages],
+        )
+        metric(
+            "dannwa_stage_runs_total", "counter", "ステージの実行回数（結果別）",
+            [("", {"stage": name, "status": status}, count)
+             for name, v in stages for status, count in sorted(v["status"].items())],
+        )
+        metric(
+            "dannwa_api_requests_total", "counter", "API の呼び出し回数",
+            [("", {"endpoint": name}, v["calls"]) for name, v in api],
+        )
+        metric(
+            "dannwa_api_errors_total", "counter", "再試行後も失敗した API の呼び出し回数",
+            [("", {"endpoint": name}, v["errors"]) for name, v in api],
+        )
+        metric(
+            "dannwa_api_request_bytes_total", "counter", "API に送信したバイト数",
+            [("", {"endpoint": name}, v["request_bytes"]) for name, v in api],
+        )
+        metric(
+            "dannwa_api_response_bytes_total", "counter", "API から受信したバイト数",
+            [("", {"endpoint": name}, v["response_bytes"]) for name, v in api],
+        )
+        metric(
+            "dannwa_api_seconds_total", "counter", "API の呼び出しにかかった時間（再試行・待ちを含む, 秒）",
+            [("", {"endpoint": name}, v["seconds"]) for name, v in api],
+        )
+        peak = _peak_rss_bytes()
+        if peak is not None:
+            metric("dannwa_process_peak_rss_bytes", "gauge", "プロセスの最大RSS（バイト）", [("", {}, peak)])
+        return "\n".join(lines) + "\n"
+
+    def _append_log(self, records):
+        os.makedirs(os.path.dirname(self.log_path) or ".", exist_ok=True)
+        try:
+            if os.path.getsize(self.log_path) > self.log_max_bytes:
+                os.replace(self.log_path, self.log_path + ".1")
+        except OSError:
+            pass
+        data = "".join(json.dumps(r, ensure_ascii=False) + "\n" for r in records)
+        # 追記モードの1回の write なので、複数プロセスから書いても行が混ざらない
+        with open(self.log_path, "a", encoding="utf-8") as f:
+            f.write(data)
+
+    def _write_textfile(self, text):
+        os.makedirs(os.path.dirname(self.textfile) or ".", exist_ok=True)
+        data = text.encode("utf-8")
+        # node_exporter が別ユーザーで読めるよう、置き換える前に読み取り権限を付ける
+        atomic_write(self.textfile, lambda f: f.write(data), mode=0o644)
+
+
+def _summarize_calls(calls):
+    """ステージ内の API 呼び出しを集計（全体とエンドポイント別）"""
+    by_endpoint = {}
+    for call in calls:
+        total = by_endpoint.setdefault(
+            call["endpoint"], {"calls": 0, "errors": 0, "request_bytes": 0, "response_bytes": 0, "seconds": 0.0}
+        )
+        total["calls"] += 1
+        total["errors"] += call.get("status", "ok") != "ok"
+        total["request_bytes"] += call.get("request_bytes", 0)
+        total["response_bytes"] += call.get("response_bytes", 0)
+        total["seconds"] += call.get("seconds", 0.0)
+    for total in by_endpoint.values():
+        total["seconds"] = round(total["seconds"], 4)
+    return {
+        "api_calls": sum(t["calls"] for t in by_endpoint.values()),
+        "api_request_bytes": sum(t["request_bytes"] for t in by_endpoint.values()),
+        "api_response_bytes": sum(t["response_bytes"] for t in by_endpoint.values()),
+        "api_seconds": round(sum(t["seconds"] for t in by_endpoint.values()), 4),
+        "api": by_endpoint,
+    }
+
+
+def _rss_bytes():
+    """現在の RSS（Linux 以外は None）"""
+    try:
+        with open("/proc/self/statm", "rb") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, AttributeError):
+        return None
+
+
+def _peak_rss_bytes():
+    """プロセス開始以降の最大 RSS（取得できなければ None）"""
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux は KB、macOS はバイト単位
+    return peak if os.uname().sysname == "Darwin" else peak * 1024
+
+
+def _mb(value):
+    return None if value is None else round(value / (1024 * 1024), 1)
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
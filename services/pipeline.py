@@ -0,0 +1,392 @@
+import contextvars
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+from config import (
+    DIARIZATION_GAP_PADDING_SECONDS,
+    DIARIZATION_MIN_GAP_SECONDS,
+    DIARIZATION_MODEL,
+    DIARIZATION_SKIP_SILENCE,
+    DIARIZATION_TORCH_THREADS,
+    FRAME_LENGTH,
+    GPT_MODEL,
+    HOP_LENGTH,
+    MEMO_CHUNK_TOKENS,
+    SILENCE_DB_OPTIONS,
+    SILENCE_DB_THRESHOLD,
+    SPEECH_SAMPLE_RATE,
+    UPLOAD_FORMAT,
+    UPLOAD_SUBTYPE,
+    WHISPER_MODEL,
+)
+
+from .admission import get_admission_controller
+from .alignment import align_speakers, format_speaker_lines
+from .cache import StageCache
+from .metrics import Instrumentation, span
+from .speaker_diarization import is_available as diarization_available
+
+STAGE_LABELS = {
+    "envelope": "音声解析",
+    "silence": "沈黙検出",
+    "transcript": "文字起こし",
+    "diarization": "話者分離",
+    "memo": "分析メモ生成",
+    "speakers": "話者別テキスト",
+    "prepare_audio": "音声の読み込み・変換",
+    "encode_upload": "文字起こし用の音声の圧縮",
+}
+
+# 実行中のステージ名（受付制御の待ちをどのステージの待ちとして通知するかに使う）
+_current_stage = contextvars.ContextVar("dannwa_current_stage", default=None)
+
+
+class StageScheduler:
+    """依存関係のあるステージを、依存が揃ったものから並列に実行するスケジューラ
+
+    進捗コールバックは run() を呼んだスレッドから呼ばれるため、
+    Streamlit の要素をそのまま更新できる。
+    instrumentation（Instrumentation）を渡すと、各ステージをその中で計測する。
+    """
+
+    def __init__(self, max_workers=None, instrumentation=None):
+        self.max_workers = max_workers
+        self.instrumentation = instrumentation
+        self._stages = {}
+        self.results = {}
+        self.errors = {}
+        self.timings = {}
+
+    def add(self, name, func, deps=(), optional=False):
+        """ステージを登録
+
+        Args:
+            name: ステージ名
+            func: 依存ステージの結果をキーワード引数で受け取る関数
+            deps: 依存するステージ名
+            optional: Trueなら失敗しても全体を止めず、依存先をスキップする
+        """
+        self._stages[name] = {"func": func, "deps": tuple(deps), "optional": optional}
+        return self
+
+    def run(self, on_progress=None):
+        """全ステージを実行
+
+        Args:
+            on_progress: (stage, status, elapsed) を受け取るコールバック
+                status は "running" / "done" / "failed" / "skipped"
+
+        Returns:
+            dict: ステージ名 -> 結果（失敗・スキップしたステージは None）
+        """
+        notify = on_progress or (lambda *args: None)
+        pending = dict(self._stages)
+        running = {}
+        started = {}
+        with ThreadPoolExecutor(max_workers=self.max_workers or max(1, len(pending))) as pool:
+            while pending or running:
+                for name, stage in list(pending.items()):
+                    if any(dep in pending or dep in running.values() for dep in stage["deps"]):
+                        continue
+                    del pending[name]
+                    if any(dep in self.errors for dep in stage["deps"]):
+                        self.results[name] = None
+                        self.errors[name] = None
+                        notify(name, "skipped", 0.0)
+                        continue
+                    kwargs = {dep: self.results[dep] for dep in stage["deps"]}
+                    started[name] = time.perf_counter()
+                    running[pool.submit(self._run_stage, name, stage["func"], kwargs)] = name
+                    notify(name, "running", 0.0)
+                if not running:
+                    continue
+                done, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in done:
+                    name = running.pop(future)
+                    elapsed = time.perf_counter() - started[name]
+                    self.timings[name] = elapsed
+                    try:
+                        self.results[name] = future.result()
+                    except Exception as exc:
+                        if not self._stages[name]["optional"]:
+                            for other in running:
+                                other.cancel()
+                            notify(name, "failed", elapsed)
+                            raise
+                        self.results[name] = None
+                        self.errors[name] = exc
+                        notify(name, "failed", elapsed)
+                    else:
+                        notify(name, "done", elapsed)
+        return self.results
+
+    def _run_stage(self, name, func, kwargs):
+        token = _current_stage.set(name)
+        try:
+            if self.instrumentation is None:
+                return func(**kwargs)
+            with self.instrumentation.stage(name):
+                return func(**kwargs)
+        finally:
+            _current_stage.reset(token)
+
+
+def run_analysis(
+    audio_path,
+    db_threshold=SILENCE_DB_THRESHOLD,
+    enable_diarization=False,
+    content_hash=None,
+    cache=None,
+    on_progress=None,
+    local_only=False,
+    on_memo_text=None,
+    on_wait=None,
+    admission=None,
+    frame_length=FRAME_LENGTH,
+    hop_length=HOP_LENGTH,
+    prepared_audio=None,
+    keep_prepared=False,
+):
+    """音声解析・文字起こし・話者分離・メモ生成を依存関係に沿って並列実行
+
+    音声のデコードは1回だけ行い（prepare_audio）、RMS包絡と 16kHz 音声を全ステージで共有する。
+    文字起こし用の圧縮音声はデコードのあとに 16kHz 音声から文字起こしのステージで作るため、
+    沈黙検出・波形表示は圧縮を待たない。沈黙検出・文字起こし・話者分離は
+    互いに独立して同時に走り、メモ生成は文字起こしと沈黙統計が揃った時点で開始する。
+
+    重い処理（デコード・圧縮・話者分離はCPUの枠、文字起こし・メモ生成はAPIの枠）は、
+    プロセス全体で共有する AdmissionController の枠が空いてから実行する（話者分離は専用の枠で順番を待ってからCPUの枠を取る）。
+    キャッシュにある結果は枠を待たずに返す。
+
+    Args:
+        audio_path: 音声ファイルパス
+        db_threshold: メモ生成に使う沈黙判定しきい値
+        enable_diarization: 話者分離を行うか
+        content_hash: 音声内容のハッシュ（省略時はファイルから計算）
+        cache: StageCache（省略時は既定のディレクトリ）
+        on_progress: StageScheduler.run に渡す進捗コールバック
+        local_only: Trueなら音声解析と沈黙検出だけを行う（APIを呼ばない）
+        on_memo_text: 指定するとメモをストリーミングで生成し、途中までの本文を渡して呼ぶ
+                      （ワーカースレッドから呼ばれる）
+        on_wait: 受付制御の枠を待つ間に (stage, position) を受け取るコールバック
+                 （position は前に待っている件数、枠に入ったら None。ワーカースレッドから呼ばれる）
+        admission: AdmissionController（省略時はプロセス共有のもの）
+        frame_length: RMS包絡・沈黙検出のフレーム長（変えても音量の索引のキャッシュから求め、デコードし直さない）
+        hop_length: RMS包絡・沈黙検出のホップ長
+        prepared_audio: 前の呼び出し（keep_prepared=True）で作った PreparedAudio。指定するとデコードし直さずに使う
+                        （削除は呼び出し元が行う）
+        keep_prepared: Trueならデコードした結果を削除せず、戻り値の "prepared" で返す
+                       （local_only でも 16kHz音声まで作り、続きの呼び出しの prepared_audio に
+                       渡せるようにする。デコードしなかった場合は None。削除は呼び出し元が行う）
+
+    Returns:
+        dict: 解析結果（warnings に警告メッセージのリスト、metrics にステージごとの計測記録）
+    """
+    # 重い依存（librosa / OpenAI クライアントなど）は解析の実行時に初めて読み込む
+    from .audio_processor import AudioAnalysis, AudioProcessor, SilenceTable
+    from .energy_index import EnergyIndex
+    from .preprocess import prepare_audio
+    from .transcription import TranscriptionService
+
+    cache = cache or StageCache()
+    admission = admission or get_admission_controller()
+    content_hash = content_hash or StageCache.hash_file(audio_path)
+    envelope_params = {"frame_length": frame_length, "hop_length": hop_length}
+    # 索引の刻み幅は指定したフレーム長・ホップ長から求める（既定値の刻み幅ではフレームの端が丸められる）
+    energy_params = {"step": EnergyIndex.exact_step(frame_length, hop_length)}
+    thresholds = sorted(set(SILENCE_DB_OPTIONS) | {db_threshold})
+    with_diarization = enable_diarization and not local_only
+    warnings = []
+    prepared_holder = [prepared_audio] if prepared_audio is not None else []
+    owned = []
+    prepare_lock = threading.Lock()
+    upload_lock = threading.Lock()
+    # APIを呼ばない解析でも、結果を続きの呼び出しに渡すなら16kHz音声まで作る
+    with_speech = not local_only or keep_prepared
+
+    def admitted(kind):
+        # 枠を待つ間の待ち順は、待っているステージの進捗として通知する
+        stage = _current_stage.get()
+        report = None if on_wait is None else (lambda position: on_wait(stage, position))
+        return admission.admit(kind, on_wait=report)
+
+    def prepared():
+        # 1回のデコードで RMS包絡・16kHz音声を作り、必要になったステージで共有
+        with prepare_lock:
+            if not prepared_holder:
+                with admitted("cpu"), span("prepare_audio"):
+                    prepared_holder.append(prepare_audio(
+                        audio_path, with_speech=with_speech, frame_length=frame_length, hop_length=hop_length
+                    ))
+                owned.append(prepared_holder[0])
+            return prepared_holder[0]
+
+    def upload_path():
+        # 圧縮音声は文字起こしで初めて必要になるため、16kHz音声から後で作る（沈黙検出は圧縮を待たない）
+        prep = prepared()
+        with upload_lock:
+            if prep.upload_path is None:
+                with admitted("cpu"), span("encode_upload"):
+                    prep.encode_upload()
+            return prep.upload_path
+
+    def energy():
+        # 音量の索引は録音ごとに1回だけ作り、分解能の違う包絡はすべてここから求める
+        return EnergyIndex.from_dict(
+            cache.get_or_compute("energy", content_hash, energy_params, lambda: prepared().energy.to_dict())
+        )
+
+    def envelope():
+        # RMS包絡は一度だけ計算し、沈黙検出と波形表示で共有
+        index = energy()
+        analysis = AudioAnalysis.from_dict(
+            cache.get_or_compute(
+                "envelope",
+                content_hash,
+                envelope_params,
+                lambda: AudioAnalysis.from_energy(index, frame_length, hop_length).to_dict(),
+            )
+        )
+        analysis.energy = index
+        return analysis
+
+    def silence(envelope):
+        # 全しきい値を一括で計算しておき、結果表示ではしきい値を即時切り替え
+        # （キャッシュは列指向の沈黙イベント表のみ。統計はベクトル演算なので読み込み時に求める）
+        cached = cache.get_or_compute(
+            "silence",
+            content_hash,
+            {**envelope_params, "db_thresholds": thresholds, "layout": "columnar"},
+            lambda: SilenceTable.pack(envelope.silence_tables(thresholds)),
+        )
+        tables = SilenceTable.unpack(cached)
+        return {k: AudioProcessor.calculate_silence_stats(tables[k]) for k in thresholds}
+
+    def transcript():
+        # 文字起こしはしきい値に依存しないため、しきい値を変えても再利用される
+        def compute():
+            service = TranscriptionService()
+            path = upload_path()
+            if TranscriptionService.needs_chunking(path):
+                # 圧縮後もアップロード上限を超える場合は沈黙位置で分割して並列送信
+                # （同時に送るリクエストの数だけAPIの枠を使うよう、枠はチャンクごとに取る）
+                silences = prepared().analysis.silence_events(SILENCE_DB_THRESHOLD)
+                text, segs = service.transcribe_chunked(
+                    path, silences, return_segments=True, shared_audio=prepared().shared,
+                    admit=lambda: admitted("api"),
+                )
+            else:
+                with admitted("api"):
+                    text, segs = service.transcribe(path, return_segments=True)
+            return {"text": text, "segments": segs}
+
+        params = {"model": WHISPER_MODEL, "rendition": f"{UPLOAD_FORMAT}/{UPLOAD_SUBTYPE}@{SPEECH_SAMPLE_RATE}"}
+        return cache.get_or_compute("transcript", content_hash, params, compute)
+
+    def memo(envelope, silence, transcript):
+        from .memo_generator import MemoGenerationService
+
+        def compute():
+            service = MemoGenerationService()
+            kwargs = dict(
+                transcript=transcript["text"],
+                silence_stats=silence[db_threshold],
+                total_duration=envelope.duration,
+                segments=transcript["segments"],
+            )
+            with admitted("api"):
+                if on_memo_text is None:
+                    text, usage = service.generate_memo(**kwargs, return_usage=True)
+                else:
+                    # 届いた分から表示し、全文はキャッシュとダウンロード用に組み立てる
+                    text, usage = "", []
+                    for delta in service.stream_memo(**kwargs, usage=usage):
+                        text += delta
+                        on_memo_text(text)
+            return {"text": text, "usage": usage}
+
+        params = {
+            "model": GPT_MODEL,
+            "whisper_model": WHISPER_MODEL,
+            "db_threshold": db_threshold,
+            "chunk_tokens": MEMO_CHUNK_TOKENS,
+            **envelope_params,
+        }
+        return cache.get_or_compute("memo", content_hash, params, compute)
+
+    def diarization():
+        from .speaker_diarization import SpeakerDiarizationService
+
+        def compute():
+            # 共有音声（16kHz float32）のメモリマップをそのまま渡し、pyannote 側での再デコード・リサンプリングを省く
+            shared = prepared().shared
+            # 長い沈黙は話者分離にかけず、発話だけをつないだ波形で推論して時刻を元に戻す
+            silences = prepared().analysis.silence_events(SILENCE_DB_THRESHOLD) if DIARIZATION_SKIP_SILENCE else None
+            # 共有パイプラインの推論は同時に1件だけなので、話者分離の枠で順番を待ってからCPUの枠を取る
+            # （順番待ちの間にCPUの枠を塞がない）。CPUの枠は他のステージと分け合うため、torch は枠1つ分のスレッドに抑える
+            service = SpeakerDiarizationService(torch_threads=DIARIZATION_TORCH_THREADS or admission.torch_threads)
+            with admitted("diarization"), admitted("cpu"):
+                return service.diarize(shared.samples, sample_rate=shared.sr, silences=silences)
+
+        params = {"model": DIARIZATION_MODEL}
+        if DIARIZATION_SKIP_SILENCE:
+            params["skip_silence"] = {
+                "db_threshold": SILENCE_DB_THRESHOLD,
+                "min_gap": DIARIZATION_MIN_GAP_SECONDS,
+                "padding": DIARIZATION_GAP_PADDING_SECONDS,
+            }
+        return cache.get_or_compute("diarization", content_hash, params, compute)
+
+    def speakers(transcript, diarization):
+        return align_speakers(transcript["segments"], diarization)
+
+    instrumentation = Instrumentation(labels={"content_hash": content_hash})
+    scheduler = StageScheduler(instrumentation=instrumentation)
+    scheduler.add("envelope", envelope)
+    scheduler.add("silence", silence, deps=["envelope"])
+    if not local_only:
+        scheduler.add("transcript", transcript)
+        scheduler.add("memo", memo, deps=["envelope", "silence", "transcript"])
+    if with_diarization:
+        if not diarization_available():
+            warnings.append("HF_TOKEN が未設定のため話者分離をスキップしました。")
+        else:
+            scheduler.add("diarization", diarization, optional=True)
+            scheduler.add("speakers", speakers, deps=["transcript", "diarization"])
+    try:
+        results = scheduler.run(on_progress)
+    except BaseException:
+        for prep in owned:
+            prep.cleanup()
+        raise
+    finally:
+        metrics = instrumentation.finish()
+    if not keep_prepared:
+        for prep in owned:
+            prep.cleanup()
+    if scheduler.errors.get("diarization"):
+        warnings.append(f"話者分離に失敗しました: {scheduler.errors['diarization']}")
+
+    analysis = results["envelope"]
+    transcript_result = results.get("transcript") or {"text": None, "segments": []}
+    result = {
+        "content_hash": content_hash,
+        "analysis": analysis,
+        "silence_sweep": results["silence"],
+        "silence_stats": results["silence"][db_threshold],
+        "transcript": transcript_result["text"],
+        "segments": transcript_result["segments"],
+        "memo": (results.get("memo") or {}).get("text"),
+        "memo_usage": (results.get("memo") or {}).get("usage", []),
+        "duration": analysis.duration,
+        "speaker_turns": results.get("speakers") or [],
+        "speaker_lines": format_speaker_lines(results.get("speakers") or []),
+        "db_threshold": db_threshold,
+        "timings": scheduler.timings,
+        "metrics": metrics,
+        "warnings": warnings,
+    }
+    if keep_prepared:
+        result["prepared"] = owned[0] if owned else None
+    return result
@@ -0,0 +1,132 @@
+import os
+import shutil
+import tempfile
+from contextlib import ExitStack
+
+import numpy as np
+import soundfile as sf
+import soxr
+from config import (
+    FRAME_LENGTH,
+    HOP_LENGTH,
+    SPEECH_SAMPLE_RATE,
+    STREAM_BLOCK_SIZE,
+    UPLOAD_FORMAT,
+    UPLOAD_SUBTYPE,
+)
+
+from .audio_processor import AudioAnalysis, AudioProcessor
+from .energy_index import EnergyIndex
+from .shared_audio import SharedAudio, SharedAudioWriter
+
+UPLOAD_SUFFIX = {"OGG": ".ogg", "FLAC": ".flac", "MP3": ".mp3", "WAV": ".wav"}
+
+
+class PreparedAudio:
+    """1回のデコードから作った解析結果と、各ステージで共有する音声ファイル"""
+
+    def __init__(self, analysis, upload_path, shared, work_dir):
+        """
+        Args:
+            analysis: 元のサンプリングレートで計算した AudioAnalysis（analysis.energy に EnergyIndex）
+            upload_path: 文字起こしAPIに送る圧縮音声（16kHz モノラル。encode_upload() を呼ぶまでは None）
+            shared: 話者分離・文字起こし用の 16kHz float32 共有音声（SharedAudio、不要なら None）
+            work_dir: 上記ファイルを置く一時ディレクトリ
+        """
+        self.analysis = analysis
+        self.energy = analysis.energy
+        self.upload_path = upload_path
+        self.shared = shared
+        self.sample_rate = SPEECH_SAMPLE_RATE
+        self.work_dir = work_dir
+
+    def encode_upload(self, block_size=STREAM_BLOCK_SIZE):
+        """16kHz の共有音声から文字起こし用の圧縮音声を作る（作成済みなら何もしない）
+
+        元のファイルはデコードし直さず、共有音声をブロック単位で圧縮する。
+
+        Returns:
+            str: 圧縮音声のパス
+        """
+        if self.upload_path is not None:
+            return self.upload_path
+        if self.shared is None:
+            raise ValueError("16kHz の共有音声がないため圧縮音声を作れません（prepare_audio の with_speech=True が必要）。")
+        path = os.path.join(self.work_dir, f"upload{upload_suffix()}")
+        samples = self.shared.samples
+        with sf.SoundFile(path, "w", self.shared.sr, 1, format=UPLOAD_FORMAT, subtype=UPLOAD_SUBTYPE) as out:
+            for start in range(0, len(samples), block_size):
+                out.write(samples[start:start + block_size])
+        self.upload_path = path
+        return path
+
+    def cleanup(self):
+        """一時ファイルを削除"""
+        shutil.rmtree(self.work_dir, ignore_errors=True)
+
+
+def write_upload_rendition(path, y, sr):
+    """音声配列を文字起こし用の圧縮形式で書き出す"""
+    sf.write(path, y, sr, format=UPLOAD_FORMAT, subtype=UPLOAD_SUBTYPE)
+
+
+def upload_suffix():
+    return UPLOAD_SUFFIX.get(UPLOAD_FORMAT, f".{UPLOAD_FORMAT.lower()}")
+
+
+def prepare_audio(
+    audio_path,
+    with_speech=True,
+    frame_length=FRAME_LENGTH,
+    hop_length=HOP_LENGTH,
+    block_size=STREAM_BLOCK_SIZE,
+):
+    """音声を1回だけデコードし、RMS包絡と16kHz音声を作る
+
+    ブロック単位で読み込み、同じブロックを音量の索引（EnergyIndex、元のサンプリングレート）と
+    16kHz モノラルへのリサンプリングに流す。RMS包絡は索引から求めるため、フレームの重なりを
+    計算し直さない。保持するのは索引（step サンプルごとに8バイト）だけで、音声そのものは保持しない。
+    16kHz版はサンプル数が元の長さ×16000/sr に一致するため、時刻はそのまま対応する。
+    16kHz版は float32 の共有音声ファイル（SharedAudio）に書き、以降のステージや
+    ワーカープロセスはデコードし直さずにメモリマップのビューで読む。
+    文字起こし用の圧縮音声はここでは作らず、必要になったときに PreparedAudio.encode_upload() で作る
+    （重い圧縮を待たずに沈黙検出・波形表示へ進める）。
+
+    Args:
+        audio_path: 音声ファイルパス
+        with_speech: 16kHz の共有音声も作るか（文字起こし・話者分離で使う。APIを呼ばない解析では不要）
+        frame_length: 音量の索引の刻み幅の算出に使うフレーム長
+        hop_length: 音量の索引の刻み幅の算出に使うホップ長
+
+    Returns:
+        PreparedAudio
+    """
+    sr = AudioProcessor.get_samplerate(audio_path)
+    work_dir = tempfile.mkdtemp(prefix="dannwa-")
+    shared_path = os.path.join(work_dir, "speech.f32") if with_speech else None
+    try:
+        with ExitStack() as stack:
+            blocks = AudioProcessor.iter_blocks(audio_path, block_size)
+            if with_speech:
+                # 16kHz版を書き出さない場合はリサンプリングも省く
+                writer = stack.enter_context(SharedAudioWriter(shared_path, SPEECH_SAMPLE_RATE))
+                blocks = _tee_resampled(blocks, sr, writer)
+            energy = EnergyIndex.from_blocks(blocks, sr, step=EnergyIndex.exact_step(frame_length, hop_length))
+    except BaseException:
+        shutil.rmtree(work_dir, ignore_errors=True)
+        raise
+
+    analysis = AudioAnalysis.from_energy(
+        energy, frame_length, hop_length, AudioProcessor.get_file_duration(audio_path)
+    )
+    shared = SharedAudio(shared_path) if with_speech else None
+    return PreparedAudio(analysis, None, shared, work_dir)
+
+
+def _tee_resampled(blocks, sr, writer):
+    """ブロックをそのまま返しながら、16kHz にリサンプリングして writer に書き出す"""
+    resampler = soxr.ResampleStream(sr, SPEECH_SAMPLE_RATE, 1, dtype="float32")
+    for block in blocks:
+        writer.write(resampler.resample_chunk(block))
+        yield block
+    writer.write(resampler.resample_chunk(np.zeros(0, dtype=np.float32), last=True))
@@ -0,0 +1,111 @@
+import os
+import struct
+
+import numpy as np
+
+# ヘッダー: マジック, 形式バージョン, サンプリングレート, チャンネル数, サンプル数（残りは0埋め）
+_MAGIC = b"DNWAF32\0"
+_VERSION = 1
+_HEADER = struct.Struct("<8sIIIQ")
+_HEADER_SIZE = 64
+_DTYPE = np.dtype("<f4")
+
+
+class SharedAudioWriter:
+    """デコードした音声を float32 の共有音声ファイルへブロック単位で書き出す
+
+    with 文で使い、閉じたときにヘッダーのサンプル数を確定する。
+    """
+
+    def __init__(self, path, sr):
+        """
+        Args:
+            path: 出力先のパス
+            sr: サンプリングレート
+        """
+        self.path = os.fspath(path)
+        self.sr = int(sr)
+        self.n_samples = 0
+        self._f = open(self.path, "wb")
+        self._write_header()
+
+    def write(self, block):
+        """モノラルのブロックを追記"""
+        data = np.ascontiguousarray(block, dtype=_DTYPE)
+        self._f.write(data.data)
+        self.n_samples += len(data)
+
+    def close(self):
+        if self._f.closed:
+            return
+        self._write_header()
+        self._f.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def _write_header(self):
+        position = self._f.tell()
+        self._f.seek(0)
+        self._f.write(_HEADER.pack(_MAGIC, _VERSION, self.sr, 1, self.n_samples).ljust(_HEADER_SIZE, b"\0"))
+        if position:
+            self._f.seek(position)
+
+
+class SharedAudio:
+    """メモリマップで開いた共有音声（小さなヘッダー＋ float32 モノラルのサンプル列）
+
+    デコードは1回だけ行い、各ステージ・ワーカープロセスはこのファイルのビューを使う。
+    ページはOSのキャッシュを共有するため、N個のプロセスで開いても実メモリはほぼ1コピー分で済む。
+    pickle するとパスだけが渡り、受け取った側で開き直す（配列はコピーされない）。
+
+    samples はコピーオンライトで開く（書き込んでもファイルは変わらず、そのプロセスだけのコピーになる）。
+    """
+
+    def __init__(self, path):
+        """
+        Args:
+            path: SharedAudioWriter で書き出したファイル
+        """
+        self.path = os.fspath(path)
+        with open(self.path, "rb") as f:
+            header = f.read(_HEADER_SIZE)
+        if len(header) < _HEADER_SIZE:
+            raise ValueError("共有音声ファイルのヘッダーが不完全です。")
+        magic, version, sr, channels, n_samples = _HEADER.unpack(header[:_HEADER.size])
+        if magic != _MAGIC or version != _VERSION or channels != 1:
+            raise ValueError("共有音声ファイルの形式ではありません。")
+        self.sr = sr
+        if n_samples:
+            self.samples = np.memmap(self.path, dtype=_DTYPE, mode="c", offset=_HEADER_SIZE, shape=(n_samples,))
+        else:
+            # 長さ0のメモリマップは作れないため空配列で代用
+            self.samples = np.zeros(0, dtype=_DTYPE)
+
+    def __len__(self):
+        return len(self.samples)
+
+    def __reduce__(self):
+        return (SharedAudio, (self.path,))
+
+    @property
+    def duration(self):
+        """音声の長さ（秒）"""
+        return len(self.samples) / float(self.sr)
+
+    def segment(self, start, end):
+        """指定区間のビュー（コピーしない）
+
+        Args:
+            start: 開始時刻（秒）
+            end: 終了時刻（秒）
+
+        Returns:
+            np.ndarray: 区間のサンプル列
+        """
+        first = min(max(int(round(start * self.sr)), 0), len(self.samples))
+        last = min(max(int(round(end * self.sr)), first), len(self.samples))
+        return self.samples[first:last]
@@ -1,31 +1,278 @@
+import logging
+import os
+import threading
+from contextlib import contextmanager
 from typing import List, Dict
 
-from config import HF_TOKEN
+import numpy as np
+from config import (
+    DIARIZATION_BATCH_SIZE,
+    DIARIZATION_CACHE_DIR,
+    DIARIZATION_GAP_PADDING_SECONDS,
+    DIARIZATION_MIN_GAP_SECONDS,
+    DIARIZATION_MODEL,
+    DIARIZATION_TORCH_THREADS,
+    HF_TOKEN,
+)
 
+# プロセス内で共有する学習済みパイプライン（Streamlitの全セッションで共用）
+_pipeline = None
+_pipeline_model = None
+_load_lock = threading.Lock()
+_infer_lock = threading.Lock()
+_preload_thread = None
+_preload_started = False
 
-class SpeakerDiarizationService:
-    """pyannote.audio を使った話者分離"""
+logger = logging.getLogger(__name__)
+
+
+def _is_local_model(model):
+    return os.path.exists(model)
+
+
+def load_pipeline(model=DIARIZATION_MODEL):
+    """話者分離パイプラインを読み込む（プロセス内で1回だけ）
 
-    def __init__(self):
-        if not HF_TOKEN:
+    Args:
+        model: Hugging Face のモデルID、またはローカルの config.yaml / ディレクトリ
+
+    Returns:
+        pyannote.audio.Pipeline
+    """
+    global _pipeline, _pipeline_model
+    if _pipeline is not None and _pipeline_model == model:
+        return _pipeline
+    with _load_lock:
+        if _pipeline is not None and _pipeline_model == model:
+            return _pipeline
+        local = _is_local_model(model)
+        if not local and not HF_TOKEN:
             raise RuntimeError("HF_TOKEN が設定されていません。")
         try:
             from pyannote.audio import Pipeline
             from huggingface_hub import login
         except Exception as exc:
             raise RuntimeError("pyannote.audio がインストールされていません。") from exc
-        # Authenticate once, then load without passing token arg (API compatibility).
-        login(token=HF_TOKEN)
-        self._pipeline = Pipeline.from_pretrained("pyannote/speaker-diarization-3.1")
-        if self._pipeline is None:
+        if not local:
+            # Authenticate once, then load without passing token arg (API compatibility).
+            login(token=HF_TOKEN)
+        pipeline = Pipeline.from_pretrained(model, cache_dir=DIARIZATION_CACHE_DIR)
+        if pipeline is None:
             raise RuntimeError(
                 "話者分離モデルの読み込みに失敗しました。Hugging Faceでモデル利用規約に同意済みか確認してください。"
             )
+        _pipeline, _pipeline_model = pipeline, model
+        return _pipeline
+
+
+def preload_pipeline(model=DIARIZATION_MODEL):
+    """サーバー起動時にバックグラウンドでパイプラインを読み込む
+
+    プロセス内で1回だけ試みる（Streamlit の再実行のたびに呼ばれても読み込み直さない）。
+    失敗はログに残し、再試行は話者分離の初回利用時（load_pipeline）に行う。
+    """
+    global _preload_thread, _preload_started
+    with _load_lock:
+        if _preload_started or _pipeline is not None:
+            return _preload_thread
+        _preload_started = True
+
+    def _load():
+        try:
+            load_pipeline(model)
+        except Exception:
+            logger.exception("話者分離モデルの事前読み込みに失敗しました（初回利用時に再試行します）")
+
+    _preload_thread = threading.Thread(target=_load, name="diarization-preload", daemon=True)
+    _preload_thread.start()
+    return _preload_thread
+
+
+def is_available(model=DIARIZATION_MODEL):
+    """話者分離を実行できる設定か（ローカルモデル、または HF_TOKEN あり）"""
+    return _is_local_model(model) or bool(HF_TOKEN)
+
+
+class SpeechTimeline:
+    """長い沈黙を取り除いた発話だけの時間軸（圧縮時間軸）と、元の時刻との対応
+
+    残す区間（発話）はサンプル位置で持つ。圧縮時間軸では残した区間を順に詰めて並べるため、
+    区間 i は圧縮時間軸の offsets[i]〜offsets[i+1] サンプルに対応する。
+    """
+
+    def __init__(self, starts, ends, sr):
+        """
+        Args:
+            starts: 残す区間の開始サンプル位置（昇順）
+            ends: 残す区間の終了サンプル位置
+            sr: サンプリングレート
+        """
+        self.starts = np.asarray(starts, dtype=np.int64)
+        self.ends = np.asarray(ends, dtype=np.int64)
+        self.sr = int(sr)
+        self.offsets = np.concatenate(([0], np.cumsum(self.ends - self.starts)))
+
+    @classmethod
+    def from_silences(
+        cls,
+        silences,
+        n_samples,
+        sr,
+        min_gap=DIARIZATION_MIN_GAP_SECONDS,
+        padding=DIARIZATION_GAP_PADDING_SECONDS,
+    ):
+        """沈黙イベントから発話だけの時間軸を作る
+
+        min_gap 秒以上の沈黙だけを取り除き、その前後 padding 秒は残す。
+
+        Args:
+            silences: SilenceTable（detect_silence / AudioAnalysis.silence_events の結果）
+            n_samples: 音声のサンプル数
+            sr: サンプリングレート
+            min_gap: 取り除く沈黙の最小長（秒）
+            padding: 取り除く沈黙の前後に残す長さ（秒）
+
+        Returns:
+            SpeechTimeline
+        """
+        start, end = np.asarray(silences.start, dtype=np.float64), np.asarray(silences.end, dtype=np.float64)
+        long_gap = (end - start) >= min_gap
+        gap_starts = np.clip(np.ceil((start[long_gap] + padding) * sr), 0, n_samples).astype(np.int64)
+        gap_ends = np.clip(np.floor((end[long_gap] - padding) * sr), 0, n_samples).astype(np.int64)
+        cut = gap_ends > gap_starts
+        keep_starts = np.concatenate(([0], gap_ends[cut]))
+        keep_ends = np.concatenate((gap_starts[cut], [n_samples]))
+        nonempty = keep_ends > keep_starts
+        return cls(keep_starts[nonempty], keep_ends[nonempty], sr)
 
-    def diarize(self, audio_path: str) -> List[Dict]:
+    def __len__(self):
+        return len(self.starts)
+
+    @property
+    def duration(self):
+        """圧縮時間軸の長さ（秒）"""
+        return int(self.offsets[-1]) / float(self.sr)
+
+    def removed_seconds(self, n_samples):
+        """取り除いた長さ（秒）"""
+        return (n_samples - int(self.offsets[-1])) / float(self.sr)
+
+    def compact(self, samples):
+        """残す区間だけをつないだ波形
+
+        Args:
+            samples: 元の波形（1次元。SharedAudio.samples のメモリマップでよい）
+
+        Returns:
+            np.ndarray: 圧縮時間軸の波形（何も取り除かない場合は元の配列のまま）
+        """
+        if len(self) == 1 and self.starts[0] == 0 and self.ends[0] == len(samples):
+            return samples
+        return np.concatenate([samples[s:e] for s, e in zip(self.starts, self.ends)])
+
+    def map_turns(self, turns):
+        """圧縮時間軸の話者区間を元の時刻に戻す
+
+        取り除いた沈黙をまたぐ区間は、沈黙の前後で2つ以上に分かれる。
+
+        Args:
+            turns: {"start", "end", ...} のリスト（圧縮時間軸の秒）
+
+        Returns:
+            list: 元の時刻に戻した同じ形式のリスト
+        """
+        mapped = []
+        last_region = len(self) - 1
+        for turn in turns:
+            s, e = turn["start"] * self.sr, turn["end"] * self.sr
+            first = min(max(int(np.searchsorted(self.offsets, s, side="right")) - 1, 0), last_region)
+            last = min(max(int(np.searchsorted(self.offsets, e, side="left")) - 1, 0), last_region)
+            for i in range(first, last + 1):
+                a = max(s, self.offsets[i])
+                b = min(e, self.offsets[i + 1])
+                if b <= a:
+                    continue
+                shift = self.starts[i] - self.offsets[i]
+                mapped.append({**turn, "start": float(a + shift) / self.sr, "end": float(b + shift) / self.sr})
+        return mapped
+
+
+@contextmanager
+def _torch_threads(n):
+    """torch の演算スレッド数を一時的に変更（0 なら変更しない）"""
+    if not n:
+        yield
+        return
+    import torch
+
+    previous = torch.get_num_threads()
+    torch.set_num_threads(n)
+    try:
+        yield
+    finally:
+        torch.set_num_threads(previous)
+
+
+class SpeakerDiarizationService:
+    """pyannote.audio を使った話者分離"""
+
+    def __init__(
+        self,
+        pipeline=None,
+        model=DIARIZATION_MODEL,
+        torch_threads=DIARIZATION_TORCH_THREADS,
+        batch_size=DIARIZATION_BATCH_SIZE,
+    ):
+        """
+        Args:
+            pipeline: 使用するパイプライン（省略時はプロセス共有のものを読み込む。テスト用の代替も可）
+            model: モデルID、またはローカルのモデルパス
+            torch_threads: 実行中の torch の演算スレッド数（0 なら変更しない）
+            batch_size: 区分・埋め込みモデルのバッチサイズ（0 ならモデルの既定）
+        """
+        self._pipeline = pipeline if pipeline is not None else load_pipeline(model)
+        self.torch_threads = torch_threads
+        self.batch_size = batch_size
+
+    def diarize(self, audio, sample_rate=None, silences=None) -> List[Dict]:
+        """話者分離を実行
+
+        silences を渡すと、長い沈黙を取り除いた発話だけの波形（SpeechTimeline）で話者分離を行い、
+        結果を元の時刻に戻す。処理時間は取り除いた沈黙の分だけ短くなる。
+
+        Args:
+            audio: 音声ファイルパス、またはデコード済みの波形（numpy配列 / torch.Tensor）
+            sample_rate: 波形を渡す場合のサンプリングレート
+            silences: 沈黙イベント（SilenceTable。1次元の波形を渡す場合のみ）
+
+        Returns:
+            list: {"start", "end", "speaker"} のリスト
+        """
         if self._pipeline is None:
             raise RuntimeError("話者分離パイプラインが初期化されていません。")
-        diarization = self._pipeline(audio_path)
+        if silences is not None:
+            if isinstance(audio, (str, os.PathLike)) or sample_rate is None:
+                raise ValueError("沈黙を除いて話者分離する場合は、波形と sample_rate を渡してください。")
+            timeline = SpeechTimeline.from_silences(silences, len(audio), sample_rate)
+            if not len(timeline):
+                return []
+            return timeline.map_turns(self.diarize(timeline.compact(audio), sample_rate=sample_rate))
+        if isinstance(audio, (str, os.PathLike)):
+            file = audio
+        else:
+            if sample_rate is None:
+                raise ValueError("波形を渡す場合は sample_rate が必要です。")
+            import torch
+
+            waveform = torch.as_tensor(audio, dtype=torch.float32)
+            if waveform.ndim == 1:
+                waveform = waveform.unsqueeze(0)  # (channel, time)
+            file = {"waveform": waveform, "sample_rate": int(sample_rate)}
+        # 共有パイプラインは同時に1リクエストずつ実行
+        # （run_analysis からは受付制御の話者分離の枠で順番を待つため、ここで待つことはない）
+        with _infer_lock, _torch_threads(self.torch_threads):
+            self._apply_batch_size()
+            diarization = self._pipeline(file)
         segments = []
         for segment, _, speaker in diarization.itertracks(yield_label=True):
             segments.append(
@@ -36,3 +283,11 @@ class SpeakerDiarizationService:
                 }
             )
         return segments
+
+    def _apply_batch_size(self):
+        """pyannote の SpeakerDiarization パイプラインのバッチサイズを設定（属性がなければ何もしない）"""
+        if not self.batch_size:
+            return
+        for attr in ("segmentation_batch_size", "embedding_batch_size"):
+            if hasattr(self._pipeline, attr):
+                setattr(self._pipeline, attr, self.batch_size)
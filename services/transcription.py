@@ -1,50 +1,180 @@
-from openai import OpenAI
-from config import OPENAI_API_KEY, WHISPER_MODEL
+import bisect
+import os
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import nullcontext
+
+import numpy as np
+from config import (
+    TRANSCRIPTION_WORKERS,
+    WHISPER_CHUNK_SECONDS,
+    WHISPER_MAX_UPLOAD_MB,
+    WHISPER_MODEL,
+)
+
+from .api_client import get_api_client
+from .audio_processor import AudioProcessor
+from .metrics import map_in_context
+from .preprocess import upload_suffix, write_upload_rendition
 
 
 class TranscriptionService:
     """Whisper APIを使用した文字起こしサービス"""
-    
-    def __init__(self):
-        self.client = OpenAI(api_key=OPENAI_API_KEY)
+
+    def __init__(self, client=None):
+        """
+        Args:
+            client: OpenAI互換クライアント（省略時はプロセス内で共有するクライアント、テスト用の代替も可）
+        """
+        self.api = get_api_client()
+        self.client = client or self.api.openai
         self.model = WHISPER_MODEL
-    
+
     def transcribe(self, audio_file_path, return_segments=False):
         """音声ファイルを文字起こし
-        
+
         Args:
             audio_file_path: 音声ファイルパス
-            
+
         Returns:
             str: 文字起こしテキスト
         """
-        with open(audio_file_path, "rb") as audio_file:
-            transcript = self.client.audio.transcriptions.create(
-                model=self.model,
-                file=audio_file,
-                language="ja",  # 日本語指定
-                response_format="verbose_json",
-            )
+        text, segments = self._transcribe_file(audio_file_path)
+        if not return_segments:
+            return text
+        return text, segments
+
+    @staticmethod
+    def needs_chunking(audio_file_path):
+        """アップロード上限を超えるため分割が必要か"""
+        return os.path.getsize(audio_file_path) > WHISPER_MAX_UPLOAD_MB * 1024 * 1024
+
+    def transcribe_chunked(
+        self,
+        audio_file_path,
+        silence_events,
+        return_segments=False,
+        max_chunk_seconds=WHISPER_CHUNK_SECONDS,
+        max_workers=TRANSCRIPTION_WORKERS,
+        shared_audio=None,
+        admit=None,
+    ):
+        """沈黙位置で分割した音声を並列に文字起こしし、結果を結合
+
+        Args:
+            audio_file_path: 音声ファイルパス
+            silence_events: AudioProcessor.detect_silence の沈黙イベント表（SilenceTable）
+            return_segments: Trueならセグメント（元音声の時刻）も返す
+            max_chunk_seconds: 1チャンクの最大長（秒）
+            max_workers: 同時に送信するリクエスト数の上限
+            shared_audio: デコード済みの共有音声（SharedAudio）。指定すると各チャンクは
+                          ファイルを再デコードせず、そのビューから作る
+            admit: 引数なしで呼ぶとコンテキストマネージャを返す関数（受付制御の API の枠など）。
+                   指定するとチャンクごとのリクエストをその中で送り、同時実行数を枠で数える
 
-        text = transcript.text
+        Returns:
+            str: 文字起こしテキスト（return_segments=True なら (text, segments)）
+        """
+        if shared_audio is not None:
+            total_duration = round(shared_audio.duration, 2)
+        else:
+            total_duration = AudioProcessor.get_file_duration(audio_file_path)
+        chunks = self.plan_chunks(total_duration, silence_events, max_chunk_seconds)
+
+        def run(chunk):
+            start, end = chunk
+            if shared_audio is not None:
+                y, sr = shared_audio.segment(start, end), shared_audio.sr
+            else:
+                y, sr = AudioProcessor.read_segment(audio_file_path, start, end)
+            fd, chunk_path = tempfile.mkstemp(suffix=upload_suffix())
+            os.close(fd)
+            try:
+                write_upload_rendition(chunk_path, y, sr)
+                with admit() if admit is not None else nullcontext():
+                    return self._transcribe_file(chunk_path)
+            finally:
+                try:
+                    os.remove(chunk_path)
+                except OSError:
+                    pass
+
+        # 結果は入力順に返るため、完了順に関わらず時系列で結合できる
+        # （API の計測が文字起こしステージに入るよう、呼び出し元のコンテキストを引き継ぐ）
+        with ThreadPoolExecutor(max_workers=max(1, min(max_workers, len(chunks)))) as pool:
+            results = map_in_context(pool, run, chunks)
+
+        texts = []
+        segments = []
+        for (offset, _), (chunk_text, chunk_segments) in zip(chunks, results):
+            texts.append(chunk_text.strip())
+            for seg in chunk_segments:
+                segments.append(
+                    {
+                        "start": round(seg["start"] + offset, 3),
+                        "end": round(seg["end"] + offset, 3),
+                        "text": seg["text"],
+                    }
+                )
+        text = "".join(texts)
         if not return_segments:
             return text
+        return text, segments
+
+    @staticmethod
+    def plan_chunks(total_duration, silence_events, max_chunk_seconds=WHISPER_CHUNK_SECONDS):
+        """沈黙の中央で区切ったチャンク区間を決める
+
+        各チャンクは max_chunk_seconds 以下とし、上限に最も近い沈黙で区切る。
+        後半に沈黙がなければ上限位置で区切る。
+
+        Returns:
+            list: (開始秒, 終了秒) のリスト
+        """
+        cut_points = np.sort((silence_events.start + silence_events.end) / 2).tolist()
+        chunks = []
+        start = 0.0
+        while total_duration - start > max_chunk_seconds:
+            limit = start + max_chunk_seconds
+            i = bisect.bisect_right(cut_points, limit) - 1
+            if i >= 0 and cut_points[i] >= start + max_chunk_seconds / 2:
+                cut = cut_points[i]
+            else:
+                cut = limit
+            chunks.append((start, cut))
+            start = cut
+        chunks.append((start, total_duration))
+        return chunks
+
+    def _transcribe_file(self, audio_file_path):
+        """1ファイルをAPIに送信し、(テキスト, セグメント) を返す"""
+        # 再試行時に同じ内容を送り直せるよう、バイト列として渡す
+        with open(audio_file_path, "rb") as audio_file:
+            audio = (os.path.basename(audio_file_path), audio_file.read())
+        transcript = self.api.call(
+            "transcription",
+            self.client.audio.transcriptions.create,
+            model=self.model,
+            file=audio,
+            language="ja",  # 日本語指定
+            response_format="verbose_json",
+        )
 
         segments = []
         for seg in getattr(transcript, "segments", []) or []:
             if isinstance(seg, dict):
                 start = seg.get("start", 0.0)
                 end = seg.get("end", 0.0)
-                text = seg.get("text", "")
+                seg_text = seg.get("text", "")
             else:
                 start = getattr(seg, "start", 0.0)
                 end = getattr(seg, "end", 0.0)
-                text = getattr(seg, "text", "")
+                seg_text = getattr(seg, "text", "")
             segments.append(
                 {
                     "start": float(start),
                     "end": float(end),
-                    "text": text or "",
+                    "text": seg_text or "",
                 }
             )
-        return text, segments
+        return transcript.text, segments
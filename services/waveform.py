@@ -0,0 +1,112 @@
+import io
+import threading
+from collections import OrderedDict
+
+import numpy as np
+from config import WAVEFORM_CACHE_SIZE, WAVEFORM_DPI, WAVEFORM_FIGSIZE
+
+_cache = OrderedDict()
+_cache_lock = threading.Lock()
+
+
+def decimate_minmax(times, values, n_bins):
+    """区間ごとの最小値・最大値だけを残して点数を減らす（ピークを落とさない間引き）
+
+    Args:
+        times: 時間軸
+        values: 値
+        n_bins: 区間数（出力は最大 2 * n_bins 点）
+
+    Returns:
+        tuple: (間引き後の時間軸, 間引き後の値)
+    """
+    times = np.asarray(times)
+    values = np.asarray(values)
+    n = len(values)
+    if n <= 2 * n_bins:
+        return times, values
+    edges = np.linspace(0, n, n_bins + 1).astype(np.int64)
+    starts = edges[:-1]
+    bin_min = np.minimum.reduceat(values, starts)
+    bin_max = np.maximum.reduceat(values, starts)
+    # 各区間の最小・最大を区間内の時間順に並べる
+    bin_index = np.repeat(np.arange(n_bins), np.diff(edges))
+    argmin = _bin_arg(values, bin_index, starts, bin_min)
+    argmax = _bin_arg(values, bin_index, starts, bin_max)
+    first = np.minimum(argmin, argmax)
+    second = np.maximum(argmin, argmax)
+    order = np.column_stack([first, second]).ravel()
+    return times[order], values[order]
+
+
+def _bin_arg(values, bin_index, starts, targets):
+    """各区間で targets の値を最初にとるインデックス"""
+    hits = np.flatnonzero(values == targets[bin_index])
+    first_hit = np.full(len(starts), -1, dtype=np.int64)
+    # 逆順に代入すると各区間の最初のインデックスが残る
+    first_hit[bin_index[hits][::-1]] = hits[::-1]
+    return first_hit
+
+
+def render_waveform_png(times, rms_db, silences, db_threshold, cache_key=None):
+    """声量波形をPNGに描画（解析結果・しきい値ごとにキャッシュ）
+
+    点数は画像の横ピクセル数で頭打ちにし、沈黙区間は1つのコレクションとして描くため、
+    描画時間は音声の長さにほとんど依存しない。
+
+    Args:
+        times: 時間軸
+        rms_db: RMS音量(dB)
+        silences: 沈黙イベントの表（SilenceTable）
+        db_threshold: 沈黙判定しきい値
+        cache_key: 解析結果を識別するキー（Noneならキャッシュしない）
+
+    Returns:
+        bytes: PNG画像
+    """
+    key = (cache_key, db_threshold) if cache_key is not None else None
+    if key is not None:
+        with _cache_lock:
+            if key in _cache:
+                _cache.move_to_end(key)
+                return _cache[key]
+
+    from matplotlib.collections import PolyCollection
+    from matplotlib.figure import Figure
+
+    fig = Figure(figsize=WAVEFORM_FIGSIZE)
+    ax = fig.subplots()
+    width_px = int(WAVEFORM_FIGSIZE[0] * WAVEFORM_DPI)
+    plot_times, plot_db = decimate_minmax(times, rms_db, width_px)
+    ax.plot(plot_times, plot_db, linewidth=0.8)
+    if len(silences):
+        starts, ends = silences.start, silences.end
+        # x はデータ座標、y は軸座標（0〜1）で全沈黙を1つのコレクションとして描く
+        verts = np.stack(
+            [np.column_stack([starts, np.zeros_like(starts)]),
+             np.column_stack([starts, np.ones_like(starts)]),
+             np.column_stack([ends, np.ones_like(ends)]),
+             np.column_stack([ends, np.zeros_like(ends)])],
+            axis=1,
+        )
+        ax.add_collection(
+            PolyCollection(verts, transform=ax.get_xaxis_transform(), facecolors="#93a7ff", alpha=0.12, linewidths=0),
+            autolim=False,
+        )
+        ax.vlines((starts + ends) / 2, 0, 1, transform=ax.get_xaxis_transform(),
+                  colors="#1f2a7a", linewidth=1.0, alpha=0.8)
+    ax.set_xlabel("time (s)")
+    ax.set_ylabel("RMS dB")
+    ax.axhline(db_threshold, color="red", linestyle="--", linewidth=0.8)
+    ax.set_title("Volume Waveform (RMS dB)")
+    fig.tight_layout()
+    png = io.BytesIO()
+    fig.savefig(png, format="png", dpi=WAVEFORM_DPI)
+    data = png.getvalue()
+
+    if key is not None:
+        with _cache_lock:
+            _cache[key] = data
+            while len(_cache) > WAVEFORM_CACHE_SIZE:
+                _cache.popitem(last=False)
+    return data